@@ -34,6 +34,7 @@ def server_error(error):
     logger.error(f"500 Server Error: {error}", exc_info=True)
     return {"error": "Internal server error"}, 500
 
+# Serveur de développement; en production: python serve.py (plusieurs processus waitress)
 if __name__ == '__main__':
     logger.info("Starting OHADA Reporting API")
     app.run()
\ No newline at end of file
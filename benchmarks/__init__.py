@@ -0,0 +1,6 @@
+"""
+Données synthétiques et mesures de performance des rapports.
+
+    python -m benchmarks.synthetic_data --root benchmarks/data/small --scale small
+    python -m benchmarks.run_benchmarks --scales small medium
+"""
@@ -0,0 +1,198 @@
+"""
+Preuve d'équivalence d'un moteur de rapports candidat.
+
+Génère chaque rapport avec le générateur actuel (référence) puis avec une implémentation
+candidate, sur le même jeu de données synthétiques, et compare les deux classeurs cellule par
+cellule: noms et ordre des feuilles, dimensions, valeur de chaque cellule, cellules fusionnées.
+Les durées des deux implémentations sont affichées côte à côte.
+
+Le candidat remplace un générateur actuel et doit accepter les mêmes paramètres, par exemple:
+    python -m benchmarks.equivalence --scale medium \\
+        --candidate generate_gl_compta_gen=my_engine.ledger:generate_gl_fast
+
+Sans --candidate, la référence est comparée à elle-même (contrôle de déterminisme).
+Code de sortie 1 si au moins un rapport diffère.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from datetime import datetime
+import openpyxl
+from benchmarks.run_benchmarks import DEFAULT_DATA_DIR, ensure_dataset, run_in_dataset
+
+# Générateurs couverts et rapports qui les utilisent
+REFERENCE_REPORTS = {
+    "generate_gl_compta_gen": ["gl_compta_gen", "gl_bnk"],
+    "generate_bal_gen": ["bal_gen", "bal_gen_bnk"],
+    "generate_bal_bp": ["bal_gen_client", "bal_gen_fourn"],
+    "generate_gl_bp": ["gl_client", "gl_fourn"],
+}
+
+MAX_REPORTED_DIFFERENCES = 20
+
+
+def load_function(spec: str):
+    """Charge une fonction désignée par "module.sous_module:fonction"."""
+    module_name, _, function_name = spec.partition(":")
+    if not function_name:
+        raise ValueError(f"Candidat invalide (attendu module:fonction): {spec}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def compare_workbooks(reference_file: str, candidate_file: str, max_differences: int = MAX_REPORTED_DIFFERENCES) -> list:
+    """Différences entre deux classeurs (feuilles, ordre, dimensions, valeurs, fusions); liste vide si identiques."""
+    reference = openpyxl.load_workbook(reference_file, read_only=False)
+    candidate = openpyxl.load_workbook(candidate_file, read_only=False)
+    differences = []
+
+    if reference.sheetnames != candidate.sheetnames:
+        missing = [name for name in reference.sheetnames if name not in candidate.sheetnames]
+        extra = [name for name in candidate.sheetnames if name not in reference.sheetnames]
+        differences.append(f"feuilles différentes: manquantes {missing[:10]}, en trop {extra[:10]}"
+                           if missing or extra else "ordre des feuilles différent")
+
+    for name in reference.sheetnames:
+        if name not in candidate.sheetnames:
+            continue
+        reference_sheet, candidate_sheet = reference[name], candidate[name]
+        if (reference_sheet.max_row, reference_sheet.max_column) != (candidate_sheet.max_row, candidate_sheet.max_column):
+            differences.append(f"[{name}] dimensions {reference_sheet.max_row}x{reference_sheet.max_column} "
+                               f"!= {candidate_sheet.max_row}x{candidate_sheet.max_column}")
+        reference_merges = sorted(str(r) for r in reference_sheet.merged_cells.ranges)
+        candidate_merges = sorted(str(r) for r in candidate_sheet.merged_cells.ranges)
+        if reference_merges != candidate_merges:
+            differences.append(f"[{name}] cellules fusionnées différentes")
+
+        rows = max(reference_sheet.max_row, candidate_sheet.max_row)
+        columns = max(reference_sheet.max_column, candidate_sheet.max_column)
+        for row in range(1, rows + 1):
+            for column in range(1, columns + 1):
+                expected = reference_sheet.cell(row, column).value
+                actual = candidate_sheet.cell(row, column).value
+                if expected != actual:
+                    differences.append(f"[{name}] {reference_sheet.cell(row, column).coordinate}: "
+                                       f"{expected!r} != {actual!r}")
+                    if len(differences) >= max_differences:
+                        differences.append("... (comparaison arrêtée)")
+                        return differences
+    return differences
+
+
+def run_worker(candidates: dict, reports, output_dir: str) -> dict:
+    """Génère référence et candidat pour chaque rapport, depuis la racine du jeu de données."""
+    from flask import Flask
+    import config
+    from routes.general_ledger import REPORT_GENERATORS, _run_generator
+    from routes.memory import PeakRssSampler
+
+    with open("dataset.json") as params_file:
+        params = json.load(params_file)
+    company_code, year = params["companies"][0], str(params["year"])
+    config.TRANSACTION_STORE_ENABLED = False  # sinon la référence remplit le stock lu ensuite par le candidat
+    app = Flask(__name__)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def generate(generate_func, report_type, bnk, bp_type, label):
+        data = {"report_type": report_type, "company_code": company_code, "year": year, "start_month": "1",
+                "end_month": str(params["months"]), "company_name": config.COMPANY_MAPPING.get(company_code, "Unknown")}
+        output_file = os.path.join(config.output_folder, f"{uuid.uuid4().hex}.xlsx")
+        sampler = PeakRssSampler().start()
+        start = time.perf_counter()
+        try:
+            with app.test_request_context():
+                response, _ = _run_generator(data, generate_func, report_type, bnk, bp_type, None, None, output_file)
+                response.close()
+        finally:
+            peak_rss = sampler.stop()
+        seconds = round(time.perf_counter() - start, 4)
+        kept_file = os.path.join(output_dir, f"{report_type}_{label}.xlsx")
+        shutil.move(output_file, kept_file)
+        return kept_file, seconds, peak_rss
+
+    results = {}
+    for function_name, report_types in REFERENCE_REPORTS.items():
+        candidate = load_function(candidates[function_name]) if function_name in candidates else None
+        for report_type in report_types:
+            if reports and report_type not in reports:
+                continue
+            reference_func, bp_type, bnk = REPORT_GENERATORS[report_type]
+            try:
+                reference_file, reference_seconds, reference_rss = generate(reference_func, report_type, bnk, bp_type,
+                                                                            "reference")
+                candidate_file, candidate_seconds, candidate_rss = generate(candidate or reference_func, report_type,
+                                                                            bnk, bp_type, "candidate")
+                differences = compare_workbooks(reference_file, candidate_file)
+                results[report_type] = {
+                    "candidate": candidates.get(function_name, f"{function_name} (référence)"),
+                    "equivalent": not differences,
+                    "differences": differences,
+                    "reference_seconds": reference_seconds,
+                    "candidate_seconds": candidate_seconds,
+                    "reference_peak_rss_bytes": reference_rss,
+                    "candidate_peak_rss_bytes": candidate_rss,
+                    "reference_file": os.path.abspath(reference_file),
+                    "candidate_file": os.path.abspath(candidate_file),
+                }
+            except Exception as e:
+                results[report_type] = {"equivalent": False, "error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Équivalence cellule par cellule d'un moteur de rapports candidat")
+    parser.add_argument("--candidate", action="append", default=[], metavar="GENERATEUR=module:fonction",
+                        help=f"Générateur remplacé ({', '.join(REFERENCE_REPORTS)}) et implémentation candidate")
+    parser.add_argument("--scale", default="small")
+    parser.add_argument("--reports", nargs="+", help="Sous-ensemble de report_type")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output-dir", help="Dossier des classeurs comparés (défaut: <données>/equivalence/<date>)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--candidates-json", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_worker(json.loads(args.candidates_json), args.reports, args.output_dir)
+        with open(args.output, "w") as output:
+            json.dump(results, output)
+        return
+
+    candidates = {}
+    for spec in args.candidate:
+        function_name, _, target = spec.partition("=")
+        if function_name not in REFERENCE_REPORTS or not target:
+            parser.error(f"--candidate attendu sous la forme <{'|'.join(REFERENCE_REPORTS)}>=module:fonction")
+        candidates[function_name] = target
+
+    root = ensure_dataset(args.data_dir, args.scale)
+    output_dir = os.path.abspath(args.output_dir or os.path.join(root, "equivalence", f"{datetime.now():%Y%m%d-%H%M%S}"))
+    worker_args = ["--candidates-json", json.dumps(candidates), "--output-dir", output_dir]
+    if args.reports:
+        worker_args += ["--reports", *args.reports]
+    results = run_in_dataset(root, "benchmarks.equivalence", worker_args, "equivalence.log")
+
+    print(f"{'report':<16} {'reference (s)':>14} {'candidate (s)':>14} {'speedup':>8}  result")
+    for report_type, result in results.items():
+        if "error" in result:
+            print(f"{report_type:<16} {'-':>14} {'-':>14} {'-':>8}  ERREUR {result['error']}")
+            continue
+        speedup = result["reference_seconds"] / result["candidate_seconds"] if result["candidate_seconds"] else 0
+        print(f"{report_type:<16} {result['reference_seconds']:>14.3f} {result['candidate_seconds']:>14.3f} "
+              f"{speedup:>7.2f}x  {'IDENTIQUE' if result['equivalent'] else 'DIFFÉRENT'}")
+        for difference in result["differences"]:
+            print(f"    {difference}")
+    with open(os.path.join(output_dir, "equivalence.json"), "w") as summary:
+        json.dump(results, summary, indent=2)
+    print(f"Classeurs et résumé dans {output_dir}")
+
+    sys.exit(0 if all(result["equivalent"] for result in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Mesure de performance de tous les rapports sur des données synthétiques.
+
+Pour chaque échelle, le jeu de données est généré (une fois) dans benchmarks/data/<échelle>, puis
+un processus dédié, lancé depuis ce dossier, chronomètre chaque générateur de REPORT_GENERATORS et
+/print_journal, sans cache de rapports, de données préparées ni stock de transactions (génération
+à froid).
+Les résultats (durées, pic de RSS, taille des fichiers, commit) sont écrits dans
+benchmarks/results/<date>_<commit>.json pour comparer les commits entre eux.
+
+Exemple:
+    python -m benchmarks.run_benchmarks --scales small medium --repeat 3
+    python -m benchmarks.run_benchmarks --scales small --compare benchmarks/results/20261019-101500_3f4d5a6.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATA_DIR = os.path.join(REPO_ROOT, "benchmarks", "data")
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+PRINT_JOURNAL = "print_journal"
+PRINT_JOURNAL_DOCUMENTS = 20
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def ensure_dataset(data_dir: str, scale: str) -> str:
+    """Génère le jeu de données de l'échelle s'il n'existe pas encore."""
+    from benchmarks.synthetic_data import generate_dataset
+
+    root = os.path.join(data_dir, scale)
+    if not os.path.exists(os.path.join(root, "dataset.json")):
+        print(f"[{scale}] génération des données synthétiques dans {root}...", flush=True)
+        generate_dataset(root, scale)
+    return root
+
+
+def time_call(func, repeat: int) -> dict:
+    """Exécute func() `repeat` fois; func retourne le chemin du fichier produit."""
+    from routes.memory import PeakRssSampler
+
+    runs, peak_rss, output_bytes = [], 0, 0
+    for _ in range(repeat):
+        sampler = PeakRssSampler().start()
+        start = time.perf_counter()
+        try:
+            output_file = func()
+        finally:
+            peak_rss = max(peak_rss, sampler.stop())
+        runs.append(round(time.perf_counter() - start, 4))
+        if output_file and os.path.exists(output_file):
+            output_bytes = os.path.getsize(output_file)
+            os.remove(output_file)
+    return {"runs": runs, "min_seconds": min(runs), "median_seconds": round(statistics.median(runs), 4),
+            "peak_rss_bytes": peak_rss, "output_bytes": output_bytes}
+
+
+def run_worker(repeat: int, reports=None) -> dict:
+    """Chronomètre les rapports depuis le dossier courant (racine d'un jeu de données synthétiques)."""
+    import polars as pl
+    from flask import Flask
+    import config
+    from routes.general_ledger import REPORT_GENERATORS, _run_generator
+    from routes.print_journal import other_actions
+
+    with open("dataset.json") as params_file:
+        params = json.load(params_file)
+    company_code, year = params["companies"][0], str(params["year"])
+    config.TRANSACTION_STORE_ENABLED = False  # génération à froid: lecture des fichiers Excel à chaque fois
+
+    app = Flask(__name__)
+    app.register_blueprint(other_actions)
+    client = app.test_client()
+
+    results = {}
+    for report_type, (generate_func, bp_type, bnk) in REPORT_GENERATORS.items():
+        if reports and report_type not in reports:
+            continue
+        data = {"report_type": report_type, "company_code": company_code, "year": year, "start_month": "1",
+                "end_month": str(params["months"]), "company_name": config.COMPANY_MAPPING.get(company_code, "Unknown")}
+
+        def generate():
+            output_file = config.output_folder + uuid.uuid4().hex + (".csv" if data.get("export_format") == "csv" else ".xlsx")
+            with app.test_request_context():
+                response, _ = _run_generator(data, generate_func, report_type, bnk, bp_type, None, None, output_file)
+                response.close()
+            return output_file
+
+        try:
+            results[report_type] = time_call(generate, repeat)
+        except Exception as e:
+            results[report_type] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"  {report_type}: {results[report_type].get('median_seconds', results[report_type].get('error'))}",
+              file=sys.stderr, flush=True)
+
+    if not reports or PRINT_JOURNAL in reports:
+        transactions_folder = os.path.join(config.transactions_data_folder, company_code, year)
+        first_file = os.path.join(transactions_folder, sorted(os.listdir(transactions_folder))[0])
+        document_numbers = (pl.read_excel(first_file, columns=["Document Number"])["Document Number"]
+                            .cast(pl.Utf8).unique(maintain_order=True).gather_every(37).head(PRINT_JOURNAL_DOCUMENTS)
+                            .to_list())
+
+        def print_journal():
+            response = client.post("/print_journal", data={"document_number": document_numbers,
+                                                           "company_code": company_code, "year": year})
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            response.close()
+            return None
+
+        try:
+            results[PRINT_JOURNAL] = time_call(print_journal, repeat)
+            results[PRINT_JOURNAL]["documents"] = len(document_numbers)
+        except Exception as e:
+            results[PRINT_JOURNAL] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def run_in_dataset(root: str, module: str, worker_args: list, log_name: str) -> dict:
+    """
+    Lance `python -m <module> --worker --output <json> <worker_args>` depuis la racine du jeu de données
+    (les chemins de config sont relatifs) et retourne le JSON écrit par le worker.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as output:
+        output_path = output.name
+    command = [sys.executable, "-m", module, "--worker", "--output", output_path, *worker_args]
+    environment = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.getcwd(), os.environ.get("PYTHONPATH")]))}
+    with open(os.path.join(root, log_name), "w") as log_file:
+        subprocess.run(command, cwd=root, env=environment, stdout=log_file, stderr=log_file, check=True)
+    try:
+        with open(output_path) as result_file:
+            return json.load(result_file)
+    finally:
+        os.remove(output_path)
+
+
+def _run_scale(root: str, repeat: int, reports) -> dict:
+    """Chronomètre une échelle dans un processus séparé."""
+    worker_args = ["--repeat", str(repeat)] + (["--reports", *reports] if reports else [])
+    return run_in_dataset(root, "benchmarks.run_benchmarks", worker_args, "benchmark.log")
+
+
+def _format_seconds(value) -> str:
+    return "-" if value is None else f"{value:.3f}"
+
+
+def compare_results(previous: dict, current: dict) -> None:
+    """Affiche les durées médianes des deux séries de résultats et leur rapport."""
+    print(f"{'scale':<8} {'report':<16} {'before (s)':>11} {'after (s)':>10} {'ratio':>7}")
+    for scale, scale_results in current["scales"].items():
+        previous_reports = previous.get("scales", {}).get(scale, {}).get("reports", {})
+        for report_type, result in scale_results["reports"].items():
+            before = previous_reports.get(report_type, {}).get("median_seconds")
+            after = result.get("median_seconds")
+            ratio = f"{after / before:.2f}x" if before and after else "-"
+            print(f"{scale:<8} {report_type:<16} {_format_seconds(before):>11} {_format_seconds(after):>10} {ratio:>7}"
+                  + (f"  {result['error']}" if "error" in result else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des générateurs de rapports sur données synthétiques")
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reports", nargs="+", help="Sous-ensemble de report_type (et/ou print_journal)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--results-dir", default=DEFAULT_RESULTS_DIR)
+    parser.add_argument("--compare", help="Fichier de résultats précédent à comparer")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_worker(args.repeat, args.reports)
+        with open(args.output, "w") as output:
+            json.dump(results, output)
+        return
+
+    import polars as pl
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    summary = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    for scale in args.scales:
+        root = ensure_dataset(args.data_dir, scale)
+        with open(os.path.join(root, "dataset.json")) as params_file:
+            params = json.load(params_file)
+        print(f"[{scale}] mesure des rapports ({args.repeat} exécution(s) chacun)...", flush=True)
+        summary["scales"][scale] = {"dataset": params, "reports": _run_scale(root, args.repeat, args.reports)}
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    results_file = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}_{commit or 'nogit'}.json")
+    with open(results_file, "w") as output:
+        json.dump(summary, output, indent=2)
+    print(f"Résultats écrits dans {results_file}")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            compare_results(json.load(previous_file), summary)
+    else:
+        compare_results({}, summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Générateur de données comptables synthétiques.
+
+Produit, sous un dossier racine, la même arborescence que Data/ en production:
+- Data/ALL_TRANSACTIONS/<société>/<année>/*.xlsx (colonnes config.selected_columns, types config.expected_dtypes)
+- Data/ALL_VENDORS_TRANSACTIONS et Data/ALL_CUSTOMERS_TRANSACTIONS (config.vendor/customer_selected_columns)
+- Data/INITIAL BALANCE, VENDORS INITIAL BALANCE, CUSTOMERS INITIAL BALANCE
+- Data/STATIC/Plan_Comptable_OHADA.xlsx
+ainsi que bnk_gls.txt et report_layouts.json, pour pouvoir lancer l'application depuis ce dossier.
+
+Les volumes (lignes, comptes, tiers, mois, fichiers) sont paramétrables; la génération est
+déterministe pour une graine donnée.
+
+Exemple:
+    python -m benchmarks.synthetic_data --root benchmarks/data/medium --scale medium
+    python -m benchmarks.synthetic_data --root /tmp/bench --rows 200000 --accounts 300 --bps 1000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import polars as pl
+import config
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Volumes prédéfinis (lignes du Grand Livre de l'année; les fichiers tiers en ont rows // 2)
+SCALES = {
+    "small": {"rows": 5_000, "accounts": 40, "bps": 50, "months": 12, "files": 1},
+    "medium": {"rows": 50_000, "accounts": 150, "bps": 300, "months": 12, "files": 2},
+    "large": {"rows": 300_000, "accounts": 400, "bps": 2_000, "months": 12, "files": 4},
+}
+
+# Préfixes SYSCOHADA utilisés pour fabriquer les comptes (toutes les classes, tous les postes du Compte de Résultat)
+ACCOUNT_PREFIXES = [
+    "101", "104", "106", "131", "162", "211", "231", "241", "245", "281", "311", "321", "401", "408", "411", "418",
+    "421", "431", "441", "445", "447", "471", "531", "571", "601", "602", "6031", "6032", "604", "605", "608",
+    "611", "622", "624", "627", "632", "641", "651", "661", "664", "671", "681", "691", "701", "702", "705",
+    "706", "707", "711", "721", "736", "758", "771", "781", "791", "797", "811", "821", "841", "871", "891",
+]
+
+# Type de pièce SAP -> Désignation
+DOCUMENT_TYPES = {
+    "KR": "Vendor invoice", "KG": "Vendor credit memo", "KZ": "Vendor payment", "RE": "Invoice - gross",
+    "DR": "Customer invoice", "DG": "Customer credit memo", "DZ": "Customer payment", "RV": "Billing doc.transfer",
+    "SA": "G/L account document", "AB": "Accounting document",
+}
+
+COMPANY_NAMES = {"TG13": "NSCT"}
+
+
+def _make_accounts(rng, count: int) -> list:
+    """Comptes SYSCOHADA à 6 chiffres (ou plus pour les préfixes longs), uniques, dont les comptes bancaires."""
+    bank_accounts = config.bnk_gls[:max(2, count // 20)]
+    accounts = list(bank_accounts)
+    seen = set(accounts)
+    while len(accounts) < count:
+        prefix = ACCOUNT_PREFIXES[rng.integers(len(ACCOUNT_PREFIXES))]
+        account = prefix + "".join(str(d) for d in rng.integers(0, 10, max(0, 6 - len(prefix)) + 1))
+        if account not in seen:
+            seen.add(account)
+            accounts.append(account)
+    return sorted(accounts)
+
+
+def _random_dates(rng, year: int, months: int, size: int) -> np.ndarray:
+    start = np.datetime64(f"{year}-01-01")
+    end = (np.datetime64(f"{year}-{months:02d}", "M") + 1).astype("datetime64[D]")
+    return start + rng.integers(0, (end - start).astype(int), size)
+
+
+def _random_texts(rng, prefix: str, size: int, empty_share: float) -> list:
+    values = rng.integers(1, 500, size)
+    empty = rng.random(size) < empty_share
+    return ["" if is_empty else f"{prefix} {value}" for value, is_empty in zip(values, empty)]
+
+
+def _split_write(df: pl.DataFrame, folder: str, files: int) -> None:
+    os.makedirs(folder, exist_ok=True)
+    chunk = -(-len(df) // files)
+    for index in range(files):
+        df.slice(index * chunk, chunk).write_excel(os.path.join(folder, f"part{index + 1}.xlsx"))
+
+
+def generate_transactions(rng, company_code: str, year: int, accounts: list, ifrs_codes: dict, rows: int,
+                          months: int) -> pl.DataFrame:
+    """Lignes du Grand Livre: pièces de 2 à 4 lignes, même date et même type par pièce."""
+    document_index = np.sort(rng.integers(0, max(1, rows // 3), rows))
+    document_count = int(document_index.max()) + 1
+    document_dates = _random_dates(rng, year, months, document_count)
+    document_types = np.array(list(DOCUMENT_TYPES))[rng.integers(0, len(DOCUMENT_TYPES), document_count)]
+
+    account_index = rng.integers(0, len(accounts), rows)
+    offset_index = rng.integers(0, len(accounts), rows)
+    posting_dates = document_dates[document_index]
+    entry_delay = rng.integers(0, 6, rows).astype("timedelta64[D]")
+    entry_seconds = rng.integers(7 * 3600, 19 * 3600, rows)
+    designations = [DOCUMENT_TYPES[t] for t in document_types[document_index]]
+    designations = ["#N/A" if r < 0.02 else d for d, r in zip(designations, rng.random(rows))]
+
+    df = pl.DataFrame({
+        "Company Code": [company_code] * rows,
+        "Company code Name": [COMPANY_NAMES.get(company_code, f"SOCIETE {company_code}")] * rows,
+        "Fiscal Year": np.full(rows, year, dtype=np.int64),
+        "G/L Account": [ifrs_codes[accounts[i]] for i in account_index],
+        "G/L Acct Long Text": [f"IFRS {accounts[i]}" for i in account_index],
+        "Alternative Account No.": np.array([int(accounts[i]) for i in account_index], dtype=np.int64),
+        "Posting Date": posting_dates,
+        "Document Number": [str(1_000_000_000 + i) for i in document_index],
+        "Amount in local currency": (rng.lognormal(11, 1.5, rows) * rng.choice([-1, 1], rows)).astype(np.int64),
+        "Text": _random_texts(rng, "Libellé", rows, 0.3),
+        "Reference": _random_texts(rng, "REF", rows, 0.4),
+        "Document Type": document_types[document_index],
+        "Offsetting acct no.": [ifrs_codes[accounts[i]] for i in offset_index],
+        "Désignation": designations,
+        "Entry Date": np.minimum(posting_dates + entry_delay, np.datetime64(f"{year}-12-31")),
+        # Heure de saisie au format texte HH:MM:SS (converti en Time par load_data)
+        "Time of Entry": [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in entry_seconds],
+        "User ID": [f"USER{u:02d}" for u in rng.integers(1, 12, rows)],
+    })
+    df = df.with_columns(pl.col("Posting Date").cast(pl.Date), pl.col("Entry Date").cast(pl.Date))
+    return df.select(config.selected_columns).sort("Posting Date")
+
+
+def generate_bp_transactions(rng, company_code: str, year: int, bp_type: str, bp_ids: list, rows: int,
+                             months: int) -> pl.DataFrame:
+    """Lignes fournisseurs (bp_type="Vendor") ou clients ("Customer")."""
+    columns = config.vendor_selected_columns if bp_type == "Vendor" else config.customer_selected_columns
+    document_types = ["KR", "KG", "KZ"] if bp_type == "Vendor" else ["DR", "DG", "DZ"]
+    bp_index = rng.integers(0, len(bp_ids), rows)
+    dates = _random_dates(rng, year, months, rows)
+    amounts = (rng.lognormal(11, 1.4, rows) * rng.choice([-1, 1], rows)).astype(np.int64)
+    types = np.array(document_types)[rng.integers(0, len(document_types), rows)]
+
+    df = pl.DataFrame({
+        "Company Code": [company_code] * rows,
+        "Company code Name": [COMPANY_NAMES.get(company_code, f"SOCIETE {company_code}")] * rows,
+        "Fiscal Year": [str(year)] * rows,
+        "Document Date": dates,
+        "Posting Date": dates,
+        bp_type: np.array([bp_ids[i] for i in bp_index], dtype=np.int64),
+        f"{bp_type} Name": [f"{'FOURNISSEUR' if bp_type == 'Vendor' else 'CLIENT'} {bp_ids[i]}" for i in bp_index],
+        "Alternative Account No.": np.full(rows, 401100 if bp_type == "Vendor" else 411100, dtype=np.int64),
+        "Amount in LC": amounts,
+        "Document Number": [str(2_000_000_000 + i) for i in range(rows)],
+        "Document Header Text": _random_texts(rng, "Entête", rows, 0.5),
+        "Amount in local currency": amounts,
+        "Reference": _random_texts(rng, "REF", rows, 0.4),
+        "Text": _random_texts(rng, "Libellé", rows, 0.3),
+        "Offsetting acct no.": [str(10_000_000 + i) for i in rng.integers(0, 50, rows)],
+        "Offseet A/C Description": [f"Contrepartie {i}" for i in rng.integers(0, 50, rows)],
+        "Document Type": types,
+        "Désignation": [DOCUMENT_TYPES[t] for t in types],
+    })
+    df = df.with_columns(pl.col("Document Date").cast(pl.Date), pl.col("Posting Date").cast(pl.Date))
+    return df.select(columns).sort("Posting Date")
+
+
+def generate_dataset(root: str, scale: str = "small", rows: int = None, accounts: int = None, bps: int = None,
+                     months: int = None, files: int = None, companies=("TG13",), year: int = 2024,
+                     seed: int = 42) -> dict:
+    """
+    Écrit un jeu de données complet sous `root` et retourne les paramètres utilisés.
+    Les paramètres explicites remplacent ceux de l'échelle `scale`.
+    """
+    params = dict(SCALES[scale])
+    overrides = {"rows": rows, "accounts": accounts, "bps": bps, "months": months, "files": files}
+    params.update({name: value for name, value in overrides.items() if value is not None})
+    params.update({"companies": list(companies), "year": year, "seed": seed})
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(root, exist_ok=True)
+    data_root = os.path.join(root, "Data")
+    shutil.copy(os.path.join(REPO_ROOT, "report_layouts.json"), root)
+
+    account_list = _make_accounts(rng, params["accounts"])
+    ifrs_codes = {account: str(10_000_000 + index) for index, account in enumerate(account_list)}
+    with open(os.path.join(root, "bnk_gls.txt"), "w") as bnk_file:
+        bnk_file.write("\n".join(config.bnk_gls))
+
+    for company_code in companies:
+        df = generate_transactions(rng, company_code, year, account_list, ifrs_codes, params["rows"], params["months"])
+        _split_write(df, os.path.join(data_root, "ALL_TRANSACTIONS", company_code, str(year)), params["files"])
+
+        opening = rng.lognormal(13, 1.5, len(account_list)).astype(np.int64)
+        is_debit = rng.random(len(account_list)) < 0.5
+        initial_balance = pl.DataFrame({
+            "Numéro de compte IFRS": [ifrs_codes[a] for a in account_list],
+            "Intitulé de compte IFRS": [f"IFRS {a}" for a in account_list],
+            "numéro de compte SYSCOHADA": account_list,
+            "Intitulés de compte SYSCOHADA": [f"Compte {a}" for a in account_list],
+            "Soldes débiteurs": np.where(is_debit, opening, 0),
+            "Soldes créditeurs": np.where(is_debit, 0, -opening),
+        })
+        os.makedirs(os.path.join(data_root, "INITIAL BALANCE"), exist_ok=True)
+        initial_balance.write_excel(os.path.join(data_root, "INITIAL BALANCE", f"Initial Balance {company_code} {year}.xlsx"))
+
+        for bp_type, folder, balance_folder in [("Vendor", "ALL_VENDORS_TRANSACTIONS", "VENDORS INITIAL BALANCE"),
+                                                 ("Customer", "ALL_CUSTOMERS_TRANSACTIONS", "CUSTOMERS INITIAL BALANCE")]:
+            first_id = 50_000_000 if bp_type == "Vendor" else 60_000_000
+            bp_ids = list(range(first_id, first_id + params["bps"]))
+            df_bp = generate_bp_transactions(rng, company_code, year, bp_type, bp_ids, params["rows"] // 2, params["months"])
+            _split_write(df_bp, os.path.join(data_root, folder, company_code, str(year)), params["files"])
+
+            os.makedirs(os.path.join(data_root, balance_folder), exist_ok=True)
+            pl.DataFrame({
+                bp_type: bp_ids,
+                f"{bp_type} Name": [f"{'FOURNISSEUR' if bp_type == 'Vendor' else 'CLIENT'} {i}" for i in bp_ids],
+                "Total": rng.normal(0, 5_000_000, len(bp_ids)).astype(np.int64),
+            }).write_excel(os.path.join(data_root, balance_folder, f"Initial Balance {company_code} {year}.xlsx"))
+
+    # Plan Comptable: classes et préfixes de 2 et 3 chiffres de tous les comptes
+    codes = sorted({account[:length] for account in account_list for length in (1, 2, 3)} |
+                   {prefix for _, _, prefixes in config.COMPTE_RESULTAT_POSTES for prefix in prefixes})
+    os.makedirs(os.path.join(data_root, "STATIC"), exist_ok=True)
+    pl.DataFrame({"Numéro de Compte": codes, "Nom du Compte": [f"Comptes {code}" for code in codes]}) \
+        .write_excel(os.path.join(data_root, "STATIC", "Plan_Comptable_OHADA.xlsx"))
+
+    os.makedirs(os.path.join(root, "output"), exist_ok=True)
+    with open(os.path.join(root, "dataset.json"), "w") as params_file:
+        json.dump(params, params_file, indent=2)
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère des données comptables synthétiques")
+    parser.add_argument("--root", required=True, help="Dossier de sortie (contiendra Data/)")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--accounts", type=int)
+    parser.add_argument("--bps", type=int)
+    parser.add_argument("--months", type=int)
+    parser.add_argument("--files", type=int)
+    parser.add_argument("--companies", nargs="+", default=["TG13"])
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    params = generate_dataset(args.root, args.scale, args.rows, args.accounts, args.bps, args.months, args.files,
+                              args.companies, args.year, args.seed)
+    print(json.dumps(params, indent=2))
+
+
+if __name__ == "__main__":
+    main()
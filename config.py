@@ -13,6 +13,10 @@ transactions_data_folder = "Data/ALL_TRANSACTIONS/"
 vendors_transactions_data_folder = "Data/ALL_VENDORS_TRANSACTIONS/"
 customers_transactions_data_folder = "Data/ALL_CUSTOMERS_TRANSACTIONS/"
 output_folder = "output/"
+cache_folder = "cache/"
+prepared_frames_folder = "cache/prepared/"
+transaction_store_folder = "cache/transactions/"
+profiles_folder = "logs/profiles/"
 initial_balance_file_path = "Data/INITIAL BALANCE/Initial Balance"
 vendor_initial_balance_file_path = "Data/VENDORS INITIAL BALANCE/Initial Balance"
 customer_initial_balance_file_path = "Data/CUSTOMERS INITIAL BALANCE/Initial Balance"
@@ -29,6 +33,99 @@ year = 2024
 start_month = 1
 end_month = 12
 
+# Report cache budget: least recently accessed entries are evicted in the background
+# once the total size or the number of entries exceeds these limits.
+CACHE_MAX_SIZE_MB = 20 * 1024
+CACHE_MAX_ENTRIES = 5000
+CACHE_EVICTION_INTERVAL_SECONDS = 600
+# Files in output_folder that no cache entry references are deleted after this delay
+ORPHAN_OUTPUT_GRACE_SECONDS = 6 * 3600
+# Source-file signatures used in cache keys are reused for this many seconds before the
+# folders are checked again (longer when the optional "watchdog" watcher is running).
+CACHE_SIGNATURE_REVALIDATE_SECONDS = 5
+CACHE_SIGNATURE_WATCH = False
+CACHE_SIGNATURE_WATCHED_REVALIDATE_SECONDS = 300
+# "mtime": a source file changes when its modification date or size changes.
+# "content": a source file changes only when its content changes (hash computed when
+# mtime/size move, e.g. after a full re-copy of the Data/ tree).
+CACHE_SIGNATURE_MODE = "mtime"
+# Single-flight generation: concurrent requests for the same cache key (any worker process)
+# wait for the first generation instead of starting their own.
+GENERATION_LOCK_POLL_SECONDS = 0.5
+# A lock older than this (or whose owner process died) is considered abandoned
+GENERATION_LOCK_STALE_SECONDS = 3600
+# Asynchronous report jobs (/jobs): background worker threads per process, history retention
+REPORT_JOB_WORKERS = 2
+REPORT_JOB_RETENTION_HOURS = 48
+# Background cache warming: the most requested report variants (report, period, layout) are
+# regenerated at low priority when their source files change, before users ask for them.
+# Candidates are the CACHE_WARM_TOP_N variants with at least CACHE_WARM_MIN_REQUESTS requests
+# over the last CACHE_WARM_LOOKBACK_DAYS days (per-day counters). A variant whose generation fails
+# is retried after an interval doubling on each failure, up to CACHE_WARM_MAX_BACKOFF_SECONDS.
+CACHE_WARMING_ENABLED = True
+CACHE_WARM_INTERVAL_SECONDS = 900
+CACHE_WARM_TOP_N = 20
+CACHE_WARM_MIN_REQUESTS = 3
+CACHE_WARM_LOOKBACK_DAYS = 30
+CACHE_WARM_MAX_BACKOFF_SECONDS = 86400
+# Return each request's stage timings in the X-Report-Timing response header
+# (also enabled per request with the "X-Debug-Timing: 1" request header)
+TIMING_DEBUG_HEADER = False
+# On-demand profiling of /redirect-submit and /print_journal: a request sending this token in the
+# "X-Profile-Token" header (or the "profile_token" form field) is profiled (cProfile + stack sampling),
+# bypassing the report cache. None disables profiling.
+PROFILING_ADMIN_TOKEN = None
+PROFILING_SAMPLE_INTERVAL_SECONDS = 0.005
+# Memory budget per report generation. The peak is predicted after loading the data as
+# current RSS + DataFrame size x MEMORY_ESTIMATE_FACTOR (calibrate the factors with the
+# peak_rss_bytes / load_frame_bytes recorded in logs/timings.jsonl). Over budget, the generation
+# switches to the low-memory path ("low_memory", refused if even that path would not fit) or
+# is refused ("refuse", HTTP 503). None disables the budget.
+GENERATION_MEMORY_BUDGET_MB = None
+MEMORY_BUDGET_ACTION = "low_memory"
+MEMORY_ESTIMATE_FACTOR = 8
+LOW_MEMORY_ESTIMATE_FACTOR = 4
+MEMORY_SAMPLE_INTERVAL_SECONDS = 0.05
+# Admission control: at most MAX_CONCURRENT_GENERATIONS report generations run at once on the host,
+# across all serve.py workers (shared lock-file slots in cache/admission/; per process only on
+# Windows); within a process the others wait in a fair per-report-type queue. Past
+# GENERATION_QUEUE_DEPTH waiting requests or GENERATION_QUEUE_TIMEOUT_SECONDS of waiting, requests
+# get a 503 with Retry-After.
+# Cache hits and /print_journal are never queued. 0 disables the limit.
+MAX_CONCURRENT_GENERATIONS = 2
+GENERATION_QUEUE_DEPTH = 8
+GENERATION_QUEUE_TIMEOUT_SECONDS = 300
+GENERATION_RETRY_AFTER_SECONDS = 30
+# CPU sharing between concurrent generations. Polars has one thread pool per process sized to all
+# cores, so with "process" each generation runs in one of GENERATION_WORKER_PROCESSES worker
+# processes whose polars pool is capped at GENERATION_WORKER_POLARS_THREADS threads
+# (None: cores / min(MAX_CONCURRENT_GENERATIONS, SERVE_WORKERS x GENERATION_WORKER_PROCESSES)).
+# Keep MAX_CONCURRENT_GENERATIONS equal to the number of worker processes so queued requests wait
+# in the fair admission queue rather than in the pool.
+# Workers are recycled after GENERATION_WORKER_MAX_TASKS generations (None: never).
+# "thread" runs generations in the request thread, sharing the web process's polars pool.
+GENERATION_EXECUTOR = "thread"
+GENERATION_WORKER_PROCESSES = 2
+GENERATION_WORKER_POLARS_THREADS = None
+GENERATION_WORKER_MAX_TASKS = 50
+# Transactions of each company-year are read from Excel once, stored as uncompressed Arrow IPC in
+# transaction_store_folder and memory-mapped by every process (one shared page-cached copy).
+TRANSACTION_STORE_ENABLED = True
+# Production server (serve.py): SERVE_WORKERS waitress processes of SERVE_THREADS threads share
+# one listening socket. A worker is recycled (drained, then replaced) after
+# SERVE_WORKER_MAX_GENERATIONS report generations (None: never); on shutdown or restart, workers
+# get SERVE_GRACEFUL_TIMEOUT_SECONDS to finish their in-flight requests. In "thread" mode each
+# worker's polars pool gets cores / min(SERVE_WORKERS, MAX_CONCURRENT_GENERATIONS) threads. Only the
+# first worker runs the cache warmer. /metrics sums all workers' values, written every
+# METRICS_FLUSH_INTERVAL_SECONDS to cache/metrics/.
+SERVE_HOST = "0.0.0.0"
+SERVE_PORT = 5051
+SERVE_WORKERS = 4
+SERVE_THREADS = 4
+SERVE_WORKER_MAX_GENERATIONS = 200
+SERVE_GRACEFUL_TIMEOUT_SECONDS = 600
+METRICS_FLUSH_INTERVAL_SECONDS = 5
+
 # Mapping des codes entreprise vers leurs noms (thread-safe)
 COMPANY_MAPPING = {
     "BF10": "OLAM BURKINA SARL",
@@ -137,4 +234,80 @@ expected_dtypes = {
     "Entry Date": "Date",
     "Time of Entry": "Time",
     "User ID": "Utf8"
-}
\ No newline at end of file
+}
+
+# Compte de Résultat SYSCOHADA: postes (REF, libellé, préfixes de comptes SYSCOHADA).
+# Chaque compte de classe 6/7/8 est affecté au poste de son plus long préfixe correspondant.
+# Les montants sont présentés produits positifs / charges négatives.
+COMPTE_RESULTAT_POSTES = [
+    ("TA", "Ventes de marchandises", ["701"]),
+    ("RA", "Achats de marchandises", ["601"]),
+    ("RB", "Variation de stocks de marchandises", ["603", "6031"]),
+    ("TB", "Ventes de produits fabriqués", ["70", "702", "703", "704"]),
+    ("TC", "Travaux, services vendus", ["705", "706"]),
+    ("TD", "Produits accessoires", ["707"]),
+    ("TE", "Production stockée (ou déstockage)", ["73"]),
+    ("TF", "Production immobilisée", ["72"]),
+    ("TG", "Subventions d'exploitation", ["71"]),
+    ("TH", "Autres produits", ["7", "75"]),  # "7": comptes de produits non ventilés
+    ("TI", "Transferts de charges d'exploitation", ["78", "781"]),
+    ("RC", "Achats de matières premières et fournitures liées", ["602"]),
+    ("RD", "Variation de stocks de matières premières et fournitures liées", ["6032"]),
+    ("RE", "Autres achats", ["60", "604", "605", "608"]),
+    ("RF", "Variation de stocks d'autres approvisionnements", ["6033"]),
+    ("RG", "Transports", ["61"]),
+    ("RH", "Services extérieurs", ["62", "63"]),
+    ("RI", "Impôts et taxes", ["64"]),
+    ("RJ", "Autres charges", ["6", "65"]),  # "6": comptes de charges non ventilés
+    ("RK", "Charges de personnel", ["66"]),
+    ("TJ", "Reprises d'amortissements, provisions et dépréciations", ["79", "791", "798", "799"]),
+    ("RL", "Dotations aux amortissements, aux provisions et dépréciations", ["68", "681", "69", "691"]),
+    ("TK", "Revenus financiers et assimilés", ["77"]),
+    ("TL", "Reprises de provisions et dépréciations financières", ["797"]),
+    ("TM", "Transferts de charges financières", ["787"]),
+    ("RM", "Frais financiers et charges assimilées", ["67"]),
+    ("RN", "Dotations aux provisions et aux dépréciations financières", ["687", "697"]),
+    ("TN", "Produits des cessions d'immobilisations", ["82"]),
+    ("TO", "Autres produits HAO", ["84", "86", "88"]),
+    ("RO", "Valeurs comptables des cessions d'immobilisations", ["81"]),
+    ("RP", "Autres charges HAO", ["8", "83", "85"]),  # "8": comptes HAO non ventilés
+    ("RQ", "Participation des travailleurs", ["87"]),
+    ("RS", "Impôts sur le résultat", ["89"]),
+]
+
+# Lignes du Compte de Résultat dans l'ordre d'affichage.
+# Les soldes intermédiaires (X*) sont la somme des REF listées.
+COMPTE_RESULTAT_LIGNES = [
+    "TA", "RA", "RB",
+    ("XA", "MARGE COMMERCIALE", ["TA", "RA", "RB"]),
+    "TB", "TC", "TD",
+    ("XB", "CHIFFRE D'AFFAIRES", ["TA", "TB", "TC", "TD"]),
+    "TE", "TF", "TG", "TH", "TI", "RC", "RD", "RE", "RF", "RG", "RH", "RI", "RJ",
+    ("XC", "VALEUR AJOUTEE", ["XB", "RA", "RB", "TE", "TF", "TG", "TH", "TI", "RC", "RD", "RE", "RF", "RG", "RH", "RI", "RJ"]),
+    "RK",
+    ("XD", "EXCEDENT BRUT D'EXPLOITATION", ["XC", "RK"]),
+    "TJ", "RL",
+    ("XE", "RESULTAT D'EXPLOITATION", ["XD", "TJ", "RL"]),
+    "TK", "TL", "TM", "RM", "RN",
+    ("XF", "RESULTAT FINANCIER", ["TK", "TL", "TM", "RM", "RN"]),
+    ("XG", "RESULTAT DES ACTIVITES ORDINAIRES", ["XE", "XF"]),
+    "TN", "TO", "RO", "RP",
+    ("XH", "RESULTAT HORS ACTIVITES ORDINAIRES", ["TN", "TO", "RO", "RP"]),
+    "RQ", "RS",
+    ("XI", "RESULTAT NET", ["XG", "XH", "RQ", "RS"]),
+]
+
+# Journal des Achats / Journal des Ventes: sélection des lignes par type de pièce SAP
+# (colonne "Document Type") et/ou par libellé de type de pièce (colonne "Désignation").
+JOURNAL_SELECTIONS = {
+    JOURNAL_ACHAT: {
+        "title": "JOURNAL DES ACHATS",
+        "document_types": ["KR", "KG", "RE"],  # Facture, avoir fournisseur, facture MM
+        "designations": [],
+    },
+    JOURNAL_VENTE: {
+        "title": "JOURNAL DES VENTES",
+        "document_types": ["DR", "DG", "RV"],  # Facture, avoir client, facturation SD
+        "designations": [],
+    },
+}
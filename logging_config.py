@@ -8,6 +8,25 @@ import logging.handlers
 import os
 from datetime import datetime
 
+
+def _log_file_handler(path):
+    """
+    Handler d'un fichier de logs.
+    Sous serve.py (REPORT_SERVE_WORKERS défini), tous les workers écrivent dans le même fichier:
+    la rotation interne n'est pas sûre entre processus (un worker renomme le fichier pendant que
+    les autres écrivent encore dans l'ancien). On écrit alors en ajout avec WatchedFileHandler,
+    qui rouvre le fichier quand il a été déplacé: la rotation est faite par logrotate (sans
+    copytruncate). Hors serve.py, un seul processus écrit: rotation interne à 10 MB.
+    """
+    if os.environ.get("REPORT_SERVE_WORKERS"):
+        return logging.handlers.WatchedFileHandler(path)
+    return logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=10*1024*1024,  # 10 MB
+        backupCount=5  # Keep 5 backups
+    )
+
+
 def setup_logging():
     """
     Configure comprehensive logging for the Flask application.
@@ -34,21 +53,13 @@ def setup_logging():
     )
 
     # ===== GENERAL APP LOGS =====
-    app_handler = logging.handlers.RotatingFileHandler(
-        app_log_file,
-        maxBytes=10*1024*1024,  # 10 MB
-        backupCount=5  # Keep 5 backups
-    )
+    app_handler = _log_file_handler(app_log_file)
     app_handler.setLevel(logging.INFO)
     app_handler.setFormatter(formatter)
     logger.addHandler(app_handler)
 
     # ===== ERROR LOGS =====
-    error_handler = logging.handlers.RotatingFileHandler(
-        error_log_file,
-        maxBytes=10*1024*1024,  # 10 MB
-        backupCount=5  # Keep 5 backups
-    )
+    error_handler = _log_file_handler(error_log_file)
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
     logger.addHandler(error_handler)
@@ -59,6 +70,15 @@ def setup_logging():
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
+    # ===== TIMING RECORDS (one JSON object per request) =====
+    timings_log_file = os.path.join(log_dir, "timings.jsonl")
+    timings_handler = _log_file_handler(timings_log_file)
+    timings_handler.setFormatter(logging.Formatter(fmt='%(message)s'))
+    timings_logger = logging.getLogger("report_timings")
+    timings_logger.setLevel(logging.INFO)
+    timings_logger.propagate = False
+    timings_logger.addHandler(timings_handler)
+
     # Log startup info
     logger.info("=" * 70)
     logger.info("OHADA Reporting API Server Started")
@@ -66,6 +86,7 @@ def setup_logging():
     logger.info(f"Log Directory: {os.path.abspath(log_dir)}")
     logger.info(f"App Log: {os.path.abspath(app_log_file)}")
     logger.info(f"Error Log: {os.path.abspath(error_log_file)}")
+    logger.info(f"Timings Log: {os.path.abspath(timings_log_file)}")
     logger.info("=" * 70)
 
     return logger
@@ -1,8 +1,27 @@
 from flask import Blueprint
 from .general_ledger import general_ledger
 from .print_journal import other_actions
+from .preview_api import preview_api
+from .report_jobs import report_jobs
+from .cache_warmer import start_cache_warmer
+from .metrics import metrics, start_metrics_flush
+from .timing import init_request_timing
+from .cpu_scheduler import is_cache_warmer_process, is_worker_process
+import config
 
 
 def register_routes(app):
+    init_request_timing(app)
+
     app.register_blueprint(general_ledger)
-    app.register_blueprint(other_actions)
\ No newline at end of file
+    app.register_blueprint(other_actions)
+    app.register_blueprint(preview_api)
+    app.register_blueprint(report_jobs)
+    app.register_blueprint(metrics)
+
+    # Les workers de génération importent aussi l'application: ni préchauffage ni métriques partagées
+    # chez eux; sous serve.py, un seul worker préchauffe le cache
+    if config.CACHE_WARMING_ENABLED and is_cache_warmer_process():
+        start_cache_warmer(app)
+    if not is_worker_process():
+        start_metrics_flush()
@@ -0,0 +1,221 @@
+"""
+Contrôle d'admission des générations de rapports lourdes.
+
+Au plus MAX_CONCURRENT_GENERATIONS générations s'exécutent en même temps sur la machine, tous
+processus confondus (serve.py): en plus de sa limite locale, chaque génération prend une des
+MAX_CONCURRENT_GENERATIONS places partagées (verrous fcntl sur cache/admission/slot-<n>.lock,
+libérés automatiquement si le processus meurt). Dans un processus, les suivantes attendent dans
+une file par type de rapport, servie à tour de rôle (un Grand Livre, puis une balance, puis un
+Grand Livre...): une rafale de Grand Livres ne bloque pas les autres rapports. Au-delà de GENERATION_QUEUE_DEPTH requêtes en attente, ou après
+GENERATION_QUEUE_TIMEOUT_SECONDS d'attente, la requête est refusée tout de suite (503 + Retry-After).
+
+Seules les générations passent par ici: les rapports en cache et /print_journal ne sont jamais
+mis en file. Les générations de fond (jobs asynchrones, préchauffage) attendent leur tour sans
+limite de file ni délai. Le préchauffage (low_priority) passe après tout le monde: il n'obtient
+une place que si aucune autre génération n'attend dans le processus, n'est pas compté dans
+GENERATION_QUEUE_DEPTH, et une seule génération basse priorité tourne à la fois sur la machine
+(verrou cache/admission/low-priority.lock en plus de sa place).
+"""
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
+import config
+from routes.metrics import GENERATION_REJECTIONS
+from routes.timing import record_span
+
+try:
+    import fcntl
+except ImportError:  # Windows: limite par processus uniquement
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRejected(Exception):
+    """File d'attente des générations pleine (ou attente trop longue)."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HostSlots:
+    """Places de génération partagées par tous les processus de la machine (un fichier verrouillé par place)."""
+
+    def __init__(self, folder: str, count: int, poll_seconds: float):
+        self.folder = folder
+        self.count = count
+        self.poll_seconds = poll_seconds
+
+    def _try_lock(self, name: str):
+        handle = open(os.path.join(self.folder, name), "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except BlockingIOError:
+            handle.close()
+            return None
+
+    def _try_acquire(self, low_priority: bool):
+        os.makedirs(self.folder, exist_ok=True)
+        handles = []
+        if low_priority:
+            handle = self._try_lock("low-priority.lock")
+            if handle is None:
+                return None
+            handles.append(handle)
+        for index in range(self.count):
+            handle = self._try_lock(f"slot-{index}.lock")
+            if handle is not None:
+                return handles + [handle]
+        self.release(handles)
+        return None
+
+    def acquire(self, timeout: float = None, low_priority: bool = False):
+        """
+        Prend une place (attend au plus `timeout` secondes, sans limite si None); None si aucune place.
+        low_priority: prend aussi le verrou de la seule génération basse priorité de la machine.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            handles = self._try_acquire(low_priority)
+            if handles is not None:
+                return handles
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_seconds)
+
+    @staticmethod
+    def release(handles) -> None:
+        for handle in handles:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+
+class AdmissionController:
+    """Sémaphore à files équitables par type de rapport."""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: float = None, host_slots=None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.host_slots = host_slots
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+        self._queues = OrderedDict()  # report_type -> deque d'Event, dans l'ordre de service
+        self._low_running = 0
+        self._low_queue = deque()  # Event des générations basse priorité, servies en dernier
+
+    def _reject(self, report_type: str, reason: str):
+        GENERATION_REJECTIONS.inc(report_type=report_type)
+        logger.warning(f"Génération {report_type} refusée: {reason}")
+        raise GenerationRejected(reason, config.GENERATION_RETRY_AFTER_SECONDS)
+
+    def _low_priority_can_start(self) -> bool:
+        """Place libre, personne d'autre en attente, aucune génération basse priorité en cours."""
+        return self._running < self.max_concurrent and not self._queued and not self._low_running
+
+    def _grant_next(self) -> None:
+        """Attribue les places libres aux files, à tour de rôle, puis à la basse priorité (sous self._lock)."""
+        while self._running < self.max_concurrent and self._queued:
+            report_type, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            del self._queues[report_type]
+            if queue:
+                self._queues[report_type] = queue  # le type passe en fin de tour
+            self._queued -= 1
+            self._running += 1
+            waiter.set()
+        if self._low_queue and self._low_priority_can_start():
+            self._running += 1
+            self._low_running += 1
+            self._low_queue.popleft().set()
+
+    @contextmanager
+    def admit(self, report_type: str, background: bool = False, low_priority: bool = False):
+        """
+        Exécute le bloc dès qu'une place est libre.
+        background=False: lève GenerationRejected si la file est pleine ou l'attente trop longue.
+        low_priority=True (préchauffage, implique background): servi après toutes les autres générations.
+        """
+        if not self.max_concurrent:
+            yield
+            return
+
+        background = background or low_priority
+        start = time.perf_counter()
+        waiter = None
+        with self._lock:
+            if low_priority:
+                if self._low_priority_can_start():
+                    self._running += 1
+                    self._low_running += 1
+                else:
+                    waiter = threading.Event()
+                    self._low_queue.append(waiter)
+            elif self._running < self.max_concurrent and not self._queued:
+                self._running += 1
+            elif not background and self._queued >= self.max_queued:
+                self._reject(report_type, f"{self._queued} génération(s) déjà en attente")
+            else:
+                waiter = threading.Event()
+                self._queues.setdefault(report_type, deque()).append(waiter)
+                self._queued += 1
+
+        if waiter is not None:
+            granted = waiter.wait(None if background else self.queue_timeout)
+            if not granted:
+                with self._lock:
+                    if not waiter.is_set():
+                        queue = self._queues[report_type]
+                        queue.remove(waiter)
+                        if not queue:
+                            del self._queues[report_type]
+                        self._queued -= 1
+                        self._reject(report_type, f"attente supérieure à {self.queue_timeout}s")
+
+        slot = None
+        if self.host_slots is not None:
+            timeout = None
+            if not background and self.queue_timeout is not None:
+                timeout = max(0.0, self.queue_timeout - (time.perf_counter() - start))
+            slot = self.host_slots.acquire(timeout, low_priority=low_priority)
+            if slot is None:
+                self._release_local(low_priority)
+                self._reject(report_type, f"attente supérieure à {self.queue_timeout}s (autres processus)")
+        if waiter is not None or self.host_slots is not None:
+            record_span("admission.wait", time.perf_counter() - start)
+
+        try:
+            yield
+        finally:
+            if slot is not None:
+                self.host_slots.release(slot)
+            self._release_local(low_priority)
+
+    def _release_local(self, low_priority: bool = False) -> None:
+        with self._lock:
+            self._running -= 1
+            if low_priority:
+                self._low_running -= 1
+            self._grant_next()
+
+    def snapshot(self) -> dict:
+        """Générations en cours et en attente par type de rapport."""
+        with self._lock:
+            return {"running": self._running,
+                    "queued": {report_type: len(queue) for report_type, queue in self._queues.items()},
+                    "low_priority_queued": len(self._low_queue)}
+
+
+_host_slots = None
+if fcntl is not None and config.MAX_CONCURRENT_GENERATIONS:
+    _host_slots = HostSlots(os.path.join(config.cache_folder, "admission"), config.MAX_CONCURRENT_GENERATIONS,
+                            config.GENERATION_LOCK_POLL_SECONDS)
+admission_controller = AdmissionController(config.MAX_CONCURRENT_GENERATIONS, config.GENERATION_QUEUE_DEPTH,
+                                           config.GENERATION_QUEUE_TIMEOUT_SECONDS, host_slots=_host_slots)
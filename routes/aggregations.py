@@ -0,0 +1,161 @@
+"""
+Vectorized aggregation engine for balances, ledger summaries and the income statement.
+
+Every figure is computed with a handful of polars group_by/join passes instead of
+filtering the transaction frame once per account. The conventions are the same as
+the Excel generators: debits are positive, credits negative, and class 6/7/8
+accounts have no opening balance.
+"""
+
+import polars as pl
+import config
+
+MANAGEMENT_CLASSES = ["6", "7", "8"]
+
+AMOUNT_COLUMNS = [
+    "opening_debit", "opening_credit",
+    "movement_debit", "movement_credit",
+    "cumulative_debit", "cumulative_credit",
+    "balance_debit", "balance_credit",
+]
+
+
+def aggregate_movements(df: pl.DataFrame, by: str, amount_column: str = config.amount_column) -> pl.DataFrame:
+    """
+    Somme des mouvements débit/crédit et nombre de lignes par valeur de `by`.
+    Les crédits restent négatifs (convention des montants source).
+    """
+    if df.is_empty():
+        return pl.DataFrame(schema={by: pl.Utf8, "line_count": pl.UInt32,
+                                    "movement_debit": pl.Float64, "movement_credit": pl.Float64})
+
+    amount = pl.col(amount_column)
+    return df.group_by(by).agg([
+        pl.len().alias("line_count"),
+        pl.when(amount > 0).then(amount).otherwise(0).sum().cast(pl.Float64).alias("movement_debit"),
+        pl.when(amount <= 0).then(amount).otherwise(0).sum().cast(pl.Float64).alias("movement_credit"),
+    ])
+
+
+def compute_account_balances(df: pl.DataFrame, df_initial_balance: pl.DataFrame) -> pl.DataFrame:
+    """
+    Calcule la balance par compte SYSCOHADA (mêmes règles que la Balance Générale):
+    à nouveau, mouvements, cumuls et solde, plus le nombre de lignes du grand livre.
+
+    Les comptes sont ceux de la balance d'ouverture (hors "OHADA VIDES"), triés.
+    """
+    account_col = config.SYSCOHADA_column_in_initial_balance
+    is_management = pl.col("account").str.slice(0, 1).is_in(MANAGEMENT_CLASSES)
+
+    accounts = (
+        df_initial_balance
+        .filter(pl.col(account_col) != "OHADA VIDES")
+        .group_by(account_col, maintain_order=True)
+        .agg([
+            pl.col(config.SYSCOHADA_desc_column_in_initial_balance).first().alias("description"),
+            pl.col(config.debit_column_label).sum().alias("_opening_debit"),
+            pl.col(config.credit_column_label).sum().alias("_opening_credit"),
+        ])
+        .rename({account_col: "account"})
+        .with_columns([
+            pl.when(is_management).then(0.0).otherwise(pl.col("_opening_debit")).alias("opening_debit"),
+            pl.when(is_management).then(0.0).otherwise(-pl.col("_opening_credit").abs()).alias("opening_credit"),
+            pl.when(is_management).then(pl.lit("gestion")).otherwise(pl.lit("bilan")).alias("category"),
+        ])
+        .drop(["_opening_debit", "_opening_credit"])
+    )
+
+    movements = aggregate_movements(df, config.SYSCOHADA_column_in_main_data).rename(
+        {config.SYSCOHADA_column_in_main_data: "account"}
+    )
+
+    balances = (
+        accounts
+        .join(movements, on="account", how="left")
+        .with_columns([
+            pl.col("line_count").fill_null(0),
+            pl.col("movement_debit").fill_null(0.0),
+            pl.col("movement_credit").fill_null(0.0),
+        ])
+        .with_columns([
+            (pl.col("movement_debit") + pl.col("opening_debit")).alias("cumulative_debit"),
+            (pl.col("movement_credit") + pl.col("opening_credit")).alias("cumulative_credit"),
+        ])
+        .with_columns((pl.col("cumulative_credit") + pl.col("cumulative_debit")).alias("balance"))
+        .with_columns([
+            pl.when(pl.col("balance") > 0).then(pl.col("balance")).otherwise(0.0).alias("balance_debit"),
+            pl.when(pl.col("balance") <= 0).then(pl.col("balance")).otherwise(0.0).alias("balance_credit"),
+        ])
+        .sort("account")
+    )
+
+    return balances.select(["account", "description", "category", "line_count"] + AMOUNT_COLUMNS + ["balance"])
+
+
+def compute_group_totals(balances: pl.DataFrame, prefix_length: int, mapping: dict = None) -> pl.DataFrame:
+    """
+    Sous-totaux par préfixe de compte (2 caractères = niveau 2, 1 caractère = niveau 1),
+    avec le libellé issu du Plan Comptable OHADA.
+    """
+    mapping = mapping or {}
+    totals = (
+        balances
+        .with_columns(pl.col("account").str.slice(0, prefix_length).alias("group"))
+        .group_by("group", maintain_order=True)
+        .agg([pl.col(col).sum() for col in AMOUNT_COLUMNS])
+        .sort("group")
+    )
+    descriptions = [mapping.get(group, "") for group in totals["group"].to_list()]
+    return totals.with_columns(pl.Series("description", descriptions, dtype=pl.Utf8))
+
+
+def compute_category_totals(balances: pl.DataFrame) -> dict:
+    """Totaux Comptes de Bilan / Comptes de Gestion / Grand Total Général."""
+    totals = {}
+    for category in ["bilan", "gestion"]:
+        subset = balances.filter(pl.col("category") == category)
+        totals[category] = {col: float(subset[col].sum()) for col in AMOUNT_COLUMNS}
+    totals["general"] = {col: float(balances[col].sum()) for col in AMOUNT_COLUMNS}
+    return totals
+
+
+def match_longest_prefix(df: pl.DataFrame, account_col: str, prefix_map: dict, alias: str) -> pl.DataFrame:
+    """
+    Ajoute la colonne `alias` avec la valeur de `prefix_map` du plus long préfixe
+    correspondant au compte (null si aucun préfixe ne correspond). Une expression par
+    longueur de préfixe, sans boucle sur les comptes.
+    """
+    lengths = sorted({len(prefix) for prefix in prefix_map}, reverse=True)
+    candidates = []
+    for length in lengths:
+        table = {prefix: value for prefix, value in prefix_map.items() if len(prefix) == length}
+        candidates.append(
+            pl.when(pl.col(account_col).str.len_chars() >= length)
+            .then(pl.col(account_col).str.slice(0, length).replace_strict(table, default=None, return_dtype=pl.Utf8))
+        )
+    if not candidates:
+        return df.with_columns(pl.lit(None, dtype=pl.Utf8).alias(alias))
+    return df.with_columns(pl.coalesce(candidates).alias(alias))
+
+
+def compute_income_statement_accounts(df: pl.DataFrame, postes: list, plan_mapping: dict = None) -> pl.DataFrame:
+    """
+    Agrège les comptes de classe 6/7/8 en un seul passage et affecte chaque compte à un poste
+    du Compte de Résultat (REF) et à un poste du Plan Comptable OHADA.
+    Le montant net est présenté produits positifs / charges négatives.
+    """
+    account_col = config.SYSCOHADA_column_in_main_data
+    management_df = df.filter(pl.col(account_col).str.slice(0, 1).is_in(MANAGEMENT_CLASSES))
+
+    ref_map = {prefix: ref for ref, _, prefixes in postes for prefix in prefixes}
+    plan_map = {str(code): f"{code}-{desc}" for code, desc in (plan_mapping or {}).items()}
+
+    accounts = (
+        aggregate_movements(management_df, account_col)
+        .rename({account_col: "account"})
+        .with_columns((-(pl.col("movement_debit") + pl.col("movement_credit"))).alias("net"))
+    )
+    accounts = match_longest_prefix(accounts, "account", ref_map, "ref")
+    accounts = match_longest_prefix(accounts, "account", plan_map, "plan_group")
+
+    return accounts.sort("account")
@@ -0,0 +1,44 @@
+"""
+Fichiers Arrow IPC versionnés partagés entre processus (stock de transactions, données préparées).
+
+Un fichier <préfixe><signature>.arrow est écrit dans un fichier temporaire puis renommé
+(os.replace): un lecteur voit l'ancienne version ou la nouvelle, jamais un fichier partiel. Les
+autres versions du même préfixe sont ensuite supprimées. Les lectures sont en mémoire mappée.
+"""
+
+import glob
+import logging
+import os
+import uuid
+import polars as pl
+
+logger = logging.getLogger(__name__)
+
+
+def read_arrow(path: str, description: str):
+    """DataFrame mappé en mémoire depuis path, ou None si le fichier est absent ou illisible."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return pl.read_ipc(path, memory_map=True)
+    except Exception as e:
+        logger.warning(f"{description} illisible ({path}): {e}")
+        return None
+
+
+def write_arrow(df: pl.DataFrame, path: str, prefix: str) -> None:
+    """Écrit df dans path (non compressé, écriture atomique) puis supprime les autres versions de prefix."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_file = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.write_ipc(temporary_file, compression="uncompressed")
+        os.replace(temporary_file, path)
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+    for previous_file in glob.glob(f"{glob.escape(prefix)}*.arrow"):
+        if previous_file != path:
+            try:
+                os.remove(previous_file)  # les processus qui l'ont mappé gardent leur copie
+            except OSError:
+                pass
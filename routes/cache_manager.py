@@ -1,46 +1,171 @@
 import os
 import json
+import sqlite3
 import hashlib
 import logging
+import socket
+import threading
+import time
 from datetime import datetime
 from typing import Optional, Dict, List
 import config
 import glob
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Taille des blocs lus pour le hash du contenu des fichiers sources
+HASH_CHUNK_SIZE = 1024 * 1024
+
 logger = logging.getLogger(__name__)
 
 class CacheManager:
     """
     Gère le cache robuste basé sur la signature de tous les fichiers impliqués.
     Invalide automatiquement si UN fichier source change.
+
+    Les métadonnées sont stockées dans une base SQLite (mode WAL) indexée par clé de cache:
+    lectures et écritures concurrentes sûres entre threads et entre processus.
     """
 
-    def __init__(self, cache_folder: str = "cache/"):
+    def __init__(self, cache_folder: str = config.cache_folder):
         self.cache_folder = cache_folder
-        self.cache_metadata_file = os.path.join(cache_folder, "cache_metadata.json")
+        self.cache_db_file = os.path.join(cache_folder, "cache_metadata.db")
+        self.legacy_metadata_file = os.path.join(cache_folder, "cache_metadata.json")
+
+        # Une connexion SQLite par thread (et par processus)
+        self._local = threading.local()
+
+        # Signatures des fichiers sources mémorisées (clé de cache sans glob/stat à chaque requête)
+        self._signature_lock = threading.Lock()
+        self._directory_memo = {}  # dossier -> (vérifié_à, signature du dossier, fichiers)
+        self._file_signature_memo = {}  # fichier -> (vérifié_à, signature)
+        self._signature_observer = None
+        self._content_hash_memo = {}  # fichier -> (device, inode, mtime_ns, taille, hash)
+
+        # Éviction LRU en arrière-plan (démarrée par start_background_eviction)
+        self._eviction_requested = threading.Event()
+        self._eviction_thread = None
 
         # Créer le dossier cache s'il n'existe pas
         os.makedirs(cache_folder, exist_ok=True)
 
-        # Initialiser le fichier de métadonnées
-        self._init_metadata_file()
+        # Initialiser la base de métadonnées
+        self._init_database()
+        self._migrate_legacy_metadata()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Retourne la connexion SQLite du thread courant (recréée après un fork)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.cache_db_file, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _init_database(self):
+        """Crée la table des métadonnées du cache si elle n'existe pas."""
+        self._get_connection().execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                cache_key TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                accessed_at TEXT NOT NULL
+            )
+        """)
+
+        # Colonnes ajoutées pour l'éviction (bases créées par une version antérieure)
+        connection = self._get_connection()
+        existing_columns = {row[1] for row in connection.execute("PRAGMA table_info(cache_entries)")}
+        for column, column_type in [("key_variant", "TEXT"), ("signature", "TEXT"), ("file_size", "INTEGER")]:
+            if column not in existing_columns:
+                try:
+                    connection.execute(f"ALTER TABLE cache_entries ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    pass  # another process added it concurrently
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed_at ON cache_entries (accessed_at)")
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_variant ON cache_entries (key_variant, created_at)")
+
+        # Demandes par variante de rapport (clé sans signature) et par jour, pour le préchauffage.
+        # L'ancienne table variant_requests (compteur cumulé sans date) ne permettait pas de compter
+        # les demandes d'une fenêtre: elle est remplacée.
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS variant_request_days (
+                key_variant TEXT NOT NULL,
+                day TEXT NOT NULL,
+                request_count INTEGER NOT NULL,
+                last_requested_at TEXT NOT NULL,
+                PRIMARY KEY (key_variant, day)
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_variant_request_days_day ON variant_request_days (day)")
+        connection.execute("DROP TABLE IF EXISTS variant_requests")
+
+        # Verrous de génération (single-flight entre threads et processus)
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS generation_locks (
+                cache_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                acquired_at REAL NOT NULL
+            )
+        """)
+
+        # Hash du contenu des fichiers sources (CACHE_SIGNATURE_MODE = "content")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                file_path TEXT PRIMARY KEY,
+                device INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                file_size INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """)
+
+    def _migrate_legacy_metadata(self):
+        """Importe l'ancien fichier cache_metadata.json une seule fois, puis le renomme."""
+        if not os.path.exists(self.legacy_metadata_file):
+            return
+
+        try:
+            with open(self.legacy_metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ancien fichier de métadonnées illisible, ignoré: {e}")
+            metadata = {}
 
-    def _init_metadata_file(self):
-        """Initialise le fichier JSON de métadonnées du cache."""
-        if not os.path.exists(self.cache_metadata_file):
-            with open(self.cache_metadata_file, 'w', encoding='utf-8') as f:
-                json.dump({}, f)
+        now = datetime.now().isoformat()
+        rows = [(key, info.get("file_path"), info.get("created_at", now), info.get("accessed_at", now))
+                for key, info in metadata.items() if info.get("file_path")]
+        connection = self._get_connection()
+        connection.executemany(
+            "INSERT OR IGNORE INTO cache_entries (cache_key, file_path, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        try:
+            os.replace(self.legacy_metadata_file, self.legacy_metadata_file + ".migrated")
+        except OSError:
+            pass
+        logger.info(f"{len(rows)} entrées de cache migrées vers {self.cache_db_file}")
 
     def _get_file_signature(self, file_path: str) -> str:
         """
-        Calcule la signature d'un fichier (timestamp + taille).
-        Retourne "" si le fichier n'existe pas.
+        Calcule la signature d'un fichier (timestamp + taille, ou hash du contenu
+        si CACHE_SIGNATURE_MODE = "content"). Retourne "" si le fichier n'existe pas.
         """
         try:
             if not os.path.exists(file_path):
                 return ""
 
             stat = os.stat(file_path)
+            if config.CACHE_SIGNATURE_MODE == "content" and os.path.isfile(file_path):
+                return f"{stat.st_size}_{self._get_content_hash(file_path, stat)}"
+
             timestamp = stat.st_mtime
             size = stat.st_size
             return f"{timestamp}_{size}"
@@ -48,6 +173,140 @@ class CacheManager:
             logger.error(f"Erreur lors du calcul de signature pour {file_path}: {e}")
             return ""
 
+    @staticmethod
+    def _hash_file(file_path: str) -> str:
+        """Hash du contenu lu par blocs: xxh3-128 si xxhash est installé, sinon BLAKE2b."""
+        hasher = xxhash.xxh3_128() if xxhash else hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _get_content_hash(self, file_path: str, stat: os.stat_result) -> str:
+        """
+        Retourne le hash du contenu d'un fichier. Il n'est recalculé que si l'inode, la date
+        de modification ou la taille ont changé; sinon il est relu en mémoire ou dans file_hashes.
+        """
+        identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        memo = self._content_hash_memo.get(file_path)
+        if memo and memo[:4] == identity:
+            return memo[4]
+
+        connection = self._get_connection()
+        row = connection.execute(
+            "SELECT device, inode, mtime_ns, file_size, digest FROM file_hashes WHERE file_path = ?", (file_path,)
+        ).fetchone()
+        if row and tuple(row[:4]) == identity:
+            digest = row[4]
+        else:
+            digest = self._hash_file(file_path)
+            connection.execute(
+                """
+                INSERT INTO file_hashes (file_path, device, inode, mtime_ns, file_size, digest) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(file_path) DO UPDATE SET
+                    device = excluded.device, inode = excluded.inode, mtime_ns = excluded.mtime_ns,
+                    file_size = excluded.file_size, digest = excluded.digest
+                """,
+                (file_path, *identity, digest)
+            )
+            if row and row[4] == digest:
+                logger.info(f"Contenu inchangé malgré la date de modification: {file_path}")
+
+        with self._signature_lock:
+            self._content_hash_memo[file_path] = (*identity, digest)
+        return digest
+
+    def _get_revalidate_seconds(self) -> float:
+        """Fenêtre pendant laquelle une signature mémorisée est réutilisée sans toucher au disque."""
+        if self._signature_observer is not None and self._signature_observer.is_alive():
+            return config.CACHE_SIGNATURE_WATCHED_REVALIDATE_SECONDS
+        return config.CACHE_SIGNATURE_REVALIDATE_SECONDS
+
+    def _get_memoized_file_signature(self, file_path: str) -> str:
+        """_get_file_signature, mémorisée pendant la fenêtre de revalidation."""
+        now = time.monotonic()
+        memo = self._file_signature_memo.get(file_path)
+        if memo and now - memo[0] < self._get_revalidate_seconds():
+            return memo[1]
+
+        signature = self._get_file_signature(file_path)
+        with self._signature_lock:
+            self._file_signature_memo[file_path] = (now, signature)
+        return signature
+
+    def _list_directory(self, directory: str) -> List[str]:
+        """
+        Liste les fichiers d'un dossier de données (équivalent de glob(directory/*)).
+        La liste est réutilisée pendant la fenêtre de revalidation, puis tant que la date de
+        modification du dossier ne change pas (aucun fichier ajouté, supprimé ou renommé).
+        """
+        now = time.monotonic()
+        memo = self._directory_memo.get(directory)
+        if memo and now - memo[0] < self._get_revalidate_seconds():
+            return memo[2]
+
+        directory_signature = self._get_file_signature(directory)
+        if memo and directory_signature and memo[1] == directory_signature:
+            files = memo[2]
+        else:
+            files = glob.glob(os.path.join(directory, "*"))
+
+        with self._signature_lock:
+            self._directory_memo[directory] = (now, directory_signature, files)
+        return files
+
+    def invalidate_signatures(self, path: Optional[str] = None) -> None:
+        """Oublie les signatures mémorisées (toutes, ou celles situées sous `path`)."""
+        with self._signature_lock:
+            if path is None:
+                self._directory_memo.clear()
+                self._file_signature_memo.clear()
+                return
+            path = os.path.abspath(path)
+            for memo in (self._directory_memo, self._file_signature_memo):
+                for memo_path in list(memo):
+                    memo_abspath = os.path.abspath(memo_path)
+                    if memo_abspath == path or memo_abspath.startswith(path + os.sep) \
+                            or path.startswith(memo_abspath + os.sep):
+                        memo.pop(memo_path, None)
+
+    def start_signature_watcher(self, folders: Optional[List[str]] = None) -> bool:
+        """
+        Surveille les dossiers de données avec watchdog (optionnel) pour invalider les signatures
+        dès qu'un fichier change. Retourne False si watchdog n'est pas installé.
+        """
+        if self._signature_observer is not None and self._signature_observer.is_alive():
+            return True
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.warning("watchdog n'est pas installé: signatures revalidées toutes les "
+                           f"{config.CACHE_SIGNATURE_REVALIDATE_SECONDS}s")
+            return False
+
+        cache_manager = self
+
+        class _InvalidateSignatures(FileSystemEventHandler):
+            def on_any_event(self, event):
+                cache_manager.invalidate_signatures(os.path.dirname(event.src_path))
+                if getattr(event, "dest_path", None):
+                    cache_manager.invalidate_signatures(os.path.dirname(event.dest_path))
+
+        folders = folders or [config.transactions_data_folder, config.vendors_transactions_data_folder,
+                              config.customers_transactions_data_folder, os.path.dirname(config.initial_balance_file_path)]
+        observer = Observer()
+        observer.daemon = True
+        handler = _InvalidateSignatures()
+        for folder in dict.fromkeys(folder for folder in folders if folder and os.path.isdir(folder)):
+            observer.schedule(handler, folder, recursive=True)
+        observer.start()
+
+        self._signature_observer = observer
+        self.invalidate_signatures()
+        logger.info("Surveillance des dossiers de données activée pour les signatures du cache")
+        return True
+
     def _get_files_for_report(self, report_type: str, company_code: str, year: str,
                              bp_type: Optional[str] = None, bnk: bool = False) -> List[str]:
         """
@@ -57,11 +316,10 @@ class CacheManager:
 
         # Fichiers de transactions
         if report_type in [config.GRAND_LIVRE_COMPTA_GEN, config.BALANCE_GEN,
-                          config.GRAND_LIVRE_BNK, config.BALANCE_GEN_BNK]:
+                          config.GRAND_LIVRE_BNK, config.BALANCE_GEN_BNK, config.COMPTE_RESULTAT,
+                          config.JOURNAL_ACHAT, config.JOURNAL_VENTE]:
             # Transactions générales
-            transactions_pattern = os.path.join(config.transactions_data_folder,
-                                               company_code, year, "*")
-            files.extend(glob.glob(transactions_pattern))
+            files.extend(self._list_directory(os.path.join(config.transactions_data_folder, company_code, year)))
 
             # Balance d'ouverture générale
             initial_balance_file = f"{config.initial_balance_file_path} {company_code} {year}.xlsx"
@@ -71,15 +329,13 @@ class CacheManager:
             if bnk or report_type in [config.GRAND_LIVRE_BNK, config.BALANCE_GEN_BNK]:
                 files.append("bnk_gls.txt")
 
-            # Fichier Plan Comptable pour balance générale
-            if report_type in [config.BALANCE_GEN, config.BALANCE_GEN_BNK]:
+            # Fichier Plan Comptable pour balance générale et compte de résultat
+            if report_type in [config.BALANCE_GEN, config.BALANCE_GEN_BNK, config.COMPTE_RESULTAT]:
                 files.append(config.general_balance_mapping_file_path)
 
         elif report_type in [config.GRAND_LIVRE_FOURN, config.BALANCE_GEN_FOURN]:
             # Transactions fournisseurs
-            vendors_pattern = os.path.join(config.vendors_transactions_data_folder,
-                                          company_code, year, "*")
-            files.extend(glob.glob(vendors_pattern))
+            files.extend(self._list_directory(os.path.join(config.vendors_transactions_data_folder, company_code, year)))
 
             # Balance d'ouverture fournisseurs
             vendor_balance_file = f"{config.vendor_initial_balance_file_path} {company_code} {year}.xlsx"
@@ -91,9 +347,7 @@ class CacheManager:
 
         elif report_type in [config.GRAND_LIVRE_CLIENT, config.BALANCE_GEN_CLIENT]:
             # Transactions clients
-            customers_pattern = os.path.join(config.customers_transactions_data_folder,
-                                            company_code, year, "*")
-            files.extend(glob.glob(customers_pattern))
+            files.extend(self._list_directory(os.path.join(config.customers_transactions_data_folder, company_code, year)))
 
             # Balance d'ouverture clients
             customer_balance_file = f"{config.customer_initial_balance_file_path} {company_code} {year}.xlsx"
@@ -114,13 +368,26 @@ class CacheManager:
 
         # Trier pour consistance
         for file_path in sorted(files):
-            sig = self._get_file_signature(file_path)
+            sig = self._get_memoized_file_signature(file_path)
             file_signatures.append(f"{file_path}:{sig}")
 
         # Créer un hash global
         combined = "|".join(file_signatures)
         return hashlib.md5(combined.encode()).hexdigest()
 
+    def get_data_signature(self, report_type: str, company_code: str, year: str,
+                           bp_type: Optional[str] = None, bnk: bool = False) -> str:
+        """Signature des fichiers sources d'un rapport pour une société et une année (sans période)."""
+        return self._compute_signature(self._get_files_for_report(report_type, company_code, year, bp_type, bnk))
+
+    def get_directory_signature(self, directory: str):
+        """
+        Fichiers d'un dossier de données et leur signature commune, avec les mêmes mémos que les
+        clés de cache (liste du dossier et signatures de fichiers): (fichiers, signature).
+        """
+        files = self._list_directory(directory)
+        return files, self._compute_signature(files)
+
     def get_cache_key(self, report_type: str, company_code: str, year: str,
                      start_month: int, end_month: int,
                      bp_type: Optional[str] = None, bnk: bool = False) -> str:
@@ -138,33 +405,44 @@ class CacheManager:
         cache_key = f"{report_type}:{company_code}:{year}:{start_month}:{end_month}:{signature}"
         return cache_key
 
+    @staticmethod
+    def _split_cache_key(cache_key: str):
+        """
+        Sépare une clé {report_type}:{company_code}:{year}:{start_month}:{end_month}:{signature}{suffix}
+        en (variante, signature). La variante est la clé sans la signature: deux entrées de même
+        variante mais de signatures différentes correspondent à des versions successives du rapport.
+        """
+        parts = cache_key.split(":", 5)
+        if len(parts) < 6 or len(parts[5]) < 32:
+            return cache_key, ""
+        signature, suffix = parts[5][:32], parts[5][32:]
+        return ":".join(parts[:5]) + ":" + suffix, signature
+
     def get_cache(self, cache_key: str) -> Optional[str]:
         """
         Récupère un fichier du cache si:
         1. Le fichier cache existe
         2. La signature est toujours valide
 
-        Cache lives forever (no TTL).
-        Cache is invalidated only when source files change (signature-based invalidation).
+        No TTL: cache is invalidated when source files change (signature-based invalidation),
+        and least recently accessed entries are evicted in the background (see evict()).
         Retourne le chemin du fichier en cache, ou None si invalide/inexistant.
         """
-        # Charger les métadonnées
-        with open(self.cache_metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        connection = self._get_connection()
+        row = connection.execute(
+            "SELECT file_path FROM cache_entries WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
 
         # Vérifier si le cache existe dans les métadonnées
-        if cache_key not in metadata:
+        if row is None:
             return None
 
-        cache_info = metadata[cache_key]
-        cache_file = cache_info.get("file_path")
+        cache_file = row[0]
 
         # Vérifier que le fichier cache existe
         if not cache_file or not os.path.exists(cache_file):
             # Supprimer l'entrée du cache si le fichier n'existe plus
-            del metadata[cache_key]
-            with open(self.cache_metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f)
+            connection.execute("DELETE FROM cache_entries WHERE cache_key = ?", (cache_key,))
             return None
 
         # Cache is valid if file exists (no TTL check)
@@ -174,80 +452,300 @@ class CacheManager:
         """
         Stocke un fichier en cache et met à jour les métadonnées.
         """
-        # Charger les métadonnées actuelles
-        with open(self.cache_metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-
-        # Ajouter la nouvelle entrée
-        metadata[cache_key] = {
-            "file_path": file_path,
-            "created_at": datetime.now().isoformat(),
-            "accessed_at": datetime.now().isoformat()
-        }
-
-        # Sauvegarder les métadonnées
-        with open(self.cache_metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
+        now = datetime.now().isoformat()
+        key_variant, signature = self._split_cache_key(cache_key)
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            file_size = 0
+
+        self._get_connection().execute(
+            """
+            INSERT INTO cache_entries (cache_key, file_path, created_at, accessed_at, key_variant, signature, file_size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                file_path = excluded.file_path,
+                created_at = excluded.created_at,
+                accessed_at = excluded.accessed_at,
+                file_size = excluded.file_size
+            """,
+            (cache_key, file_path, now, now, key_variant, signature, file_size)
+        )
+
+        # Laisser le thread d'éviction vérifier le budget (sans latence pour la requête)
+        self._eviction_requested.set()
 
     def access_cache(self, cache_key: str) -> None:
         """Mise à jour du timestamp d'accès au cache."""
-        with open(self.cache_metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-
-        if cache_key in metadata:
-            metadata[cache_key]["accessed_at"] = datetime.now().isoformat()
-            with open(self.cache_metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2)
+        self._get_connection().execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE cache_key = ?",
+            (datetime.now().isoformat(), cache_key)
+        )
+
+    def record_request(self, cache_key: str) -> None:
+        """Compte une demande utilisateur pour la variante de la clé (hit ou miss)."""
+        key_variant, _ = self._split_cache_key(cache_key)
+        now = datetime.now().isoformat()
+        self._get_connection().execute(
+            """
+            INSERT INTO variant_request_days (key_variant, day, request_count, last_requested_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT(key_variant, day) DO UPDATE SET
+                request_count = request_count + 1,
+                last_requested_at = excluded.last_requested_at
+            """,
+            (key_variant, now[:10], now)
+        )
+
+    def get_popular_variants(self, limit: int, min_requests: int, since: str) -> List[str]:
+        """
+        Variantes demandées au moins `min_requests` fois depuis le jour de `since` (ISO), par nombre de
+        demandes décroissant. Les compteurs des jours antérieurs sont supprimés au passage.
+        """
+        connection = self._get_connection()
+        connection.execute("DELETE FROM variant_request_days WHERE day < ?", (since[:10],))
+        return [row[0] for row in connection.execute(
+            """
+            SELECT key_variant FROM variant_request_days
+            WHERE day >= ?
+            GROUP BY key_variant
+            HAVING SUM(request_count) >= ?
+            ORDER BY SUM(request_count) DESC, MAX(last_requested_at) DESC LIMIT ?
+            """,
+            (since[:10], min_requests, limit)
+        )]
+
+    def _remove_file(self, cache_file: Optional[str]) -> None:
+        """Supprime un fichier de cache sans lever d'erreur."""
+        if cache_file and os.path.exists(cache_file):
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
 
     def clear_cache(self, cache_key: Optional[str] = None) -> None:
         """
         Supprime une entrée de cache spécifique, ou tout le cache si cache_key est None.
         """
-        with open(self.cache_metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        connection = self._get_connection()
 
         if cache_key:
             # Supprimer l'entrée spécifique
-            if cache_key in metadata:
-                cache_file = metadata[cache_key].get("file_path")
-                if cache_file and os.path.exists(cache_file):
-                    try:
-                        os.remove(cache_file)
-                    except:
-                        pass
-                del metadata[cache_key]
+            row = connection.execute(
+                "SELECT file_path FROM cache_entries WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is not None:
+                self._remove_file(row[0])
+                connection.execute("DELETE FROM cache_entries WHERE cache_key = ?", (cache_key,))
         else:
             # Supprimer tout le cache
-            for cache_info in metadata.values():
-                cache_file = cache_info.get("file_path")
-                if cache_file and os.path.exists(cache_file):
-                    try:
-                        os.remove(cache_file)
-                    except:
-                        pass
-            metadata = {}
-
-        with open(self.cache_metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2)
+            for (cache_file,) in connection.execute("SELECT file_path FROM cache_entries").fetchall():
+                self._remove_file(cache_file)
+            connection.execute("DELETE FROM cache_entries")
 
     def get_cache_stats(self) -> Dict:
-        """Retourne des statistiques sur le cache."""
-        with open(self.cache_metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
-
-        total_entries = len(metadata)
-        total_size = 0
-
-        for cache_info in metadata.values():
-            cache_file = cache_info.get("file_path")
-            if cache_file and os.path.exists(cache_file):
-                try:
-                    total_size += os.path.getsize(cache_file)
-                except:
-                    pass
+        """Retourne des statistiques sur le cache (tailles enregistrées à la mise en cache, sans lire les fichiers)."""
+        total_entries, total_size = self._get_connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(file_size), 0) FROM cache_entries").fetchone()
 
         return {
             "total_entries": total_entries,
+            "total_size_bytes": total_size,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
             "cache_folder": self.cache_folder
         }
+
+    @staticmethod
+    def _lock_owner() -> str:
+        """Identifiant du détenteur d'un verrou de génération: hôte:pid:thread."""
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _is_lock_abandoned(self, owner: str, acquired_at: float) -> bool:
+        """Un verrou est abandonné s'il est trop ancien ou si son processus (même hôte) n'existe plus."""
+        if time.time() - acquired_at > config.GENERATION_LOCK_STALE_SECONDS:
+            return True
+        host, pid, _ = owner.rsplit(":", 2)
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (OSError, ValueError):
+            pass
+        return False
+
+    def acquire_generation_lock(self, cache_key: str) -> bool:
+        """
+        Tente de prendre le verrou de génération d'une clé (non bloquant).
+        Retourne True si l'appelant doit générer le rapport.
+        """
+        connection = self._get_connection()
+        owner = self._lock_owner()
+        inserted = connection.execute(
+            "INSERT OR IGNORE INTO generation_locks (cache_key, owner, acquired_at) VALUES (?, ?, ?)",
+            (cache_key, owner, time.time())
+        ).rowcount
+        if inserted:
+            return True
+
+        row = connection.execute(
+            "SELECT owner, acquired_at FROM generation_locks WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if row and self._is_lock_abandoned(*row):
+            logger.warning(f"Verrou de génération abandonné repris pour {cache_key} (détenteur {row[0]})")
+            taken_over = connection.execute(
+                "UPDATE generation_locks SET owner = ?, acquired_at = ? WHERE cache_key = ? AND owner = ? AND acquired_at = ?",
+                (owner, time.time(), cache_key, row[0], row[1])
+            ).rowcount
+            return bool(taken_over)
+        return False
+
+    def release_generation_lock(self, cache_key: str) -> None:
+        """Libère le verrou de génération pris par l'appelant."""
+        self._get_connection().execute(
+            "DELETE FROM generation_locks WHERE cache_key = ? AND owner = ?", (cache_key, self._lock_owner())
+        )
+
+    def wait_for_generation(self, cache_key: str) -> None:
+        """Attend (par sondage) que le verrou de génération d'une clé soit libéré ou abandonné."""
+        connection = self._get_connection()
+        while True:
+            row = connection.execute(
+                "SELECT owner, acquired_at FROM generation_locks WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None or self._is_lock_abandoned(*row):
+                return
+            time.sleep(config.GENERATION_LOCK_POLL_SECONDS)
+
+    def _remove_entries(self, cache_keys: List[str]) -> int:
+        """
+        Supprime des entrées de cache puis les fichiers qui ne sont plus référencés
+        par aucune autre entrée. Retourne le nombre d'octets libérés.
+        """
+        if not cache_keys:
+            return 0
+
+        connection = self._get_connection()
+        freed = 0
+        for cache_key in cache_keys:
+            row = connection.execute(
+                "SELECT file_path, file_size FROM cache_entries WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                continue
+            cache_file, file_size = row
+            connection.execute("DELETE FROM cache_entries WHERE cache_key = ?", (cache_key,))
+            still_referenced = connection.execute(
+                "SELECT 1 FROM cache_entries WHERE file_path = ? LIMIT 1", (cache_file,)
+            ).fetchone()
+            if not still_referenced:
+                self._remove_file(cache_file)
+                freed += file_size or 0
+        return freed
+
+    def _remove_orphan_outputs(self, grace_seconds: int) -> int:
+        """Supprime les fichiers de output/ qu'aucune entrée ne référence, passé un délai de grâce."""
+        if not os.path.isdir(config.output_folder):
+            return 0
+
+        referenced = {
+            os.path.abspath(file_path)
+            for (file_path,) in self._get_connection().execute("SELECT file_path FROM cache_entries")
+        }
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        for entry in os.scandir(config.output_folder):
+            try:
+                if (entry.is_file() and os.path.abspath(entry.path) not in referenced
+                        and entry.stat().st_mtime < cutoff):
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # file in use or already removed
+        return removed
+
+    def evict(self, max_size_bytes: Optional[int] = None, max_entries: Optional[int] = None,
+              orphan_grace_seconds: Optional[int] = None) -> Dict:
+        """
+        Applique le budget du cache:
+        1. entrées dont le fichier a disparu,
+        2. entrées remplacées (même variante, signature plus ancienne),
+        3. éviction LRU (accessed_at) jusqu'à respecter la taille et le nombre maximum d'entrées,
+        4. fichiers orphelins du dossier output/.
+        """
+        max_size_bytes = config.CACHE_MAX_SIZE_MB * 1024 * 1024 if max_size_bytes is None else max_size_bytes
+        max_entries = config.CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        orphan_grace_seconds = config.ORPHAN_OUTPUT_GRACE_SECONDS if orphan_grace_seconds is None else orphan_grace_seconds
+
+        connection = self._get_connection()
+        stats = {"missing": 0, "superseded": 0, "lru": 0, "orphans": 0, "freed_bytes": 0}
+
+        # 1. Entries whose file disappeared, and sizes unknown for migrated entries
+        missing = []
+        for cache_key, cache_file, file_size in connection.execute(
+                "SELECT cache_key, file_path, file_size FROM cache_entries").fetchall():
+            if not cache_file or not os.path.exists(cache_file):
+                missing.append(cache_key)
+            elif file_size is None:
+                key_variant, signature = self._split_cache_key(cache_key)
+                connection.execute(
+                    "UPDATE cache_entries SET file_size = ?, key_variant = ?, signature = ? WHERE cache_key = ?",
+                    (os.path.getsize(cache_file), key_variant, signature, cache_key)
+                )
+        connection.executemany("DELETE FROM cache_entries WHERE cache_key = ?", [(key,) for key in missing])
+        stats["missing"] = len(missing)
+
+        # 2. Superseded entries: same variant, older signature than the most recent entry
+        superseded = [row[0] for row in connection.execute("""
+            SELECT e.cache_key FROM cache_entries e
+            JOIN (
+                SELECT key_variant, MAX(created_at) AS latest FROM cache_entries
+                WHERE key_variant IS NOT NULL GROUP BY key_variant
+            ) l ON e.key_variant = l.key_variant
+            WHERE e.created_at < l.latest
+              AND e.signature <> (SELECT signature FROM cache_entries
+                                  WHERE key_variant = e.key_variant AND created_at = l.latest LIMIT 1)
+        """).fetchall()]
+        stats["freed_bytes"] += self._remove_entries(superseded)
+        stats["superseded"] = len(superseded)
+
+        # 3. LRU eviction down to the byte budget and entry limit
+        total_size, total_entries = connection.execute(
+            "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cache_entries").fetchone()
+        if total_size > max_size_bytes or total_entries > max_entries:
+            evicted = []
+            for cache_key, file_size in connection.execute(
+                    "SELECT cache_key, file_size FROM cache_entries ORDER BY accessed_at ASC").fetchall():
+                if total_size <= max_size_bytes and total_entries <= max_entries:
+                    break
+                evicted.append(cache_key)
+                total_size -= file_size or 0
+                total_entries -= 1
+            stats["freed_bytes"] += self._remove_entries(evicted)
+            stats["lru"] = len(evicted)
+
+        # 4. Orphaned output files (superseded keys, empty or never-cached outputs)
+        stats["orphans"] = self._remove_orphan_outputs(orphan_grace_seconds)
+
+        if any(stats[key] for key in ["missing", "superseded", "lru", "orphans"]):
+            logger.info(f"Éviction du cache: {stats}")
+        return stats
+
+    def _eviction_loop(self, interval_seconds: int):
+        """Boucle du thread d'éviction: après chaque set_cache et au moins toutes les interval_seconds."""
+        while True:
+            self._eviction_requested.wait(timeout=interval_seconds)
+            self._eviction_requested.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'éviction du cache: {e}", exc_info=True)
+
+    def start_background_eviction(self, interval_seconds: Optional[int] = None) -> None:
+        """Démarre (une seule fois) le thread d'éviction en arrière-plan."""
+        if self._eviction_thread is not None and self._eviction_thread.is_alive():
+            return
+        interval_seconds = config.CACHE_EVICTION_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+        self._eviction_thread = threading.Thread(target=self._eviction_loop, args=(interval_seconds,),
+                                                 name="cache-eviction", daemon=True)
+        self._eviction_thread.start()
@@ -0,0 +1,167 @@
+"""
+Préchauffage du cache des rapports.
+
+Un thread de fond recalcule périodiquement la clé de cache des variantes les plus demandées
+(rapport, société, année, période, mise en page). Si la signature des fichiers sources a changé,
+la clé n'est plus en cache: le rapport est régénéré à basse priorité, un à la fois, avant que
+les utilisateurs ne le demandent. La priorité est celle de l'admission (routes.admission): le
+préchauffage n'obtient une place que si aucune requête n'attend et n'en occupe jamais plus d'une
+sur la machine; le nice du thread ne touche pas les threads polars ni les processus workers.
+Une variante dont la génération échoue est ensuite ignorée pendant un délai qui double à chaque
+échec (plafonné à CACHE_WARM_MAX_BACKOFF_SECONDS), sauf si sa clé de cache change (nouveaux
+fichiers sources).
+"""
+
+from datetime import datetime, timedelta
+import config
+import os
+import threading
+import time
+import logging
+from routes.timing import timing_record
+from routes.general_ledger import cache_manager, STATIC_REPORTS, REPORT_GENERATORS, _get_report_cache_key, _get_or_generate_report
+
+logger = logging.getLogger(__name__)
+
+# Verrou de génération utilisé comme verrou de "leader": un seul préchauffage à la fois, tous processus confondus
+WARMER_LOCK_KEY = "cache-warmer"
+
+_warmer_thread = None
+_stop_warming = threading.Event()
+_failures = {}  # key_variant -> (clé de cache, nombre d'échecs, prochaine tentative en time.monotonic())
+
+
+def _parse_key_variant(key_variant: str):
+    """
+    Reconstruit les paramètres de formulaire d'une variante {report_type}:{company}:{year}:{start}:{end}:{suffix}.
+    Retourne None pour les variantes qui ne sont pas des classeurs de /redirect-submit (ex: _preview_json).
+    """
+    parts = key_variant.split(":", 5)
+    if len(parts) != 6:
+        return None
+    report_type, company_code, year, start_month, end_month, suffix = parts
+    if report_type not in REPORT_GENERATORS:
+        return None
+
+    data = {
+        "report_type": report_type,
+        "company_code": company_code,
+        "year": year,
+        "start_month": start_month,
+        "end_month": end_month,
+        "company_name": config.COMPANY_MAPPING.get(company_code, "Unknown"),
+    }
+    if suffix == "_csv" and report_type in [config.JOURNAL_ACHAT, config.JOURNAL_VENTE]:
+        data["export_format"] = "csv"
+    elif suffix.startswith("_") and report_type in (config.GRAND_LIVRE_COMPTA_GEN, config.GRAND_LIVRE_BNK):
+        data["layout_type"] = suffix[1:]
+    elif suffix:
+        return None
+    return data
+
+
+def _backing_off(key_variant: str, cache_key: str) -> bool:
+    """La variante a échoué récemment pour cette même clé de cache et son délai n'est pas écoulé."""
+    failure = _failures.get(key_variant)
+    return failure is not None and failure[0] == cache_key and time.monotonic() < failure[2]
+
+
+def _record_failure(key_variant: str, cache_key: str) -> int:
+    """Enregistre un échec et retourne le délai (secondes) avant la prochaine tentative."""
+    previous_key, failures, _ = _failures.get(key_variant, (None, 0, 0))
+    failures = failures + 1 if previous_key == cache_key else 1
+    delay = min(config.CACHE_WARM_INTERVAL_SECONDS * 2 ** (failures - 1), config.CACHE_WARM_MAX_BACKOFF_SECONDS)
+    _failures[key_variant] = (cache_key, failures, time.monotonic() + delay)
+    return delay
+
+
+def _lower_thread_priority() -> None:
+    """Baisse la priorité CPU du thread courant (Linux: la priorité nice est propre à chaque thread)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def warm_cache_once(app) -> int:
+    """
+    Régénère les variantes populaires dont les fichiers sources ont changé.
+    Retourne le nombre de rapports régénérés.
+    """
+    if not cache_manager.acquire_generation_lock(WARMER_LOCK_KEY):
+        return 0  # un autre processus préchauffe déjà
+
+    warmed = 0
+    try:
+        since = (datetime.now() - timedelta(days=config.CACHE_WARM_LOOKBACK_DAYS)).isoformat()
+        variants = cache_manager.get_popular_variants(config.CACHE_WARM_TOP_N, config.CACHE_WARM_MIN_REQUESTS, since)
+
+        for key_variant in variants:
+            if _stop_warming.is_set():
+                break
+            data = _parse_key_variant(key_variant)
+            if data is None:
+                continue
+            report_type, company_code, year = data["report_type"], data["company_code"], data["year"]
+            if (company_code, report_type, year) in STATIC_REPORTS:
+                continue
+
+            generate_func, bp_type, bnk = REPORT_GENERATORS[report_type]
+            cache_key = None
+            try:
+                cache_key = _get_report_cache_key(data, report_type, company_code, year, bnk, bp_type)
+                if cache_manager.get_cache(cache_key) or _backing_off(key_variant, cache_key):
+                    continue
+
+                logger.info(f"Préchauffage du cache: {cache_key}")
+                with app.test_request_context(), \
+                        timing_record(path="cache-warmer", report_type=report_type, company_code=company_code, year=year,
+                                      start_month=data["start_month"], end_month=data["end_month"]):
+                    response, _ = _get_or_generate_report(data, generate_func, report_type, company_code, year,
+                                                          bnk=bnk, bp_type=bp_type, cache_key=cache_key,
+                                                          record_request=False, low_priority=True)
+                    response.close()
+                warmed += 1
+                _failures.pop(key_variant, None)
+            except Exception as e:
+                delay = _record_failure(key_variant, cache_key)
+                logger.error(f"Préchauffage impossible pour {key_variant} (nouvel essai dans {delay}s): {e}",
+                             exc_info=_failures[key_variant][1] == 1)
+    finally:
+        cache_manager.release_generation_lock(WARMER_LOCK_KEY)
+
+    if warmed:
+        logger.info(f"Préchauffage du cache terminé: {warmed} rapport(s) régénéré(s)")
+    return warmed
+
+
+def _warmer_loop(app, interval_seconds: int):
+    _lower_thread_priority()
+    while not _stop_warming.wait(interval_seconds):
+        try:
+            warm_cache_once(app)
+        except Exception as e:
+            logger.error(f"Erreur lors du préchauffage du cache: {e}", exc_info=True)
+
+
+def start_cache_warmer(app, interval_seconds: int = None) -> None:
+    """Démarre (une seule fois par processus) le thread de préchauffage du cache."""
+    global _warmer_thread
+    if _warmer_thread is not None and _warmer_thread.is_alive():
+        return
+    interval_seconds = config.CACHE_WARM_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+    _warmer_thread = threading.Thread(target=_warmer_loop, args=(app, interval_seconds),
+                                      name="cache-warmer", daemon=True)
+    _warmer_thread.start()
+
+
+def stop_cache_warmer(timeout: float) -> bool:
+    """
+    Arrêt propre du processus (serve.py): plus de nouvelle variante, puis attente (au plus `timeout`
+    secondes) de la fin de celle en cours. Retourne False si elle n'est pas terminée.
+    """
+    _stop_warming.set()
+    if _warmer_thread is None:
+        return True
+    _warmer_thread.join(timeout)
+    return not _warmer_thread.is_alive()
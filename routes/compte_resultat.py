@@ -0,0 +1,150 @@
+from flask import send_from_directory
+import polars as pl
+import calendar
+import config
+import os
+import uuid
+from datetime import datetime
+from xlsxwriter import Workbook
+from routes.customs_functions import *
+from routes.aggregations import compute_income_statement_accounts
+from routes.metrics import mark_stage, record_volume
+
+
+def compute_compte_resultat_lines(accounts: pl.DataFrame) -> list:
+    """
+    Construit les lignes du Compte de Résultat (REF, libellé, montant, est_total)
+    à partir des comptes agrégés, dans l'ordre de config.COMPTE_RESULTAT_LIGNES.
+    """
+    postes = {ref: label for ref, label, _ in config.COMPTE_RESULTAT_POSTES}
+    amounts = dict(
+        accounts.group_by("ref").agg(pl.col("net").sum()).drop_nulls("ref").iter_rows()
+    )
+
+    lines = []
+    for line in config.COMPTE_RESULTAT_LIGNES:
+        if isinstance(line, str):
+            amounts.setdefault(line, 0.0)
+            lines.append((line, postes[line], amounts[line], False))
+        else:
+            ref, label, components = line
+            amounts[ref] = sum(amounts.get(component, 0.0) for component in components)
+            lines.append((ref, label, amounts[ref], True))
+    return lines
+
+
+def generate_compte_res(data, cache_manager=None, cache_key=None, output_file=None):
+
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + '.xlsx'
+
+    # Define French month abbreviations
+    french_months = {
+        1: "Jan", 2: "Fev", 3: "Mar", 4: "Avr",
+        5: "Mai", 6: "Juin", 7: "Juil", 8: "Aou",
+        9: "Sep", 10: "Oct", 11: "Nov", 12: "Dec"
+    }
+    # Get current date and format it as DD-MMM-YYYY
+    now = datetime.now()
+    formatted_date = f"{now.day:02d}-{french_months[now.month]}-{now.year}"
+
+    # Get year and months sent by user
+    year = int(data.get('year'))
+    start_date = f"01/{int(data.get('start_month')):02d}/{year}"
+    end_date = f"{calendar.monthrange(year, int(data.get('end_month')))[1]}/{int(data.get('end_month')):02d}/{year}"
+
+    # Load data file
+    df = load_data(config.transactions_data_folder, config.filter_column, data.get("company_code"), config.selected_columns,
+                   config.amount_column, start_date, end_date, data.get('company_code'), str(year))
+
+    if df.is_empty():
+        with Workbook(output_file) as writer:
+            df.write_excel(writer, worksheet="Empty", table_style="Table Style Light 10",
+                                    autofit=True, autofilter=False)
+        # Mettre en cache si le cache_manager est fourni
+        if cache_manager and cache_key:
+            cache_manager.set_cache(cache_key, output_file)
+        return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
+
+    df_initial_balance = load_initial_balance_mapping_data(config.initial_balance_file_path,
+                                                           config.debit_column_label,
+                                                           config.credit_column_label,
+                                                           data.get("company_code"),
+                                                           data.get("year"))
+    general_balance_mapping = fetch_general_balance_mapping_data()
+    mark_stage("load", df)
+
+    # One vectorized pass: class 6/7/8 movements per account, assigned to their REF and Plan Comptable group
+    accounts = compute_income_statement_accounts(df, config.COMPTE_RESULTAT_POSTES, general_balance_mapping)
+    account_descriptions = (
+        df_initial_balance
+        .group_by(config.SYSCOHADA_column_in_initial_balance, maintain_order=True)
+        .agg(pl.col(config.SYSCOHADA_desc_column_in_initial_balance).first().alias("description"))
+        .rename({config.SYSCOHADA_column_in_initial_balance: "account"})
+    )
+    accounts = accounts.join(account_descriptions, on="account", how="left")
+    lines = compute_compte_resultat_lines(accounts)
+    record_volume(rows=len(df), accounts=len(accounts))
+
+    mark_stage("prepare")
+
+    with Workbook(output_file) as writer:
+        worksheet = writer.add_worksheet("Compte de Résultat")
+        worksheet_details = writer.add_worksheet("Détail par compte")
+
+        # Formats created once for both sheets
+        number_fmt = writer.add_format({'num_format': '#,##0_);[Red](#,##0);'})
+        merge_format = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 9, 'border': 2})
+        merge_format_2 = writer.add_format({'align': 'center', 'valign': 'vcenter', 'font_size': 14, 'border': 2})
+        merge_format_3 = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 9, 'border': 2, 'bg_color': '#00b6e9', 'font_color': 'white'})
+        subtotal_label_fmt = writer.add_format({'bold': True, 'bg_color': '#F0F8FF'})
+        subtotal_number_fmt = writer.add_format({'bold': True, 'num_format': '#,##0_);[Red](#,##0);', 'bg_color': '#F0F8FF'})
+
+        # COMPTE DE RESULTAT SHEET HEADER
+        worksheet.merge_range('A2:A3', f"{data.get('company_code')}", merge_format)
+        worksheet.merge_range('B2:B3', f"{data.get('company_name', '')}", merge_format)
+        worksheet.write('C2', "Date Printed:", merge_format)
+        worksheet.write('C3', f"{formatted_date}", merge_format)
+        worksheet.merge_range('A4:C4', "COMPTE DE RESULTAT", merge_format_2)
+        worksheet.merge_range('A5:C5', f"En FCFA du {start_date} Au {end_date}", merge_format)
+        worksheet.write('A6', "REF", merge_format_3)
+        worksheet.write('B6', "LIBELLES", merge_format_3)
+        worksheet.write('C6', "NET", merge_format_3)
+        worksheet.set_column('A:A', 8)
+        worksheet.set_column('B:B', 60)
+        worksheet.set_column('C:C', 18)
+
+        start_row = 7
+        for ref, label, amount, is_total in lines:
+            if is_total:
+                worksheet.write(f"A{start_row}", ref, subtotal_label_fmt)
+                worksheet.write(f"B{start_row}", label, subtotal_label_fmt)
+                worksheet.write(f"C{start_row}", amount, subtotal_number_fmt)
+            else:
+                worksheet.write(f"A{start_row}", ref)
+                worksheet.write(f"B{start_row}", label)
+                worksheet.write(f"C{start_row}", amount, number_fmt)
+            start_row += 1
+
+        # DETAILS SHEET: one row per class 6/7/8 account, written column by column
+        details_header = ["COMPTE", "LIBELLE", "POSTE PLAN COMPTABLE", "REF", "DEBIT", "CREDIT", "NET"]
+        worksheet_details.merge_range('A2:G2', "COMPTE DE RESULTAT - DETAIL PAR COMPTE", merge_format_2)
+        worksheet_details.merge_range('A3:G3', f"En FCFA du {start_date} Au {end_date}", merge_format)
+        worksheet_details.write_row('A5', details_header, merge_format_3)
+
+        worksheet_details.write_column('A6', accounts["account"].to_list())
+        worksheet_details.write_column('B6', accounts["description"].to_list())
+        worksheet_details.write_column('C6', accounts["plan_group"].to_list())
+        worksheet_details.write_column('D6', accounts["ref"].to_list())
+        worksheet_details.write_column('E6', accounts["movement_debit"].to_list(), number_fmt)
+        worksheet_details.write_column('F6', accounts["movement_credit"].abs().to_list(), number_fmt)
+        worksheet_details.write_column('G6', accounts["net"].to_list(), number_fmt)
+
+        mark_stage("render")
+
+    mark_stage("write")
+
+    # Mettre en cache si le cache_manager est fourni
+    if cache_manager and cache_key:
+        cache_manager.set_cache(cache_key, output_file)
+
+    return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
@@ -0,0 +1,133 @@
+"""
+Répartition des cœurs entre les générations de rapports.
+
+Polars n'a qu'un pool de threads par processus, dimensionné une fois pour toutes (tous les cœurs
+par défaut): on ne peut pas en donner une part à chaque requête d'un même processus. Avec
+GENERATION_EXECUTOR = "process", chaque génération s'exécute donc dans un pool de
+GENERATION_WORKER_PROCESSES processus dont le pool polars est fixé à
+GENERATION_WORKER_POLARS_THREADS threads (par défaut cœurs / processus): les générations
+simultanées se partagent les cœurs au lieu de se les disputer. Le processus web garde le cache,
+le single-flight, la file d'admission et la mise en cache; le worker écrit le fichier puis renvoie
+ses spans de timing, volumes et pic de RSS, fusionnés dans l'enregistrement et les métriques de la
+requête. Une requête profilée est profilée dans le worker (<profile_id>-worker.*).
+
+Avec "thread" (défaut), la génération reste dans le thread de la requête et la concurrence n'est
+bornée que par MAX_CONCURRENT_GENERATIONS.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import config
+from contextlib import nullcontext
+from routes.metrics import merge_worker_generation
+from routes.profiling import current_profile_id, profile_block
+from routes.timing import collect_record, merge_record
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+_worker_app = None
+
+
+def serve_workers() -> int:
+    """Nombre de processus web lancés par serve.py (1 hors serve.py)."""
+    return int(os.environ.get("REPORT_SERVE_WORKERS", "1"))
+
+
+def worker_polars_threads() -> int:
+    """
+    Taille du pool polars de chaque processus worker: les cœurs divisés par le nombre de générations
+    pouvant tourner en même temps sur la machine (workers de tous les processus web, bornés par la
+    limite d'admission commune MAX_CONCURRENT_GENERATIONS).
+    """
+    if config.GENERATION_WORKER_POLARS_THREADS:
+        return config.GENERATION_WORKER_POLARS_THREADS
+    concurrency = max(1, config.GENERATION_WORKER_PROCESSES) * serve_workers()
+    if config.MAX_CONCURRENT_GENERATIONS:
+        concurrency = min(concurrency, config.MAX_CONCURRENT_GENERATIONS)
+    return max(1, (os.cpu_count() or 1) // concurrency)
+
+
+def uses_worker_processes() -> bool:
+    return config.GENERATION_EXECUTOR == "process" and config.GENERATION_WORKER_PROCESSES > 0
+
+
+def is_worker_process() -> bool:
+    """True dans un processus worker de génération (pas de préchauffage ni de tâches de fond)."""
+    return multiprocessing.parent_process() is not None
+
+
+def is_cache_warmer_process() -> bool:
+    """Processus chargé du préchauffage: sous serve.py, le seul worker désigné par le superviseur."""
+    return not is_worker_process() and os.environ.get("REPORT_CACHE_WARMER", "1") == "1"
+
+
+def _init_worker(polars_threads: int) -> None:
+    """Initialisation d'un worker: le pool polars est créé au premier calcul, après ce réglage."""
+    global _worker_app
+    os.environ["POLARS_MAX_THREADS"] = str(polars_threads)
+    from flask import Flask
+    _worker_app = Flask("report_worker")
+
+
+def _generate_in_worker(data, generate_func, report_type, bnk, bp_type, output_file, profile_id=None) -> dict:
+    """Exécuté dans le worker: génère le rapport et retourne l'enregistrement de timing collecté."""
+    from routes.general_ledger import _run_generator, cache_manager
+    from routes.metrics import track_generation
+
+    profiling = profile_block(f"{profile_id}-worker") if profile_id else nullcontext()
+    with collect_record() as record, _worker_app.test_request_context(), profiling, track_generation(report_type):
+        response, _ = _run_generator(data, generate_func, report_type, bnk, bp_type, cache_manager, None,
+                                     output_file)
+        response.close()
+    record["pid"] = os.getpid()
+    return record
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            polars_threads = worker_polars_threads()
+            _pool = ProcessPoolExecutor(max_workers=config.GENERATION_WORKER_PROCESSES,
+                                        mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(polars_threads,),
+                                        max_tasks_per_child=config.GENERATION_WORKER_MAX_TASKS or None)
+            logger.info(f"Pool de génération: {config.GENERATION_WORKER_PROCESSES} processus x "
+                        f"{polars_threads} thread(s) polars")
+        return _pool
+
+
+def _discard_pool(pool) -> None:
+    """Abandonne un pool cassé (worker tué, ex: OOM); le suivant est recréé à la demande."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_in_worker(data, generate_func, report_type, bnk, bp_type, output_file) -> None:
+    """Génère le rapport dans un processus worker et fusionne ses mesures dans la requête courante."""
+    pool = _get_pool()
+    try:
+        record = pool.submit(_generate_in_worker, data, generate_func, report_type, bnk, bp_type, output_file,
+                             current_profile_id()).result()
+    except BrokenProcessPool:
+        logger.error(f"Worker de génération perdu pendant {report_type}: pool recréé à la prochaine génération")
+        _discard_pool(pool)
+        raise
+    merge_worker_generation(record)
+    merge_record(record)
+
+
+@atexit.register
+def _shutdown_pool() -> None:
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
@@ -3,20 +3,13 @@ import polars as pl
 import config
 import logging
 from datetime import datetime
-import glob
+from routes.timing import timed
+from routes.transaction_store import load_year_transactions
 
 logger = logging.getLogger(__name__)
 
-# Load the dataset with filtering on a company code column value
-def load_data(folder_path: str, filter_column: str, filter_value, columns: list, amount_column: str, start_date, end_date,
-              company_code, year, document_number="", bank=False) -> pl.DataFrame:
-
-    # Path to the Excel files
-    files = glob.glob(folder_path+company_code+"/"+year+"/*")
-
-    start_date = datetime.strptime(start_date, "%d/%m/%Y")
-    end_date = datetime.strptime(end_date, "%d/%m/%Y")
-
+# Read, type and sort the transactions of one company-year (stored once in routes.transaction_store)
+def _read_transaction_files(files: list, columns: list, amount_column: str) -> pl.DataFrame:
     # Read and merge with authoritative schema from config.expected_dtypes
     df_list = []
     mismatched_files = []
@@ -107,7 +100,21 @@ def load_data(folder_path: str, filter_column: str, filter_value, columns: list,
     df_polars = df_polars.with_columns(pl.col("G/L Account").cast(pl.Utf8))
     df_polars = df_polars.with_columns(pl.col("Fiscal Year").cast(pl.Utf8))
     df_polars = df_polars.with_columns(pl.col(amount_column).cast(pl.Float64).fill_null(0))
-    df_polars = df_polars.sort(config.posting_date_column_name, descending=False)
+    return df_polars.sort(config.posting_date_column_name, descending=False)
+
+
+# Load the dataset with filtering on a company code column value
+@timed("load_data")
+def load_data(folder_path: str, filter_column: str, filter_value, columns: list, amount_column: str, start_date, end_date,
+              company_code, year, document_number="", bank=False, document_numbers=None) -> pl.DataFrame:
+
+    start_date = datetime.strptime(start_date, "%d/%m/%Y")
+    end_date = datetime.strptime(end_date, "%d/%m/%Y")
+
+    # Whole year from the shared Arrow store (Excel files read only when they change)
+    df_polars = load_year_transactions(folder_path, company_code, year,
+                                       lambda files: _read_transaction_files(files, columns, amount_column),
+                                       variant=f"load_data:{columns}:{amount_column}")
     df_polars = df_polars.filter((pl.col(config.posting_date_column_name) >= start_date) & (pl.col(config.posting_date_column_name) <= end_date))
 
     # Replace empty strings with NULL, then apply fill logic
@@ -123,7 +130,9 @@ def load_data(folder_path: str, filter_column: str, filter_value, columns: list,
         .alias("Reference")
     ])
 
-    if document_number != "":
+    if document_numbers:
+        return df_polars.filter((pl.col(filter_column) == filter_value) & (pl.col("Document Number").is_in(document_numbers)))
+    elif document_number != "":
         return df_polars.filter((pl.col(filter_column) == filter_value) & (pl.col("Document Number") == document_number))
     else:
         if bank:
@@ -135,23 +144,25 @@ def load_data(folder_path: str, filter_column: str, filter_value, columns: list,
 
 
 # Load the dataset with filtering on a company code column value
+@timed("load_bp_data")
 def load_bp_data(folder_path: str, filter_column: str, filter_value, columns: list, start_date, end_date,
               company_code, year, bp_type) -> pl.DataFrame:
-    # Path to the Excel files
-    files = glob.glob(folder_path+company_code+"/"+year+"/*")
-
     start_date = datetime.strptime(start_date, "%d/%m/%Y")
     end_date = datetime.strptime(end_date, "%d/%m/%Y")
 
-    # Read and merge
-    df_list = [pl.read_excel(f) for f in files]
-    df_polars = pl.concat(df_list)
+    def read_files(files):
+        # Read and merge
+        df_list = [pl.read_excel(f) for f in files]
+        df_polars = pl.concat(df_list)
+
+        # df_pandas = pd.read_csv(folder_path, usecols=columns, encoding="latin1")
 
-    # df_pandas = pd.read_csv(folder_path, usecols=columns, encoding="latin1")
+        df_polars = df_polars.with_columns(pl.col(bp_type).cast(pl.Utf8))
+        df_polars = df_polars.with_columns(pl.col("Amount in local currency").cast(pl.Float64).fill_null(0))
+        return df_polars.sort(config.posting_date_column_name, descending=False)
 
-    df_polars = df_polars.with_columns(pl.col(bp_type).cast(pl.Utf8))
-    df_polars = df_polars.with_columns(pl.col("Amount in local currency").cast(pl.Float64).fill_null(0))
-    df_polars = df_polars.sort(config.posting_date_column_name, descending=False)
+    # Whole year from the shared Arrow store (Excel files read only when they change)
+    df_polars = load_year_transactions(folder_path, company_code, year, read_files, variant=f"load_bp_data:{bp_type}")
     df_polars = df_polars.filter((pl.col(config.posting_date_column_name) >= start_date) & (pl.col(config.posting_date_column_name) <= end_date))
 
     # Replace empty strings with NULL, then apply fill logic
@@ -171,6 +182,7 @@ def load_bp_data(folder_path: str, filter_column: str, filter_value, columns: li
 
 
 # Load initial balance and code journal mapping datasets
+@timed("load_initial_balance_mapping_data")
 def load_initial_balance_mapping_data(initial_balance_file_path: str, debit_column_label: str,
                                       credit_column_label: str, company_code, year, bank=False) -> pl.DataFrame:
     # Load Initial Balance data
@@ -187,6 +199,7 @@ def load_initial_balance_mapping_data(initial_balance_file_path: str, debit_colu
 
 
 # Load vendors initial balance
+@timed("load_bp_initial_balance")
 def load_bp_initial_balance(initial_balance_file_path: str, balance_column_label: str, company_code, year, bp_type) -> pl.DataFrame:
     # Load Initial Balance data
     df_initial_balance = pl.read_excel(f"{initial_balance_file_path} {company_code} {year}.xlsx")
@@ -7,11 +7,13 @@ import uuid
 from datetime import datetime
 from xlsxwriter import Workbook
 from routes.customs_functions import *
+from routes.progress import enumerate_progress
+from routes.metrics import mark_stage, record_volume
 import operator
 
-def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None):
+def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None, output_file=None):
 
-    output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + '.xlsx'
 
     # Define French month abbreviations
     french_months = {
@@ -49,7 +51,10 @@ def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None):
 
 
     general_balance_mapping = fetch_general_balance_mapping_data()
+    mark_stage("load", df)
+
     unique_values_general = sorted(df_initial_balance[config.SYSCOHADA_column_in_initial_balance].unique().to_list())
+    record_volume(rows=len(df), accounts=len(unique_values_general))
     unique_values_details = df_initial_balance.select([config.IFRS_code_column_in_initial_balance, config.SYSCOHADA_column_in_initial_balance]).unique()
     unique_values_details = unique_values_details.sort([
         config.SYSCOHADA_column_in_initial_balance,
@@ -58,6 +63,8 @@ def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None):
 
     start_row = 6
 
+    mark_stage("prepare")
+
     with Workbook(output_file) as writer:
         pl.DataFrame().write_excel(writer, worksheet="Balance General Format")
         pl.DataFrame().write_excel(writer, worksheet="Balance General Format Detail")
@@ -157,7 +164,7 @@ def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None):
                 'solde_credit': 0,
             }
 
-        for idx, value in enumerate(unique_values_general):
+        for idx, value in enumerate_progress(unique_values_general, "comptes"):
             if value == "OHADA VIDES":
                 continue
 
@@ -404,6 +411,10 @@ def generate_bal_gen(data, bnk=False, cache_manager=None, cache_key=None):
 
             start_row += 1
 
+        mark_stage("render")
+
+    mark_stage("write")
+
     # Mettre en cache si le cache_manager est fourni
     if cache_manager and cache_key:
         cache_manager.set_cache(cache_key, output_file)
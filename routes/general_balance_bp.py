@@ -7,10 +7,12 @@ import uuid
 from datetime import datetime
 from xlsxwriter import Workbook
 from routes.customs_functions import *
+from routes.aggregations import aggregate_movements
+from routes.metrics import mark_stage, record_volume
 
-def generate_bal_bp(data, bp_type, cache_manager=None, cache_key=None):
+def generate_bal_bp(data, bp_type, cache_manager=None, cache_key=None, output_file=None):
 
-    output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + '.xlsx'
 
     # Define French month abbreviations
     french_months = {
@@ -37,12 +39,38 @@ def generate_bal_bp(data, bp_type, cache_manager=None, cache_key=None):
                                                 "Total",
                                                 data.get("company_code"),
                                                 data.get("year"), bp_type)
-
-    bp_unique_values = df_initial_balance.select([bp_type, f"{bp_type} Name", "Total"]).unique()
-    bp_unique_values.sort(bp_type)
-
+    mark_stage("load", df)
+
+    # Compute all BP movements in one aggregation and join them to the opening balances
+    movements = aggregate_movements(df, bp_type)
+    bp_balances = (
+        df_initial_balance
+        .select([bp_type, f"{bp_type} Name", "Total"])
+        .unique()
+        .sort(bp_type)
+        .join(movements, on=bp_type, how="left")
+        .with_columns([
+            pl.col("movement_debit").fill_null(0.0),
+            pl.col("movement_credit").fill_null(0.0),
+        ])
+        .with_columns([
+            pl.when(pl.col("Total") > 0).then(pl.col("Total")).otherwise(None).alias("opening_debit"),
+            pl.when(pl.col("Total") <= 0).then(pl.col("Total")).otherwise(None).alias("opening_credit"),
+            (pl.col("movement_debit") + pl.when(pl.col("Total") > 0).then(pl.col("Total")).otherwise(0)).alias("cumulative_debit"),
+            (pl.col("movement_credit") + pl.when(pl.col("Total") <= 0).then(pl.col("Total")).otherwise(0)).alias("cumulative_credit"),
+        ])
+        .with_columns((pl.col("cumulative_credit") + pl.col("cumulative_debit")).alias("balance"))
+        .with_columns([
+            pl.when(pl.col("balance") > 0).then(pl.col("balance")).otherwise(None).alias("balance_debit"),
+            pl.when(pl.col("balance") <= 0).then(pl.col("balance")).otherwise(None).alias("balance_credit"),
+        ])
+    )
+
+    record_volume(rows=len(df), accounts=len(bp_balances))
     start_row = 6
 
+    mark_stage("prepare")
+
     with Workbook(output_file) as writer:
         pl.DataFrame().write_excel(writer, worksheet=f"Balance General Format {bp_type}")
 
@@ -80,72 +108,30 @@ def generate_bal_bp(data, bp_type, cache_manager=None, cache_key=None):
         worksheet.write('I5', f"DEBIT", merge_format_3)
         worksheet.write('J5', f"CREDIT", merge_format_3)
 
+        # ADD values to general table, one column at a time
+        worksheet.write_column(f"A{start_row}", bp_balances[bp_type].to_list())
+        worksheet.write_column(f"B{start_row}", bp_balances[f"{bp_type} Name"].to_list())
+        worksheet.write_column(f"C{start_row}", bp_balances["opening_debit"].to_list(), number_fmt)
+        worksheet.write_column(f"D{start_row}", bp_balances["opening_credit"].abs().to_list(), number_fmt)
+        worksheet.write_column(f"E{start_row}", bp_balances["movement_debit"].to_list(), number_fmt)
+        worksheet.write_column(f"F{start_row}", bp_balances["movement_credit"].abs().to_list(), number_fmt)
+        worksheet.write_column(f"G{start_row}", bp_balances["cumulative_debit"].to_list(), number_fmt)
+        worksheet.write_column(f"H{start_row}", bp_balances["cumulative_credit"].abs().to_list(), number_fmt)
+        worksheet.write_column(f"I{start_row}", bp_balances["balance_debit"].to_list(), number_fmt)
+        worksheet.write_column(f"J{start_row}", bp_balances["balance_credit"].abs().to_list(), number_fmt)
+
+        start_row += len(bp_balances)
+
         # TOTAL PARAMS
-        gen_init_balance_credit_all = 0
-        gen_init_balance_debit_all = 0
-        mvts_sum_credit_all = 0
-        mvts_sum_debit_all = 0
-        cum_credit_all = 0
-        cum_debit_all = 0
-        solde_credit_all = 0
-        solde_debit_all = 0
-
-        # ADD values to general table
-        for row in bp_unique_values.iter_rows():
-            value, bp_name, bp_balance = row  # Unpack values
-            filtered_df = df.filter(pl.col(bp_type) == str(value))
-            worksheet.write(f"A{str(start_row)}", str(value))
-
-            worksheet.write(f"B{str(start_row)}", bp_name)
-            if bp_balance > 0:
-                worksheet.write(f"C{str(start_row)}", bp_balance, number_fmt)
-                gen_init_balance_debit_all += bp_balance
-            else:
-                gen_init_balance_credit_all += bp_balance
-                worksheet.write(f"D{str(start_row)}", abs(bp_balance), number_fmt)
-
-            # Create 'credit' and 'debit' columns based on 'amount' value and Contrepartie column
-            filtered_df = filtered_df.with_columns([
-                pl.when(pl.col(config.amount_column) <= 0)
-                .then(pl.col(config.amount_column))
-                .otherwise(0)
-                .alias("Crédit"),
-
-                pl.when(pl.col(config.amount_column) > 0)
-                .then(pl.col(config.amount_column).abs())
-                .otherwise(0)
-                .alias("Débit")
-            ])
-
-            mvts_cum_credit = filtered_df['Crédit'].sum()
-            mvts_cum_debit = filtered_df['Débit'].sum()
-
-            worksheet.write(f"E{str(start_row)}", mvts_cum_debit, number_fmt)
-            worksheet.write(f"F{str(start_row)}", abs(mvts_cum_credit), number_fmt)
-
-            mvts_sum_credit_all += mvts_cum_credit # For below credit total
-            mvts_sum_debit_all += mvts_cum_debit # For below debit total
-            
-            cum_debit = mvts_cum_debit + (bp_balance if bp_balance > 0 else 0)
-            cum_credit = mvts_cum_credit + (bp_balance if bp_balance <= 0 else 0)
-
-            cum_credit_all += cum_credit
-            cum_debit_all += cum_debit
-
-            worksheet.write(f"G{str(start_row)}", cum_debit, number_fmt)
-            worksheet.write(f"H{str(start_row)}", abs(cum_credit), number_fmt)
-
-            solde = cum_credit + cum_debit
-
-            if solde > 0:
-                solde_debit_all += solde
-                worksheet.write(f"I{str(start_row)}", abs(solde), number_fmt)
-            else:
-                solde_credit_all += solde
-                worksheet.write(f"J{str(start_row)}", abs(solde), number_fmt)
-            
-            start_row += 1
-        
+        gen_init_balance_debit_all = bp_balances["opening_debit"].sum()
+        gen_init_balance_credit_all = bp_balances["opening_credit"].sum()
+        mvts_sum_debit_all = bp_balances["movement_debit"].sum()
+        mvts_sum_credit_all = bp_balances["movement_credit"].sum()
+        cum_debit_all = bp_balances["cumulative_debit"].sum()
+        cum_credit_all = bp_balances["cumulative_credit"].sum()
+        solde_debit_all = bp_balances["balance_debit"].sum()
+        solde_credit_all = bp_balances["balance_credit"].sum()
+
         # Below Totals Rows
         worksheet.write(f"B{str(start_row)}", f"Total à Reporter", merge_format_4)
         # Comptes de Bilan values row
@@ -158,6 +144,10 @@ def generate_bal_bp(data, bp_type, cache_manager=None, cache_key=None):
         worksheet.write(f"I{str(start_row)}", abs(solde_debit_all), number_fmt)
         worksheet.write(f"J{str(start_row)}", abs(solde_credit_all), number_fmt)
 
+        mark_stage("render")
+
+    mark_stage("write")
+
     # Mettre en cache si le cache_manager est fourni
     if cache_manager and cache_key:
         cache_manager.set_cache(cache_key, output_file)
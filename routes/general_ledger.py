@@ -2,12 +2,22 @@ from flask import Blueprint, Response, request, send_from_directory, jsonify
 from datetime import datetime
 import config
 import os
+import hashlib
+import uuid
 import logging
 from routes.grand_livre import generate_gl_compta_gen
 from routes.general_balance import generate_bal_gen
 from routes.grand_livre_bp import generate_gl_bp
 from routes.general_balance_bp import generate_bal_bp
+from routes.compte_resultat import generate_compte_res
+from routes.journal import generate_journal
 from routes.cache_manager import CacheManager
+from routes.metrics import record_cache_result, record_output, track_generation
+from routes.profiling import is_profiling, profiled
+from routes.memory import MemoryBudgetExceeded
+from routes.admission import admission_controller, GenerationRejected
+from routes.cpu_scheduler import generate_in_worker, is_worker_process, uses_worker_processes
+from layout_manager import get_layout_manager
 
 logger = logging.getLogger(__name__)
 
@@ -15,98 +25,214 @@ general_ledger = Blueprint("general_ledger", __name__)
 
 # Initialiser le gestionnaire de cache
 cache_manager = CacheManager()
+# Les workers de génération (routes.cpu_scheduler) importent ce module: éviction et surveillance
+# des dossiers restent au processus web
+if not is_worker_process():
+    cache_manager.start_background_eviction()
+    if config.CACHE_SIGNATURE_WATCH:
+        cache_manager.start_signature_watcher()
+
+# Rapports historiques livrés tels quels (exports Mantra de CI14)
+STATIC_REPORTS = {
+    ("CI14", config.GRAND_LIVRE_COMPTA_GEN, "2022"): config.grand_livre_mantra_deux,
+    ("CI14", config.GRAND_LIVRE_COMPTA_GEN, "2023"): config.grand_livre_mantra_trois,
+    ("CI14", config.BALANCE_GEN_CLIENT, "2022"): config.bl_client_mantra_deux,
+    ("CI14", config.BALANCE_GEN_CLIENT, "2023"): config.bl_client_mantra_trois,
+    ("CI14", config.BALANCE_GEN_FOURN, "2022"): config.bl_fourn_mantra_deux,
+    ("CI14", config.BALANCE_GEN_FOURN, "2023"): config.bl_fourn_mantra_trois,
+    ("CI14", config.BALANCE_GEN, "2022"): config.bl_mantra_deux,
+    ("CI14", config.BALANCE_GEN, "2023"): config.bl_mantra_trois,
+}
+
+# report_type -> (fonction de génération, bp_type, bnk)
+REPORT_GENERATORS = {
+    config.GRAND_LIVRE_COMPTA_GEN: (generate_gl_compta_gen, None, False),
+    config.GRAND_LIVRE_FOURN: (generate_gl_bp, "Vendor", False),
+    config.GRAND_LIVRE_CLIENT: (generate_gl_bp, "Customer", False),
+    config.GRAND_LIVRE_BNK: (generate_gl_compta_gen, None, True),
+    config.BALANCE_GEN: (generate_bal_gen, None, False),
+    config.BALANCE_GEN_CLIENT: (generate_bal_bp, "Customer", False),
+    config.BALANCE_GEN_FOURN: (generate_bal_bp, "Vendor", False),
+    config.BALANCE_GEN_BNK: (generate_bal_gen, None, True),
+    config.COMPTE_RESULTAT: (generate_compte_res, None, False),
+    config.JOURNAL_ACHAT: (generate_journal, None, False),
+    config.JOURNAL_VENTE: (generate_journal, None, False),
+}
+
+
+def _prepare_report_data(form):
+    """Copie mutable des paramètres du formulaire, complétée du nom de l'entreprise."""
+    data = form.to_dict()
+    data['company_name'] = config.COMPANY_MAPPING.get(data.get("company_code"), "Unknown")
+    return data
+
+
+def _resolve_layout_type(layout_type):
+    """Mise en page réellement appliquée par le Grand Livre: absente ou inconnue -> "default"."""
+    return layout_type if layout_type in get_layout_manager().config["layouts"] else "default"
+
+
+def _get_report_cache_key(data, report_type, company_code, year, bnk=False, bp_type=None):
+    """
+    Clé de cache canonique d'un rapport: mise en page résolue pour les Grands Livres Compta Gen et
+    bancaire (suffixe absent pour "default"), suffixe _csv pour les journaux CSV.
+    """
+    start_month = int(data.get('start_month', 1))
+    end_month = int(data.get('end_month', 12))
+
+    cache_key_suffix = ""
+    if report_type in (config.GRAND_LIVRE_COMPTA_GEN, config.GRAND_LIVRE_BNK):
+        layout_type = _resolve_layout_type(data.get('layout_type', None))
+        cache_key_suffix = f"_{layout_type}" if layout_type != "default" else ""
+    if data.get('export_format', 'xlsx').lower() == "csv" and report_type in [config.JOURNAL_ACHAT, config.JOURNAL_VENTE]:
+        cache_key_suffix += "_csv"
+    return cache_manager.get_cache_key(report_type, company_code, year, start_month, end_month, bp_type, bnk) + cache_key_suffix
+
+
+def _get_output_file(data, report_type, cache_key):
+    """
+    Chemin de sortie dérivé de la clé de cache: hash de la clé canonique (type de rapport, société,
+    année, période, signature des données, mise en page résolue, format), pas du contenu du
+    fichier. Deux demandes équivalentes produisent et partagent le même fichier.
+    """
+    csv_export = data.get('export_format', 'xlsx').lower() == "csv" and report_type in [config.JOURNAL_ACHAT, config.JOURNAL_VENTE]
+    extension = '.csv' if csv_export else '.xlsx'
+    return config.output_folder + hashlib.sha256(cache_key.encode()).hexdigest()[:32] + extension
+
+
+# Generation refused by the memory budget (see routes.memory.check_memory_budget)
+@general_ledger.errorhandler(MemoryBudgetExceeded)
+def memory_budget_exceeded(error):
+    logger.warning(f"Génération refusée: {error}")
+    return Response(f"Mémoire insuffisante pour générer ce rapport, réessayez plus tard ({error})", 503,
+                    headers={"Retry-After": "60"})
+
+
+# Generation queue full (see routes.admission)
+@general_ledger.errorhandler(GenerationRejected)
+def generation_rejected(error):
+    return Response(f"Trop de rapports en cours de génération, réessayez dans {error.retry_after} secondes", 503,
+                    headers={"Retry-After": str(error.retry_after)})
+
 
 # Redirect the end-user submition to the right function
 @general_ledger.route('/redirect-submit', methods=['POST'])
+@profiled
 def redirect_submit():
-    data = request.form.to_dict()  # Convertir en dict mutable
+    data = _prepare_report_data(request.form)  # Convertir en dict mutable (thread-safe)
     report_type = data.get("report_type")
     company_code = data.get("company_code")
     year = data.get("year")
 
-    # Ajouter le nom de l'entreprise au dict data (thread-safe)
-    company_name = config.COMPANY_MAPPING.get(company_code, "Unknown")
-    data['company_name'] = company_name
-
-    if company_code == "CI14" and report_type == config.GRAND_LIVRE_COMPTA_GEN and year == "2022":
-        return send_from_directory(directory=os.getcwd(), path=config.grand_livre_mantra_deux, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.GRAND_LIVRE_COMPTA_GEN and year == "2023":
-        return send_from_directory(directory=os.getcwd(), path=config.grand_livre_mantra_trois, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN_CLIENT and year == "2022":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_client_mantra_deux, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN_CLIENT and year == "2023":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_client_mantra_trois, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN_FOURN and year == "2022":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_fourn_mantra_deux, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN_FOURN and year == "2023":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_fourn_mantra_trois, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN and year == "2022":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_mantra_deux, as_attachment=True), 200
-    elif company_code == "CI14" and report_type == config.BALANCE_GEN and year == "2023":
-        return send_from_directory(directory=os.getcwd(), path=config.bl_mantra_trois, as_attachment=True), 200
-    else:
-        pass
-
-    if report_type == config.GRAND_LIVRE_COMPTA_GEN:
-        return _get_or_generate_report(data, generate_gl_compta_gen, report_type, company_code, year)
-    elif report_type == config.GRAND_LIVRE_FOURN:
-        return _get_or_generate_report(data, generate_gl_bp, report_type, company_code, year, bp_type="Vendor")
-    elif report_type == config.GRAND_LIVRE_CLIENT:
-        return _get_or_generate_report(data, generate_gl_bp, report_type, company_code, year, bp_type="Customer")
-    elif report_type == config.GRAND_LIVRE_BNK:
-        return _get_or_generate_report(data, generate_gl_compta_gen, report_type, company_code, year, bnk=True)
-    elif report_type == config.BALANCE_GEN:
-        return _get_or_generate_report(data, generate_bal_gen, report_type, company_code, year)
-    elif report_type == config.BALANCE_GEN_CLIENT:
-        return _get_or_generate_report(data, generate_bal_bp, report_type, company_code, year, bp_type="Customer")
-    elif report_type == config.BALANCE_GEN_FOURN:
-        return _get_or_generate_report(data, generate_bal_bp, report_type, company_code, year, bp_type="Vendor")
-    elif report_type == config.BALANCE_GEN_BNK:
-        return _get_or_generate_report(data, generate_bal_gen, report_type, company_code, year, bnk=True)
-    else:
+    static_report = STATIC_REPORTS.get((company_code, report_type, year))
+    if static_report:
+        return send_from_directory(directory=os.getcwd(), path=static_report, as_attachment=True), 200
+
+    if report_type not in REPORT_GENERATORS:
         return Response("Not Yet Implemented", 404)
 
+    generate_func, bp_type, bnk = REPORT_GENERATORS[report_type]
+    return _get_or_generate_report(data, generate_func, report_type, company_code, year, bnk=bnk, bp_type=bp_type)
+
 
-def _get_or_generate_report(data, generate_func, report_type, company_code, year, bnk=False, bp_type=None):
+def _run_generator(data, generate_func, report_type, bnk, bp_type, cache_manager, cache_key, output_file):
+    """Appelle le générateur avec les paramètres propres à sa famille de rapports."""
+    layout_type = data.get('layout_type', None)
+
+    # Déterminer la fonction correcte avec le bon nombre de paramètres
+    if bp_type:
+        # Pour generate_gl_bp et generate_bal_bp
+        return generate_func(data, bp_type=bp_type, cache_manager=cache_manager, cache_key=cache_key, output_file=output_file)
+    elif bnk:
+        # Pour les rapports bancaires: seul le Grand Livre (generate_gl_compta_gen) a une mise en page
+        if report_type == config.GRAND_LIVRE_BNK:
+            return generate_func(data, bnk=bnk, cache_manager=cache_manager, cache_key=cache_key,
+                                 layout_type=layout_type, output_file=output_file)
+        return generate_func(data, bnk=bnk, cache_manager=cache_manager, cache_key=cache_key, output_file=output_file)
+    else:
+        # Pour generate_gl_compta_gen et generate_bal_gen
+        if report_type == config.GRAND_LIVRE_COMPTA_GEN:
+            # Pass layout_type for Grand Livre Compta Gen
+            return generate_func(data, cache_manager=cache_manager, cache_key=cache_key, layout_type=layout_type,
+                                 output_file=output_file)
+        return generate_func(data, cache_manager=cache_manager, cache_key=cache_key, output_file=output_file)
+
+
+def _get_or_generate_report(data, generate_func, report_type, company_code, year, bnk=False, bp_type=None, cache_key=None,
+                            record_request=True, background=False, low_priority=False):
     """
     Vérifie le cache et retourne le rapport en cache s'il existe,
     sinon génère un nouveau rapport et le met en cache.
+    record_request=False pour les générations internes (préchauffage) qui ne sont pas des demandes utilisateur.
+    background=True (jobs, préchauffage): la génération attend son tour dans la file d'admission au lieu
+    d'être refusée quand la file est pleine. low_priority=True (préchauffage): servie après toutes les
+    autres générations (voir routes.admission).
+    Une requête profilée ignore le cache: le rapport est toujours régénéré (puis remis en cache).
     """
-    start_month = int(data.get('start_month', 1))
-    end_month = int(data.get('end_month', 12))
     layout_type = data.get('layout_type', None)  # Get user-selected layout
 
     # Log what layout_type was received
     logger.info(f"Received layout_type from frontend: {layout_type}")
 
-    # Créer la clé de cache (include layout_type for Grand Livre Compta Gen)
-    cache_key_suffix = f"_{layout_type}" if layout_type and report_type == config.GRAND_LIVRE_COMPTA_GEN else ""
-    cache_key = cache_manager.get_cache_key(report_type, company_code, year, start_month, end_month, bp_type, bnk) + cache_key_suffix
+    # Créer la clé de cache
+    cache_key = cache_key or _get_report_cache_key(data, report_type, company_code, year, bnk, bp_type)
+    if record_request:
+        cache_manager.record_request(cache_key)
+    bypass_cache = is_profiling()
 
-    # Vérifier si le rapport est en cache
-    cached_file = cache_manager.get_cache(cache_key)
-    if cached_file:
-        logger.info(f"Cache hit pour {cache_key}")
-        cache_manager.access_cache(cache_key)
-        return send_from_directory(directory=os.getcwd(), path=cached_file, as_attachment=True), 200
+    # Single-flight: une seule génération par clé, les requêtes concurrentes attendent son résultat
+    while True:
+        # Vérifier si le rapport est en cache
+        cached_file = None if bypass_cache else cache_manager.get_cache(cache_key)
+        if cached_file:
+            logger.info(f"Cache hit pour {cache_key}")
+            cache_manager.access_cache(cache_key)
+            record_cache_result(report_type, hit=True)
+            return send_from_directory(directory=os.getcwd(), path=cached_file, as_attachment=True), 200
 
-    # Générer le rapport avec les paramètres de cache
-    logger.info(f"Cache miss pour {cache_key} - génération en cours...")
+        if cache_manager.acquire_generation_lock(cache_key):
+            break
 
-    # Déterminer la fonction correcte avec le bon nombre de paramètres
-    if bp_type:
-        # Pour generate_gl_bp et generate_bal_bp
-        result = generate_func(data, bp_type=bp_type, cache_manager=cache_manager, cache_key=cache_key)
-    elif bnk:
-        # Pour les rapports bancaires
-        result = generate_func(data, bnk=bnk, cache_manager=cache_manager, cache_key=cache_key, layout_type=layout_type)
-    else:
-        # Pour generate_gl_compta_gen et generate_bal_gen
-        if report_type == config.GRAND_LIVRE_COMPTA_GEN:
-            # Pass layout_type for Grand Livre Compta Gen
-            result = generate_func(data, cache_manager=cache_manager, cache_key=cache_key, layout_type=layout_type)
-        else:
-            result = generate_func(data, cache_manager=cache_manager, cache_key=cache_key)
+        logger.info(f"Génération déjà en cours pour {cache_key} - attente du résultat...")
+        cache_manager.wait_for_generation(cache_key)
+
+    try:
+        # Re-vérifier: la génération précédente a pu se terminer juste avant la prise du verrou
+        cached_file = None if bypass_cache else cache_manager.get_cache(cache_key)
+        if cached_file:
+            logger.info(f"Cache hit pour {cache_key}")
+            cache_manager.access_cache(cache_key)
+            record_cache_result(report_type, hit=True)
+            return send_from_directory(directory=os.getcwd(), path=cached_file, as_attachment=True), 200
+
+        # Générer le rapport avec les paramètres de cache
+        logger.info(f"Cache miss pour {cache_key} - génération en cours...")
+        output_file = _get_output_file(data, report_type, cache_key)
+        record_cache_result(report_type, hit=False)
+
+        # Le générateur écrit dans un fichier temporaire, renommé sur output_file une fois le classeur
+        # fermé: une régénération (profilage, préchauffage) ne tronque jamais un fichier en cours de
+        # téléchargement. La mise en cache est faite ici, après le renommage (cache_key=None au générateur).
+        temporary_file = f"{output_file}.{uuid.uuid4().hex}.tmp"
+        try:
+            # Limite de générations simultanées (les cache hits ci-dessus n'y passent pas)
+            with admission_controller.admit(report_type, background=background, low_priority=low_priority), track_generation(report_type):
+                if uses_worker_processes():
+                    # Processus worker au pool polars dimensionné (cf. routes/cpu_scheduler.py)
+                    generate_in_worker(data, generate_func, report_type, bnk, bp_type, temporary_file)
+                else:
+                    response, _ = _run_generator(data, generate_func, report_type, bnk, bp_type, cache_manager, None,
+                                                 temporary_file)
+                    response.close()
+            os.replace(temporary_file, output_file)
+        finally:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+        cache_manager.set_cache(cache_key, output_file)
+        record_output(report_type, output_file)
+        result = send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
+    finally:
+        cache_manager.release_generation_lock(cache_key)
 
     return result
 
@@ -161,7 +287,8 @@ def cache_stats_endpoint():
             "total_size_mb": stats['total_size_mb'],
             "cache_folder": stats['cache_folder'],
             "ttl": "infinite",
-            "invalidation": "signature-based (when source files change)"
+            "invalidation": "signature-based (when source files change)",
+            "eviction": f"LRU, max {config.CACHE_MAX_SIZE_MB} MB / {config.CACHE_MAX_ENTRIES} entries"
         }), 200
     except Exception as e:
         return jsonify({
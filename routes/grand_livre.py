@@ -7,6 +7,10 @@ import uuid
 from xlsxwriter import Workbook
 from routes.customs_functions import *
 from layout_manager import LayoutManager
+from routes.progress import enumerate_progress
+from routes.prepared_frames import load_prepared_ledger_frame
+from routes.metrics import mark_stage, record_volume
+from routes.memory import check_memory_budget, SpilledFrames
 import time
 import logging
 
@@ -17,7 +21,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None, layout_type=None):
+def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None, layout_type=None, output_file=None):
     # ============================================================================
     # TIMING: Start request timer
     # ============================================================================
@@ -26,7 +30,7 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
 
     stage_start = time.time()
 
-    output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + '.xlsx'
 
     # Initialize layout manager for this company
     company_code = data.get('company_code')
@@ -42,9 +46,8 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
     # TIMING: Data loading
     stage_start = time.time()
 
-    # Load data file and all gl initial balance
-    df = load_data(config.transactions_data_folder, config.filter_column, data.get("company_code"), config.selected_columns,
-                   config.amount_column, start_date, end_date, data.get('company_code'), str(year), bank=bnk)
+    # Load prepared transactions (Arrow cache keyed by the company-year data signature) and all gl initial balance
+    df = load_prepared_ledger_frame(company_code, str(year), start_date, end_date, bnk=bnk, cache_manager=cache_manager)
     if df.is_empty():
         total_time = time.time() - request_start_time
         logger.info(f"Grand Livre generation completed (empty) in {total_time:.2f}s for {company_code}")
@@ -63,11 +66,15 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
                                                                             data.get("year"), bank=bnk)
 
     timing_stages['data_loading'] = time.time() - stage_start
+    mark_stage("load", df)
+
+    # Over the memory budget: per-account tables kept for the consolidation sheets are spilled to disk
+    low_memory = check_memory_budget(df, config.GRAND_LIVRE_BNK if bnk else config.GRAND_LIVRE_COMPTA_GEN)
 
     unique_values = df_initial_balance[config.SYSCOHADA_column_in_initial_balance].unique().to_list()
     unique_values.sort()
-    pd_dfs_comptes_bilan = []
-    pd_dfs_comptes_gestion = []
+    pd_dfs_comptes_bilan = SpilledFrames(low_memory)
+    pd_dfs_comptes_gestion = SpilledFrames(low_memory)
 
     # Set locale to French
     french_months = {
@@ -76,7 +83,7 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
         9: "Septembre", 10: "Octobre", 11: "Novembre", 12: "Décembre"
     }
 
-    company_name = df["Company code Name"].to_list()[0]
+    company_name = df[config.renamed_columns["Company code Name"]].to_list()[0]
 
     # ============================================================================
     # OPTIMIZATION: Data Preparation (DONE ONCE for ALL accounts)
@@ -85,8 +92,7 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
     # TIMING: Data preparation
     stage_start = time.time()
 
-    # 1. Pre-compute unique initial balance (was inside loop - called 200+ times!)
-    df_initial_balance_unique = df_initial_balance.unique(("Numéro de compte IFRS"), keep='first', maintain_order=True)
+    # 1. Transactions are already joined, split into Débit/Crédit and renamed (see routes.prepared_frames)
 
     # 2. Pre-build initial balance lookup dictionary (avoid filtering 200+ times)
     initial_balance_lookup = {}
@@ -115,41 +121,6 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
                 'balance': 0
             }
 
-    # 3. Join initial balance to entire dataset ONCE (was inside loop!)
-    df = df.join(df_initial_balance_unique, left_on=config.offset_account_column_name,
-                 right_on="Numéro de compte IFRS", how="left")
-
-    # 4. Keep SYSCOHADA account number for filtering (add as separate column before dropping)
-    df = df.with_columns(pl.col(config.SYSCOHADA_column_in_main_data).alias("SYSCOHADA_Account"))
-
-    # 5. Create Debit/Credit columns ONCE for entire dataset (was inside loop!)
-    df = df.with_columns([
-        pl.when(pl.col(config.amount_column) <= 0)
-        .then(pl.col(config.amount_column))
-        .otherwise(0)
-        .alias("Crédit"),
-
-        pl.when(pl.col(config.amount_column) > 0)
-        .then(pl.col(config.amount_column).abs())
-        .otherwise(0)
-        .alias("Débit")
-    ])
-
-    # 6. Remove unwanted columns ONCE (but keep SYSCOHADA_Account for filtering)
-    df = df.drop([config.amount_column, config.SYSCOHADA_column_in_main_data])
-
-    # 7. Rename columns ONCE for entire dataset
-    df = df.rename(config.renamed_columns)
-
-    # 8. Cast Date/Time columns ONCE
-    cast_columns = []
-    if "Date de Saisie" in df.columns:
-        cast_columns.append(pl.col("Date de Saisie").cast(pl.Utf8))
-    if "Heure de Saisie" in df.columns:
-        cast_columns.append(pl.col("Heure de Saisie").cast(pl.Utf8))
-    if cast_columns:
-        df = df.with_columns(cast_columns)
-
     # ============================================================================
     # STRATEGY 3: Pre-compute layout-specific operations (avoid 200+ redundant calls)
     # ============================================================================
@@ -175,6 +146,8 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
     final_columns_template = [col for col in renamed_reordered_columns if col not in excluded_columns]
 
     timing_stages['data_preparation'] = time.time() - stage_start
+    mark_stage("prepare")
+    record_volume(rows=len(df), accounts=len(unique_values))
 
     # ============================================================================
     # Now loop through accounts for account-specific processing and Excel writing
@@ -201,7 +174,7 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
 
         # Initialize worksheet cache to avoid repeated get_worksheet_by_name() calls
         worksheet_cache = {}
-        for value in unique_values:
+        for index, value in enumerate_progress(unique_values, "comptes"):
             if value == "OHADA VIDES":
                 continue
 
@@ -578,7 +551,10 @@ def generate_gl_compta_gen(data, bnk=False, cache_manager=None, cache_key=None,
                                         table_style="Table Style Light 10",
                                         autofilter=False, position=write_info['position'])
 
+        mark_stage("render")
+
     timing_stages['excel_generation'] = time.time() - stage_start
+    mark_stage("write")
 
     # ============================================================================
     # TIMING: Calculate and log total time
@@ -6,8 +6,11 @@ import os
 import uuid
 from xlsxwriter import Workbook
 from routes.customs_functions import *
+from routes.progress import enumerate_progress
+from routes.metrics import mark_stage, record_volume
+from routes.memory import check_memory_budget, SpilledFrames
 
-def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
+def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None, output_file=None):
     # Get year and months sent by user
     year = int(data.get('year'))
     start_date = f"01/{int(data.get('start_month')):02d}/{year}"
@@ -23,10 +26,14 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
                                                                             "Total",
                                                                             data.get("company_code"),
                                                                             data.get("year"), bp_type)
+    mark_stage("load", df)
 
-    unique_values = df_initial_balance.select([bp_type, f"{bp_type} Name", "Total"]).unique()
-    unique_values.sort(bp_type)
-    pd_dfs = []
+    # Over the memory budget: per-BP tables kept for the consolidation sheet are spilled to disk
+    low_memory = check_memory_budget(df, data.get("report_type"))
+
+    unique_values = df_initial_balance.select([bp_type, f"{bp_type} Name", "Total"]).unique().sort(bp_type)
+    record_volume(rows=len(df), accounts=len(unique_values))
+    pd_dfs = SpilledFrames(low_memory)
 
     # Set locale to French
     french_months = {
@@ -35,41 +42,55 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
         9: "Septembre", 10: "Octobre", 11: "Novembre", 12: "Décembre"
     }
 
-    output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
+    bp_label = 'Fournisseur' if bp_type == 'Vendor' else 'Client'
+    gl_sheet_name = f"Grand Livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'}"
 
-    with Workbook(output_file) as writer:
-        for row in unique_values.iter_rows():
-            value, bp_name, bp_balance = row  # Unpack values
-            filtered_df = df.filter(pl.col(bp_type) == str(value))
-            if filtered_df.is_empty():
-                continue
+    # Prepare the whole BP frame ONCE: Débit/Crédit, renaming, Libellé, Month and Date columns
+    df = df.with_columns([
+        pl.when(pl.col(config.amount_column) <= 0)
+        .then(pl.col(config.amount_column))
+        .otherwise(0)
+        .alias("Crédit"),
 
-            # Create 'credit' and 'debit' columns based on 'amount' value and Contrepartie column
-            filtered_df = filtered_df.with_columns([
-                pl.when(pl.col(config.amount_column) <= 0)
-                .then(pl.col(config.amount_column))
-                .otherwise(0)
-                .alias("Crédit"),
-
-                pl.when(pl.col(config.amount_column) > 0)
-                .then(pl.col(config.amount_column).abs())
-                .otherwise(0)
-                .alias("Débit")
-            ])
+        pl.when(pl.col(config.amount_column) > 0)
+        .then(pl.col(config.amount_column).abs())
+        .otherwise(0)
+        .alias("Débit")
+    ])
+    df = df.drop([config.amount_column, config.SYSCOHADA_column_in_main_data])
+    df = df.rename(config.vendor_renamed_columns) if bp_type == "Vendor" else df.rename(config.customer_renamed_columns)
+    df = df.with_columns([
+        pl.when(pl.col("Libellé").is_null() & pl.col("Référence").is_null())
+        .then(pl.lit(""))
+        .otherwise(pl.col("Libellé").fill_null(pl.col("Référence")))  # Fill Libellé with Référence
+        .alias("Libellé"),
 
-            # Remove unwanted columns
-            filtered_df = filtered_df.drop([config.amount_column, config.SYSCOHADA_column_in_main_data])
+        pl.col("Date")
+        .dt.strftime("%Y-%m")  # Format as Year-Month
+        .alias("Month"),
 
-            # Rename columns to french for output
-            filtered_df = filtered_df.rename(config.vendor_renamed_columns) if bp_type == "Vendor" else filtered_df.rename(config.customer_renamed_columns)
-            
-            # Fill empty values in column Libellé with corresponding values from column Référence
-            filtered_df = filtered_df.with_columns(
-                pl.when(pl.col("Libellé").is_null() & pl.col("Référence").is_null())
-                .then(pl.lit(""))
-                .otherwise(pl.col("Libellé").fill_null(pl.col("Référence")))  # Fill Libellé with Référence
-                .alias("Libellé")
-            )
+        pl.col("Date")
+        .dt.strftime("%d/%m/%Y")  # Format to "day/month/year"
+    ])
+
+    # Split the frame by BP in a single pass (instead of one filter per BP)
+    partitions = df.partition_by(bp_type, as_dict=True, maintain_order=True)
+
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + '.xlsx'
+
+    mark_stage("prepare", df)
+
+    with Workbook(output_file) as writer:
+        # Create format object ONCE (shared by every per-BP sheet and the consolidation sheet)
+        merge_format = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 14})
+
+        for index, row in enumerate_progress(unique_values.iter_rows(), "tiers", total=len(unique_values)):
+            value, bp_name, bp_balance = row  # Unpack values
+            filtered_df = partitions.get((str(value),))
+
+            # Skip BPs without movements before doing any per-BP work
+            if filtered_df is None or filtered_df.is_empty():
+                continue
 
             filtered_df = filtered_df.with_columns([
                 (pl.lit(bp_balance) + 
@@ -77,26 +98,13 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
                 pl.col("Débit").cum_sum()).alias("Solde")
             ])
 
-            # Create new Month column to be able to group transactions of same month
-            filtered_df = filtered_df.with_columns([
-                pl.col("Date")
-                .dt.strftime("%Y-%m")  # Format as Year-Month
-                .alias("Month")
-            ])
-
-            # Convert the Date column to the desired format and overwrite it
-            filtered_df = filtered_df.with_columns([
-                pl.col("Date")
-                .dt.strftime("%d/%m/%Y")  # Format to "day/month/year"
-            ])
-
-            # Create a new list to hold ledger year-months rows
-            ledger_df = pl.DataFrame()
+            # Collect month blocks and subtotals, then concatenate once
+            ledger_parts = []
 
             # Process each month separately for the current ledger
             for month, group in filtered_df.group_by("Month", maintain_order=True):
                 # Append all original rows of that month
-                ledger_df = pl.concat([ledger_df, group], how="diagonal")
+                ledger_parts.append(group)
 
                 # Compute monthly subtotal (sum of credit & debit, last balance)
                 subtotal = pl.DataFrame({
@@ -108,7 +116,7 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
                 })
 
                 # Append the subtotal row after the month
-                ledger_df = pl.concat([ledger_df, subtotal], how="diagonal")
+                ledger_parts.append(subtotal)
 
             # Compute and append total balance row
             total_balance = pl.DataFrame({
@@ -119,12 +127,9 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
                 "Solde": [filtered_df["Solde"].to_list()[-1]],
             })
 
-            ledger_df = pl.concat([ledger_df, total_balance], how="diagonal")
-
-            # Drop the temporary "Month" column
-            ledger_df.drop(["Month"])
-            filtered_df = ledger_df.clone()
-            del ledger_df
+            ledger_parts.append(total_balance)
+            filtered_df = pl.concat(ledger_parts, how="diagonal")
+            del ledger_parts
 
             # Add thousand separator for columns 'debit', 'credit' and 'solde'
             filtered_df = filtered_df.with_columns([
@@ -169,30 +174,23 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
             # Append one GL table to all GL table
             pd_dfs.append({"df": filtered_df, "name": value, "desc": bp_name})
             
-            # Access the workbook and worksheet
-            sheet_name = str(value)
-            workbook = writer
-            worksheet = writer.get_worksheet_by_name(sheet_name)
-
             # Merge cells and add a title and some header description
-            merge_format = workbook.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 14})
+            worksheet = writer.get_worksheet_by_name(str(value))
             worksheet.merge_range('A1:K1', f"{company_name}", merge_format)  # Adjust column range as needed
-            worksheet.merge_range('A3:K3', f"{'Fournisseur' if bp_type == 'Vendor' else 'Client'} <{value}> {bp_name}", merge_format)  # Adjust column range as needed
+            worksheet.merge_range('A3:K3', f"{bp_label} <{value}> {bp_name}", merge_format)  # Adjust column range as needed
             worksheet.merge_range('A4:K4', f"Grand-livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'} du {start_date} au {end_date}",
                                   merge_format)  # Adjust column range as needed
 
         # Concatenate all DataFrames and save to sheet Grand Livre
         current_row = 1
 
-        pl.DataFrame().write_excel(writer, worksheet=f"Grand Livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'}")
+        pl.DataFrame().write_excel(writer, worksheet=gl_sheet_name)
 
-        for gl_df in pd_dfs:
-            # Access the workbook and worksheet
-            workbook = writer
-            worksheet = writer.get_worksheet_by_name(f"Grand Livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'}")
+        # Get worksheet reference ONCE for the consolidation sheet
+        worksheet = writer.get_worksheet_by_name(gl_sheet_name)
 
+        for gl_df in pd_dfs:
             # Merge cells and add a title and some header description
-            merge_format = workbook.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 14})
             if current_row == 1:
                 worksheet.merge_range(f'A{current_row}:K{current_row}', f"{company_name}",
                                       merge_format)  # Adjust column range as needed
@@ -200,17 +198,18 @@ def generate_gl_bp(data, bp_type, cache_manager=None, cache_key=None):
             worksheet.merge_range(f'A{current_row + 2}:K{current_row + 2}', f"Compte <{gl_df['name']}> {gl_df['desc']}",
                                   merge_format)  # Adjust column range as needed
             worksheet.merge_range(f'A{current_row + 3}:K{current_row + 3}',
-                                  f"Grand Livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'} du {start_date} au {end_date}",
+                                  f"{gl_sheet_name} du {start_date} au {end_date}",
                                   merge_format)  # Adjust column range as needed
             # Write the DataFrame
-            gl_df['df'].write_excel(writer, worksheet=f"Grand Livre {'Fournisseurs' if bp_type == 'Vendor' else 'Clients'}",  table_style="Table Style Light 10", 
+            gl_df['df'].write_excel(writer, worksheet=gl_sheet_name, table_style="Table Style Light 10",
                                     autofilter=False, position=(current_row + 5, 0))
 
             # Update the current row to write the next DataFrame below
             current_row += len(gl_df['df']) + 7  # Add 2 rows spaces between DataFrames
 
-        # Concatenate all DataFrames and save to sheet Grand Livre starting at row 1
-        current_row = 1
+        mark_stage("render")
+
+    mark_stage("write")
 
     # Mettre en cache si le cache_manager est fourni
     if cache_manager and cache_key:
@@ -0,0 +1,171 @@
+from flask import send_from_directory
+import polars as pl
+import calendar
+import config
+import os
+import uuid
+from datetime import datetime
+from xlsxwriter import Workbook
+from routes.customs_functions import *
+from routes.metrics import mark_stage, record_volume
+
+JOURNAL_COLUMNS = ["Date", "Pièce", "Type de pièce", "Désignation Type de pièce", "Référence",
+                   "Compte SYSCOHADA", "Compte IFRS", "Desc Compte IFRS", "Libellé", "Débit", "Crédit"]
+
+CSV_BATCH_ROWS = 50_000
+
+FRENCH_MONTHS = {
+    "01": "Janvier", "02": "Février", "03": "Mars", "04": "Avril",
+    "05": "Mai", "06": "Juin", "07": "Juillet", "08": "Août",
+    "09": "Septembre", "10": "Octobre", "11": "Novembre", "12": "Décembre"
+}
+
+
+def build_journal_frame(df: pl.DataFrame, selection: dict) -> pl.DataFrame:
+    """
+    Construit le journal: lignes des pièces sélectionnées, total par pièce et total par mois,
+    en une seule passe group_by puis un seul tri. Les colonnes techniques (préfixe "_")
+    indiquent le type de ligne: _order 0 = ligne, 1 = total pièce, 2 = total mois.
+    """
+    amount = pl.col(config.amount_column)
+    lines = (
+        df
+        .filter(pl.col("Document Type").is_in(selection["document_types"]) |
+                pl.col("Désignation").is_in(selection["designations"]))
+        .with_row_index("_row")  # keeps the posting-date order from load_data
+        .with_columns([
+            pl.when(amount > 0).then(amount).otherwise(0).alias("Débit"),
+            pl.when(amount <= 0).then(amount.abs()).otherwise(0).alias("Crédit"),
+            pl.col(config.posting_date_column_name).dt.strftime("%Y-%m").alias("_month"),
+            pl.col(config.posting_date_column_name).dt.strftime("%d/%m/%Y").alias(config.posting_date_column_name),
+            pl.col("Document Number").alias("_doc"),
+            pl.lit(0).alias("_order"),
+        ])
+        .rename({**{k: v for k, v in config.renamed_columns.items() if k in df.columns},
+                 config.SYSCOHADA_column_in_main_data: "Compte SYSCOHADA"})
+    )
+
+    totals = [pl.col("Débit").sum(), pl.col("Crédit").sum(), pl.len().alias("_count")]
+
+    document_totals = (
+        lines
+        .group_by(["_month", "_doc"])
+        .agg(totals + [pl.col("Type de pièce").first()])
+        .with_columns([
+            pl.lit("Total pièce").alias("Date"),
+            pl.col("_doc").alias("Pièce"),
+            (pl.col("_count").cast(pl.Utf8) + pl.lit(" ligne(s)")).alias("Libellé"),
+            pl.lit(1).alias("_order"),
+        ])
+    )
+
+    month_totals = (
+        lines
+        .group_by("_month")
+        .agg(totals)
+        .with_columns([
+            pl.lit("Total mois").alias("Date"),
+            pl.col("_month").str.slice(5, 2).replace_strict(FRENCH_MONTHS, default="").alias("Type de pièce"),
+            (pl.col("_count").cast(pl.Utf8) + pl.lit(" ligne(s)")).alias("Libellé"),
+            pl.lit("\uffff").alias("_doc"),  # sorts after every document of the month
+            pl.lit(2).alias("_order"),
+        ])
+    )
+
+    return (
+        pl.concat([lines, document_totals, month_totals], how="diagonal_relaxed")
+        .sort(["_month", "_doc", "_order", "_row"], nulls_last=True)
+        .select(JOURNAL_COLUMNS + ["_order"])
+    )
+
+
+def write_journal_csv(journal: pl.DataFrame, grand_total: dict, output_file: str) -> None:
+    """
+    Export CSV (séparateur ";") écrit par tranches de CSV_BATCH_ROWS lignes, ligne TOTAL en dernier:
+    ni classeur ni copie complète du journal en mémoire. Le fichier est ensuite mis en cache et servi
+    depuis le disque comme les autres rapports.
+    """
+    amounts = [pl.col(col).cast(pl.Float64) for col in ("Débit", "Crédit")]
+    total_row = pl.DataFrame([{col: grand_total.get(col) for col in JOURNAL_COLUMNS}])
+    with open(output_file, "wb") as csv_file:
+        csv_file.write((";".join(JOURNAL_COLUMNS) + "\n").encode())
+        for batch in [*journal.select(JOURNAL_COLUMNS).iter_slices(CSV_BATCH_ROWS), total_row]:
+            batch.with_columns(amounts).write_csv(csv_file, separator=";", include_header=False)
+
+
+def generate_journal(data, cache_manager=None, cache_key=None, output_file=None):
+    report_type = data.get("report_type")
+    selection = config.JOURNAL_SELECTIONS[report_type]
+    export_format = data.get("export_format", "xlsx").lower()
+
+    output_file = output_file or config.output_folder + str(uuid.uuid4()) + ('.csv' if export_format == "csv" else '.xlsx')
+
+    # Get year and months sent by user
+    year = int(data.get('year'))
+    start_date = f"01/{int(data.get('start_month')):02d}/{year}"
+    end_date = f"{calendar.monthrange(year, int(data.get('end_month')))[1]}/{int(data.get('end_month')):02d}/{year}"
+
+    # Load data file
+    df = load_data(config.transactions_data_folder, config.filter_column, data.get("company_code"), config.selected_columns,
+                   config.amount_column, start_date, end_date, data.get('company_code'), str(year))
+    mark_stage("load", df)
+
+    journal = build_journal_frame(df, selection) if not df.is_empty() else pl.DataFrame(schema={col: pl.Utf8 for col in JOURNAL_COLUMNS})
+    entries = journal.filter(pl.col("_order") == 0) if "_order" in journal.columns else journal
+    grand_total = {"Date": "TOTAL", "Type de pièce": f"{len(entries)} ligne(s)",
+                   "Débit": entries["Débit"].cast(pl.Float64).sum(), "Crédit": entries["Crédit"].cast(pl.Float64).sum()}
+    record_volume(rows=len(entries), accounts=entries["Pièce"].n_unique() if "Pièce" in entries.columns else 0)
+    mark_stage("prepare", journal)
+
+    if export_format == "csv":
+        write_journal_csv(journal, grand_total, output_file)
+    else:
+        with Workbook(output_file) as writer:
+            worksheet = writer.add_worksheet(selection["title"].title()[:31])
+
+            # Formats created once
+            number_fmt = writer.add_format({'num_format': '#,##0_);[Red](#,##0);'})
+            merge_format = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 14})
+            header_fmt = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 9, 'border': 2, 'bg_color': '#00b6e9', 'font_color': 'white'})
+            subtotal_label_fmt = writer.add_format({'bold': True, 'bg_color': '#F0F8FF'})
+            subtotal_number_fmt = writer.add_format({'bold': True, 'num_format': '#,##0_);[Red](#,##0);', 'bg_color': '#F0F8FF'})
+
+            worksheet.merge_range('A1:K1', f"{data.get('company_code')} - {data.get('company_name', '')}", merge_format)
+            worksheet.merge_range('A3:K3', f"{selection['title']} du {start_date} au {end_date}", merge_format)
+            worksheet.write_row('A6', JOURNAL_COLUMNS, header_fmt)
+
+            # Write every column in one block
+            first_row = 6
+            for col_idx, col in enumerate(JOURNAL_COLUMNS):
+                if col in ("Débit", "Crédit"):
+                    worksheet.write_column(first_row, col_idx, journal[col].to_list(), number_fmt)
+                else:
+                    worksheet.write_column(first_row, col_idx, journal[col].to_list())
+
+            # Highlight document and month total rows
+            if "_order" in journal.columns:
+                total_rows = journal.with_row_index("_position").filter(pl.col("_order") > 0)
+                for row in total_rows.select(["_position"] + JOURNAL_COLUMNS).iter_rows(named=True):
+                    position = first_row + row["_position"]
+                    for col_idx, col in enumerate(JOURNAL_COLUMNS):
+                        if col in ("Débit", "Crédit"):
+                            worksheet.write(position, col_idx, row[col], subtotal_number_fmt)
+                        else:
+                            worksheet.write(position, col_idx, row[col], subtotal_label_fmt)
+
+            # Grand total
+            last_row = first_row + len(journal) + 1
+            worksheet.write(last_row, 0, grand_total["Date"], subtotal_label_fmt)
+            worksheet.write(last_row, 2, grand_total["Type de pièce"], subtotal_label_fmt)
+            worksheet.write(last_row, 9, grand_total["Débit"], subtotal_number_fmt)
+            worksheet.write(last_row, 10, grand_total["Crédit"], subtotal_number_fmt)
+            worksheet.set_column(0, len(JOURNAL_COLUMNS) - 1, 16)
+            mark_stage("render")
+
+    mark_stage("write")
+
+    # Mettre en cache si le cache_manager est fourni
+    if cache_manager and cache_key:
+        cache_manager.set_cache(cache_key, output_file)
+
+    return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
@@ -0,0 +1,147 @@
+"""
+Suivi mémoire des générations de rapports et budget mémoire par requête.
+
+- current_rss_bytes(): mémoire résidente du processus (/proc/self/statm, sinon resource)
+- PeakRssSampler: pic de RSS pendant une génération (échantillonné par un thread)
+- check_memory_budget(df): prévoit le pic d'une génération à partir de la taille du DataFrame
+  chargé; au-delà de GENERATION_MEMORY_BUDGET_MB, bascule en mode économe ou refuse la requête
+- SpilledFrames: liste de DataFrames écrits sur disque (Arrow IPC) en mode économe, au lieu de
+  garder en mémoire les copies destinées aux feuilles de consolidation
+
+Le RSS est celui du processus: avec plusieurs générations simultanées, le pic mesuré et la
+prévision incluent la mémoire des autres générations en cours.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+import polars as pl
+import config
+from routes.timing import record_detail
+
+logger = logging.getLogger(__name__)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MemoryBudgetExceeded(Exception):
+    """La génération dépasserait le budget mémoire configuré."""
+
+
+def current_rss_bytes() -> int:
+    """Mémoire résidente actuelle du processus (à défaut, le pic depuis son démarrage)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+    return 0
+
+
+class PeakRssSampler:
+    """Relève périodiquement le RSS du processus et conserve le maximum."""
+
+    def __init__(self, interval: float = None):
+        self.interval = config.MEMORY_SAMPLE_INTERVAL_SECONDS if interval is None else interval
+        self.start_rss = current_rss_bytes()
+        self.peak = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> int:
+        rss = current_rss_bytes()
+        if rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return self.peak
+
+
+def check_memory_budget(df: pl.DataFrame, report_type: str) -> bool:
+    """
+    Prévoit le pic mémoire de la génération (RSS actuel + taille estimée du DataFrame x facteur)
+    et le compare à GENERATION_MEMORY_BUDGET_MB.
+    Retourne True si la génération doit passer en mode économe; lève MemoryBudgetExceeded si
+    même le mode économe dépasserait le budget (ou si MEMORY_BUDGET_ACTION vaut "refuse").
+    """
+    budget_mb = config.GENERATION_MEMORY_BUDGET_MB
+    if not budget_mb:
+        return False
+
+    budget = budget_mb * 1024 * 1024
+    rss = current_rss_bytes()
+    frame_bytes = df.estimated_size()
+    predicted = rss + frame_bytes * config.MEMORY_ESTIMATE_FACTOR
+    if predicted <= budget:
+        return False
+
+    predicted_low_memory = rss + frame_bytes * config.LOW_MEMORY_ESTIMATE_FACTOR
+    if config.MEMORY_BUDGET_ACTION == "refuse" or predicted_low_memory > budget:
+        raise MemoryBudgetExceeded(
+            f"{report_type}: pic mémoire prévu {predicted / 1024 / 1024:.0f} MB "
+            f"(données {frame_bytes / 1024 / 1024:.0f} MB) pour un budget de {budget_mb} MB"
+        )
+
+    logger.warning(f"{report_type}: pic mémoire prévu {predicted / 1024 / 1024:.0f} MB > budget {budget_mb} MB, "
+                   f"génération en mode économe")
+    record_detail("memory", "low_memory", True)
+    return True
+
+
+class SpilledFrames:
+    """
+    Liste de {"df": DataFrame, ...} pour les feuilles de consolidation.
+    En mode économe, chaque DataFrame est écrit dans un fichier Arrow IPC temporaire et relu en
+    mémoire mappée au moment de l'écriture de la consolidation (pages de fichier, récupérables par
+    le système) au lieu de rester en mémoire pendant tout le rendu des feuilles par compte.
+    """
+
+    def __init__(self, spill: bool):
+        self.spill = spill
+        self._entries = []
+        self._folder = None
+
+    def append(self, entry: dict) -> None:
+        if self.spill:
+            if self._folder is None:
+                os.makedirs(config.cache_folder, exist_ok=True)
+                self._folder = tempfile.mkdtemp(prefix="spill_", dir=config.cache_folder)
+                weakref.finalize(self, shutil.rmtree, self._folder, True)
+            path = os.path.join(self._folder, f"{uuid.uuid4().hex}.arrow")
+            entry["df"].write_ipc(path, compression="uncompressed")
+            entry = {**entry, "df": path}
+        self._entries.append(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for entry in self._entries:
+            if self.spill:
+                entry = {**entry, "df": pl.read_ipc(entry["df"], memory_map=True)}
+            yield entry
@@ -0,0 +1,405 @@
+"""
+Métriques de cache et de génération des rapports, exposées au format texte Prometheus sur /metrics.
+
+Registre minimal (compteurs, jauges, histogrammes avec labels), sans dépendance externe.
+Les valeurs sont propres à chaque processus (label pid). Sous serve.py (REPORT_METRICS_DIR défini),
+chaque worker écrit ses valeurs dans ce dossier partagé (toutes les METRICS_FLUSH_INTERVAL_SECONDS
+et à chaque scrape) et /metrics renvoie la somme de tous les workers, sans label pid: compteurs et
+histogrammes des workers arrêtés compris, jauges des seuls workers vivants.
+
+Les générateurs découpent leur durée en étapes avec mark_stage("load" | "prepare" | "render" | "write"):
+chaque appel enregistre le temps écoulé depuis l'étape précédente de la génération en cours, dans
+l'histogramme et dans l'enregistrement de timing de la requête (span "stage.<étape>").
+mark_stage("load", df) enregistre en plus la taille estimée du DataFrame à cette étape; le pic de RSS
+de chaque génération est relevé par track_generation (voir routes.memory).
+"""
+
+from flask import Blueprint, Response
+from contextlib import contextmanager
+import contextvars
+import copy
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import config
+from routes.timing import record_span, record_detail
+from routes.memory import MemoryBudgetExceeded, PeakRssSampler
+
+logger = logging.getLogger(__name__)
+
+metrics = Blueprint("metrics", __name__)
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+SIZE_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 50_000_000, 100_000_000, 500_000_000)
+MEMORY_BUCKETS = (100_000_000, 250_000_000, 500_000_000, 1_000_000_000, 2_000_000_000, 4_000_000_000,
+                  8_000_000_000, 16_000_000_000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self, pid_label, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((self._values if values is None else values).items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value, pid_label))
+        return lines
+
+    def _render_value(self, key, value, pid_label):
+        return [f"{self.name}{_format_labels(self.labelnames, key, pid_label)} {value}"]
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(key), copy.deepcopy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, value):
+        return value if total is None else total + value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @staticmethod
+    def merge(total, state):
+        if total is None:
+            return copy.deepcopy(state)
+        total["counts"] = [a + b for a, b in zip(total["counts"], state["counts"])]
+        total["sum"] += state["sum"]
+        total["count"] += state["count"]
+        return total
+
+    def _render_value(self, key, state, pid_label):
+        lines = []
+        for bound, count in zip(self.buckets, state["counts"]):
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {**pid_label, 'le': bound})} {count}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, {**pid_label, 'le': '+Inf'})} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key, pid_label)} {state['sum']}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key, pid_label)} {state['count']}")
+        return lines
+
+
+CACHE_REQUESTS = Counter("report_cache_requests_total", "Report requests by cache result (hit/miss)",
+                         ["report_type", "result"])
+GENERATION_SECONDS = Histogram("report_generation_duration_seconds", "Total report generation time",
+                               ["report_type"])
+STAGE_SECONDS = Histogram("report_generation_stage_duration_seconds", "Report generation time per stage",
+                          ["report_type", "stage"])
+ROWS_PROCESSED = Counter("report_rows_processed_total", "Transaction rows loaded by report generations",
+                         ["report_type"])
+ACCOUNTS_PROCESSED = Counter("report_accounts_processed_total", "Accounts or business partners rendered",
+                             ["report_type"])
+OUTPUT_BYTES = Histogram("report_output_bytes", "Size of generated report files", ["report_type"],
+                         buckets=SIZE_BUCKETS)
+GENERATIONS_IN_FLIGHT = Gauge("report_generations_in_flight", "Report generations currently running",
+                              ["report_type"])
+GENERATION_FAILURES = Counter("report_generation_failures_total", "Report generations that raised an error",
+                              ["report_type"])
+GENERATION_PEAK_RSS = Histogram("report_generation_peak_rss_bytes", "Process peak RSS during a report generation",
+                                ["report_type"], buckets=MEMORY_BUCKETS)
+STAGE_FRAME_BYTES = Histogram("report_generation_frame_bytes", "Estimated DataFrame size at the end of a stage",
+                              ["report_type", "stage"], buckets=MEMORY_BUCKETS)
+MEMORY_REFUSALS = Counter("report_generation_memory_refusals_total",
+                          "Report generations refused because of the memory budget", ["report_type"])
+GENERATION_REJECTIONS = Counter("report_generation_rejections_total",
+                                "Report generations refused by admission control (queue full or wait too long)",
+                                ["report_type"])
+
+REGISTRY = [CACHE_REQUESTS, GENERATION_SECONDS, STAGE_SECONDS, ROWS_PROCESSED, ACCOUNTS_PROCESSED,
+            OUTPUT_BYTES, GENERATIONS_IN_FLIGHT, GENERATION_FAILURES, GENERATION_PEAK_RSS, STAGE_FRAME_BYTES,
+            MEMORY_REFUSALS, GENERATION_REJECTIONS]
+
+# Génération en cours dans le contexte courant: {"report_type", "last_mark", "rows", "accounts"}
+_current_generation = contextvars.ContextVar("current_generation", default=None)
+
+
+def record_cache_result(report_type: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(report_type=report_type, result="hit" if hit else "miss")
+
+
+@contextmanager
+def track_generation(report_type: str):
+    """
+    Mesure une génération: durée totale, pic de RSS, générations en cours, échecs;
+    active mark_stage/record_volume.
+    """
+    start = time.perf_counter()
+    generation = {"report_type": report_type, "last_mark": start, "rows": 0, "accounts": 0}
+    token = _current_generation.set(generation)
+    GENERATIONS_IN_FLIGHT.inc(report_type=report_type)
+    sampler = PeakRssSampler().start()
+    try:
+        yield
+    except MemoryBudgetExceeded:
+        MEMORY_REFUSALS.inc(report_type=report_type)
+        raise
+    except Exception:
+        GENERATION_FAILURES.inc(report_type=report_type)
+        raise
+    finally:
+        peak_rss, start_rss = sampler.stop(), sampler.start_rss
+        if "worker_rss" in generation:
+            # Génération exécutée dans un processus worker: c'est sa mémoire qui compte
+            start_rss, peak_rss = generation["worker_rss"]
+        GENERATIONS_IN_FLIGHT.dec(report_type=report_type)
+        GENERATION_SECONDS.observe(time.perf_counter() - start, report_type=report_type)
+        GENERATION_PEAK_RSS.observe(peak_rss, report_type=report_type)
+        record_detail("memory", "start_rss_bytes", start_rss)
+        record_detail("memory", "peak_rss_bytes", peak_rss)
+        if generation["rows"] or generation["accounts"]:
+            record_detail("volume", "rows", generation["rows"])
+            record_detail("volume", "accounts", generation["accounts"])
+        _current_generation.reset(token)
+
+
+def mark_stage(stage: str, frame=None) -> None:
+    """
+    Enregistre la durée de l'étape qui se termine (depuis l'étape précédente de la génération en cours)
+    et, si `frame` est fourni, la taille estimée de ce DataFrame en fin d'étape.
+    """
+    generation = _current_generation.get()
+    if generation is None:
+        return
+    now = time.perf_counter()
+    STAGE_SECONDS.observe(now - generation["last_mark"], report_type=generation["report_type"], stage=stage)
+    record_span(f"stage.{stage}", now - generation["last_mark"])
+    generation["last_mark"] = now
+    if frame is not None:
+        frame_bytes = frame.estimated_size()
+        STAGE_FRAME_BYTES.observe(frame_bytes, report_type=generation["report_type"], stage=stage)
+        record_detail("memory", f"{stage}_frame_bytes", frame_bytes)
+
+
+def record_volume(rows: int = 0, accounts: int = 0) -> None:
+    """Compte les lignes chargées et les comptes (ou tiers) traités par la génération en cours."""
+    generation = _current_generation.get()
+    if generation is None:
+        return
+    if rows:
+        ROWS_PROCESSED.inc(rows, report_type=generation["report_type"])
+        generation["rows"] += rows
+    if accounts:
+        ACCOUNTS_PROCESSED.inc(accounts, report_type=generation["report_type"])
+        generation["accounts"] += accounts
+
+
+def merge_worker_generation(record: dict) -> None:
+    """
+    Reporte sur la génération en cours les mesures d'une génération exécutée dans un processus worker
+    (routes.cpu_scheduler): durées d'étapes, tailles de DataFrame, volumes et pic de RSS du worker.
+    """
+    generation = _current_generation.get()
+    if generation is None:
+        return
+    report_type = generation["report_type"]
+    for name, entry in record.get("spans", {}).items():
+        if name.startswith("stage."):
+            STAGE_SECONDS.observe(entry["seconds"], report_type=report_type, stage=name[len("stage."):])
+    memory = record.get("memory", {})
+    for key, value in memory.items():
+        if key.endswith("_frame_bytes"):
+            STAGE_FRAME_BYTES.observe(value, report_type=report_type, stage=key[:-len("_frame_bytes")])
+    if "peak_rss_bytes" in memory:
+        generation["worker_rss"] = (memory.get("start_rss_bytes", 0), memory["peak_rss_bytes"])
+    volume = record.get("volume", {})
+    record_volume(rows=volume.get("rows", 0), accounts=volume.get("accounts", 0))
+
+
+def record_output(report_type: str, output_file: str) -> None:
+    try:
+        OUTPUT_BYTES.observe(os.path.getsize(output_file), report_type=report_type)
+    except OSError:
+        pass
+
+
+def generations_completed() -> int:
+    """Générations terminées (réussies ou non) par ce processus depuis son démarrage."""
+    with GENERATION_SECONDS._lock:
+        return sum(state["count"] for state in GENERATION_SECONDS._values.values())
+
+
+def generations_in_flight() -> int:
+    """Générations en cours dans ce processus (requêtes, jobs et préchauffage)."""
+    with GENERATIONS_IN_FLIGHT._lock:
+        return sum(GENERATIONS_IN_FLIGHT._values.values())
+
+
+def _process_gauges() -> list:
+    """Jauges propres au processus calculées à la volée: (nom, description, valeur)."""
+    from routes.admission import admission_controller
+
+    admission = admission_controller.snapshot()
+    return [
+        ("report_generations_admitted", "Report generations holding an admission slot", admission["running"]),
+        ("report_generations_queued", "Report generations waiting for an admission slot", sum(admission["queued"].values())),
+    ]
+
+
+def _multiprocess_dir():
+    return os.environ.get("REPORT_METRICS_DIR")
+
+
+def flush_metrics() -> None:
+    """Écrit les valeurs de ce processus dans le dossier partagé des workers (sans effet hors serve.py)."""
+    folder = _multiprocess_dir()
+    if not folder:
+        return
+    snapshot = {"metrics": {metric.name: metric.snapshot() for metric in REGISTRY},
+                "gauges": [[name, documentation, value] for name, documentation, value in _process_gauges()]}
+    path = os.path.join(folder, f"{os.getpid()}.json")
+    temporary_file = f"{path}.tmp"
+    with open(temporary_file, "w") as output:
+        json.dump(snapshot, output)
+    os.replace(temporary_file, path)
+
+
+def _flush_loop(interval_seconds: float):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            flush_metrics()
+        except Exception as e:
+            logger.warning(f"Écriture des métriques impossible: {e}")
+
+
+def start_metrics_flush() -> None:
+    """Démarre l'écriture périodique des métriques du processus (serve.py uniquement)."""
+    if _multiprocess_dir():
+        threading.Thread(target=_flush_loop, args=(config.METRICS_FLUSH_INTERVAL_SECONDS,),
+                         name="metrics-flush", daemon=True).start()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _merged_snapshots():
+    """Somme des valeurs écrites par tous les workers: ({métrique: valeurs}, {jauge: [description, valeur]})."""
+    merged = {metric.name: {} for metric in REGISTRY}
+    gauges = {}
+    for path in glob.glob(os.path.join(_multiprocess_dir(), "*.json")):
+        try:
+            pid = int(os.path.basename(path)[:-len(".json")])
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (ValueError, OSError):
+            continue
+        alive = _pid_alive(pid)
+        for metric in REGISTRY:
+            if metric.kind == "gauge" and not alive:
+                continue
+            values = merged[metric.name]
+            for key, value in snapshot["metrics"].get(metric.name, []):
+                values[tuple(key)] = metric.merge(values.get(tuple(key)), value)
+        if alive:
+            for name, documentation, value in snapshot["gauges"]:
+                gauges[name] = [documentation, gauges.get(name, [None, 0])[1] + value]
+    return merged, gauges
+
+
+def render_metrics(extra_gauges=None) -> str:
+    """
+    Texte d'exposition Prometheus de toutes les métriques (plus des jauges calculées à la volée):
+    celles du processus, ou la somme de tous les workers sous serve.py.
+    """
+    if _multiprocess_dir():
+        flush_metrics()
+        values, process_gauges = _merged_snapshots()
+        pid_label = {}
+        process_gauges = [(name, documentation, value) for name, (documentation, value) in process_gauges.items()]
+    else:
+        values, pid_label, process_gauges = {}, {"pid": os.getpid()}, _process_gauges()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(pid_label, values.get(metric.name)))
+    for name, documentation, value in (extra_gauges or []) + process_gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_format_labels((), (), pid_label)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Prometheus scrape endpoint
+@metrics.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Métriques au format texte Prometheus.
+
+    Exemple d'utilisation:
+    GET http://localhost:5051/metrics
+    """
+    from routes.general_ledger import cache_manager
+
+    stats = cache_manager.get_cache_stats()
+    extra_gauges = [
+        ("report_cache_entries", "Entries in the report cache", stats["total_entries"]),
+        ("report_cache_size_bytes", "Size of the files referenced by the report cache", stats["total_size_bytes"]),
+    ]
+    return Response(render_metrics(extra_gauges), mimetype="text/plain; version=0.0.4")
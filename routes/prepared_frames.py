@@ -0,0 +1,108 @@
+"""
+Cache des données préparées du Grand Livre (Arrow IPC).
+
+Le chargement des transactions, la jointure avec la balance d'ouverture, les colonnes
+Débit/Crédit et le renommage ne dépendent que de la société, de l'année et des fichiers
+sources. Le résultat sur l'année complète est écrit une fois dans
+cache/prepared/<rapport>_<société>_<année>_<signature>.arrow puis relu en mémoire mappée:
+une autre période ou une autre mise en page ne coûte plus que le rendu du classeur.
+"""
+
+import logging
+import os
+from datetime import datetime
+import polars as pl
+import config
+from routes.arrow_cache import read_arrow, write_arrow
+from routes.customs_functions import load_data, load_initial_balance_mapping_data
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_ledger_frame(df: pl.DataFrame, df_initial_balance: pl.DataFrame) -> pl.DataFrame:
+    """
+    Préparation commune à tous les comptes du Grand Livre: jointure avec la balance d'ouverture,
+    colonnes Débit/Crédit, renommage et conversion des colonnes de saisie.
+    """
+    df_initial_balance_unique = df_initial_balance.unique(("Numéro de compte IFRS"), keep='first', maintain_order=True)
+
+    # Join initial balance to entire dataset ONCE
+    df = df.join(df_initial_balance_unique, left_on=config.offset_account_column_name,
+                 right_on="Numéro de compte IFRS", how="left")
+
+    # Keep SYSCOHADA account number for filtering (add as separate column before dropping)
+    df = df.with_columns(pl.col(config.SYSCOHADA_column_in_main_data).alias("SYSCOHADA_Account"))
+
+    # Create Debit/Credit columns ONCE for entire dataset
+    df = df.with_columns([
+        pl.when(pl.col(config.amount_column) <= 0)
+        .then(pl.col(config.amount_column))
+        .otherwise(0)
+        .alias("Crédit"),
+
+        pl.when(pl.col(config.amount_column) > 0)
+        .then(pl.col(config.amount_column).abs())
+        .otherwise(0)
+        .alias("Débit")
+    ])
+
+    # Remove unwanted columns ONCE (but keep SYSCOHADA_Account for filtering)
+    df = df.drop([config.amount_column, config.SYSCOHADA_column_in_main_data])
+
+    # Rename columns ONCE for entire dataset
+    df = df.rename(config.renamed_columns)
+
+    # Cast Date/Time columns ONCE
+    cast_columns = []
+    if "Date de Saisie" in df.columns:
+        cast_columns.append(pl.col("Date de Saisie").cast(pl.Utf8))
+    if "Heure de Saisie" in df.columns:
+        cast_columns.append(pl.col("Heure de Saisie").cast(pl.Utf8))
+    if cast_columns:
+        df = df.with_columns(cast_columns)
+
+    return df
+
+
+def _build_year_frame(company_code: str, year: str, bnk: bool) -> pl.DataFrame:
+    """Charge et prépare les transactions de l'année complète."""
+    df = load_data(config.transactions_data_folder, config.filter_column, company_code, config.selected_columns,
+                   config.amount_column, f"01/01/{year}", f"31/12/{year}", company_code, year, bank=bnk)
+    if df.is_empty():
+        return df.rename({k: v for k, v in config.renamed_columns.items() if k in df.columns})
+
+    df_initial_balance = load_initial_balance_mapping_data(config.initial_balance_file_path,
+                                                           config.debit_column_label,
+                                                           config.credit_column_label,
+                                                           company_code, year, bank=bnk)
+    return prepare_ledger_frame(df, df_initial_balance)
+
+
+def load_prepared_ledger_frame(company_code: str, year: str, start_date, end_date, bnk: bool = False,
+                               cache_manager=None) -> pl.DataFrame:
+    """
+    Retourne les transactions préparées du Grand Livre pour la période [start_date, end_date].
+    L'année complète est lue depuis le cache Arrow si la signature des fichiers sources n'a pas
+    changé, sinon elle est recalculée puis écrite (écriture atomique, anciennes versions supprimées).
+    """
+    if cache_manager is None:
+        df = _build_year_frame(company_code, year, bnk)
+    else:
+        report_type = config.GRAND_LIVRE_BNK if bnk else config.GRAND_LIVRE_COMPTA_GEN
+        signature = cache_manager.get_data_signature(report_type, company_code, year, bnk=bnk)
+        prefix = os.path.join(config.prepared_frames_folder, f"{report_type}_{company_code}_{year}_")
+        prepared_file = f"{prefix}{signature}.arrow"
+
+        df = read_arrow(prepared_file, "Cache de données préparées")
+        if df is not None:
+            logger.info(f"Données préparées lues depuis {prepared_file}")
+        else:
+            df = _build_year_frame(company_code, year, bnk)
+            write_arrow(df, prepared_file, prefix)
+            logger.info(f"Données préparées écrites dans {prepared_file}")
+
+    if df.is_empty():
+        return df
+    start_date = datetime.strptime(start_date, "%d/%m/%Y")
+    end_date = datetime.strptime(end_date, "%d/%m/%Y")
+    return df.filter((pl.col("Date") >= start_date) & (pl.col("Date") <= end_date))
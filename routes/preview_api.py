@@ -0,0 +1,186 @@
+from flask import Blueprint, request, jsonify
+import calendar
+import config
+import json
+import math
+import uuid
+import logging
+from routes.customs_functions import *
+from routes.aggregations import compute_account_balances, compute_group_totals, compute_category_totals
+from routes.general_ledger import cache_manager
+from routes.metrics import record_cache_result
+
+logger = logging.getLogger(__name__)
+
+preview_api = Blueprint("preview_api", __name__)
+
+# Credit-side figures are returned as absolute values, as displayed in the Balance Générale
+CREDIT_COLUMNS = ["opening_credit", "movement_credit", "cumulative_credit", "balance_credit"]
+
+
+def _parse_preview_params():
+    """Lit et valide les paramètres communs (query string ou formulaire)."""
+    params = request.values
+    company_code = params.get("company_code")
+    year = params.get("year")
+    if not company_code or not year:
+        raise ValueError("company_code and year are required")
+
+    start_month = int(params.get("start_month", 1))
+    end_month = int(params.get("end_month", 12))
+    if not 1 <= start_month <= end_month <= 12:
+        raise ValueError("start_month and end_month must satisfy 1 <= start_month <= end_month <= 12")
+
+    bnk = str(params.get("bnk", "false")).lower() in ("1", "true", "yes")
+    return company_code, str(year), start_month, end_month, bnk
+
+
+def _rows_for_json(df):
+    """Convertit un DataFrame en liste de dicts avec les crédits en valeur absolue."""
+    credit_columns = [col for col in CREDIT_COLUMNS if col in df.columns]
+    if credit_columns:
+        df = df.with_columns([pl.col(col).abs() for col in credit_columns])
+    return df.to_dicts()
+
+
+def _build_preview_payload(company_code, year, start_month, end_month, bnk):
+    """Calcule la balance complète (comptes, groupes, totaux) en un seul passage vectorisé."""
+    start_date = f"01/{start_month:02d}/{year}"
+    end_date = f"{calendar.monthrange(int(year), end_month)[1]}/{end_month:02d}/{year}"
+
+    df = load_data(config.transactions_data_folder, config.filter_column, company_code, config.selected_columns,
+                   config.amount_column, start_date, end_date, company_code, year, bank=bnk)
+    df_initial_balance = load_initial_balance_mapping_data(config.initial_balance_file_path,
+                                                           config.debit_column_label,
+                                                           config.credit_column_label,
+                                                           company_code, year, bank=bnk)
+    mapping = fetch_general_balance_mapping_data()
+
+    balances = compute_account_balances(df, df_initial_balance)
+    category_totals = compute_category_totals(balances)
+    for totals in category_totals.values():
+        for col in CREDIT_COLUMNS:
+            totals[col] = abs(totals[col])
+
+    return {
+        "company_code": company_code,
+        "company_name": config.COMPANY_MAPPING.get(company_code, "Unknown"),
+        "year": year,
+        "start_date": start_date,
+        "end_date": end_date,
+        "accounts": _rows_for_json(balances),
+        "groups_level2": _rows_for_json(compute_group_totals(balances, 2, mapping)),
+        "groups_level1": _rows_for_json(compute_group_totals(balances, 1, mapping)),
+        "totals": category_totals,
+    }
+
+
+def _get_or_build_preview_payload(company_code, year, start_month, end_month, bnk):
+    """
+    Retourne le payload de prévisualisation depuis le cache, ou le calcule et le met en cache.
+    La clé réutilise la signature des fichiers de la Balance Générale.
+    """
+    report_type = config.BALANCE_GEN_BNK if bnk else config.BALANCE_GEN
+    cache_key = cache_manager.get_cache_key(report_type, company_code, year, start_month, end_month, bnk=bnk) + "_preview_json"
+
+    cached_file = cache_manager.get_cache(cache_key)
+    if cached_file:
+        logger.info(f"Cache hit pour {cache_key}")
+        cache_manager.access_cache(cache_key)
+        record_cache_result(f"{report_type}_preview", hit=True)
+        with open(cached_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    logger.info(f"Cache miss pour {cache_key} - calcul en cours...")
+    record_cache_result(f"{report_type}_preview", hit=False)
+    payload = _build_preview_payload(company_code, year, start_month, end_month, bnk)
+
+    output_file = config.output_folder + str(uuid.uuid4()) + '.json'
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+    cache_manager.set_cache(cache_key, output_file)
+
+    return payload
+
+
+# Balance figures for the frontend preview
+@preview_api.route('/api/balance', methods=['GET', 'POST'])
+def balance_preview():
+    """
+    Retourne les chiffres de la Balance Générale en JSON, sans générer de classeur.
+
+    Exemple d'utilisation:
+    GET http://localhost:5051/api/balance?company_code=TG13&year=2024&start_month=1&end_month=12
+    """
+    try:
+        params = _parse_preview_params()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        payload = _get_or_build_preview_payload(*params)
+        accounts = [{k: v for k, v in account.items() if k != "line_count"} for account in payload["accounts"]]
+        return jsonify({
+            "status": "success",
+            "company_code": payload["company_code"],
+            "company_name": payload["company_name"],
+            "start_date": payload["start_date"],
+            "end_date": payload["end_date"],
+            "accounts": accounts,
+            "groups_level2": payload["groups_level2"],
+            "groups_level1": payload["groups_level1"],
+            "totals": payload["totals"],
+        }), 200
+    except Exception as e:
+        logger.error(f"Balance preview failed: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": f"Failed to compute balance: {str(e)}"}), 500
+
+
+# Per-account ledger summaries for the frontend preview
+@preview_api.route('/api/ledger-summary', methods=['GET', 'POST'])
+def ledger_summary_preview():
+    """
+    Retourne, par compte, le nombre de lignes, les totaux débit/crédit et le solde de clôture
+    du Grand Livre, paginés.
+
+    Exemple d'utilisation:
+    GET http://localhost:5051/api/ledger-summary?company_code=TG13&year=2024&page=1&page_size=100
+    """
+    try:
+        params = _parse_preview_params()
+        page = int(request.values.get("page", 1))
+        page_size = int(request.values.get("page_size", 100))
+        if page < 1 or not 1 <= page_size <= 1000:
+            raise ValueError("page must be >= 1 and page_size between 1 and 1000")
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        payload = _get_or_build_preview_payload(*params)
+        accounts = payload["accounts"]
+        total_accounts = len(accounts)
+        page_accounts = accounts[(page - 1) * page_size: page * page_size]
+
+        summaries = [{
+            "account": account["account"],
+            "description": account["description"],
+            "line_count": account["line_count"],
+            "debit": account["movement_debit"],
+            "credit": account["movement_credit"],
+            "closing_balance": account["balance"],
+        } for account in page_accounts]
+
+        return jsonify({
+            "status": "success",
+            "company_code": payload["company_code"],
+            "start_date": payload["start_date"],
+            "end_date": payload["end_date"],
+            "page": page,
+            "page_size": page_size,
+            "total_accounts": total_accounts,
+            "total_pages": math.ceil(total_accounts / page_size),
+            "accounts": summaries,
+        }), 200
+    except Exception as e:
+        logger.error(f"Ledger summary preview failed: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": f"Failed to compute ledger summary: {str(e)}"}), 500
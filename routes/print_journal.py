@@ -2,32 +2,83 @@ from flask import Blueprint, Response, request, send_from_directory
 import polars as pl
 import calendar
 import config
+import io
 import os
+import logging
+import re
 import uuid
+import zipfile
 from datetime import datetime
 from xlsxwriter import Workbook
 from routes.customs_functions import *
+from routes.timing import span
+from routes.profiling import profiled
 
-other_actions = Blueprint("other_actions", __name__)
+logger = logging.getLogger(__name__)
 
-# Generate a document number journal in Excel format
-@other_actions.route('/print_journal', methods=['POST'])
-def print_journal():
+other_actions = Blueprint("other_actions", __name__)
 
-    data = request.form
-    document_number = data.get("document_number")
-    company_code = data.get("company_code")
-    year = str(data.get('year'))
-    sum_debit = 0
-    sum_credit = 0
 
-    output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
-    # Load data file and all gl initial balance
-    df = load_data(config.transactions_data_folder, config.filter_column, company_code, config.selected_columns,
-                   config.amount_column, f"01/01/{year}", f"31/12/{year}", company_code, year, data.get('document_number'))
-    
-    if df.is_empty():
-        return Response(f"Aucune correspondance pour la pièce {document_number}", 500)
+def _get_document_numbers(data):
+    """
+    Récupère la liste des pièces demandées, dans l'ordre et sans doublons.
+    Accepte plusieurs champs 'document_number' et/ou un champ 'document_numbers' séparé par des virgules.
+    """
+    document_numbers = list(data.getlist("document_number"))
+    if data.get("document_numbers"):
+        document_numbers.extend(data.get("document_numbers").split(","))
+
+    return list(dict.fromkeys(number.strip() for number in document_numbers if number and number.strip()))
+
+
+def _unique_names(document_numbers, forbidden: str, strip: str, max_length: int):
+    """
+    Noms dérivés des numéros de pièce: caractères `forbidden` (regex) remplacés par "_", `strip`
+    retirés aux extrémités, max_length caractères au plus, suffixe " (2)", " (3)"... pour les noms
+    identiques après troncature (sans casse).
+    """
+    names, used = [], set()
+    for document_number in document_numbers:
+        base = re.sub(forbidden, "_", document_number).strip(strip)[:max_length] or "Pièce"
+        name, index = base, 1
+        while name.lower() in used:
+            index += 1
+            suffix = f" ({index})"
+            name = base[:max_length - len(suffix)] + suffix
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _sheet_names(document_numbers):
+    """Noms de feuille Excel des pièces: sans []:*?/\\ ni apostrophe aux extrémités, 31 caractères au plus."""
+    return _unique_names(document_numbers, r"[\[\]:*?/\\]", "'", 31)
+
+
+def _archive_names(document_numbers):
+    """
+    Noms des classeurs dans l'archive ZIP: sans séparateur de chemin ni caractère interdit sous
+    Windows, sans point initial (pas de "..": rien ne sort du dossier d'extraction), uniques.
+    """
+    return [f"{name}.xlsx" for name in _unique_names(document_numbers, r'[\\/:*?"<>|\x00-\x1f]', ". ", 100)]
+
+
+def _add_journal_formats(writer):
+    """Crée UNE fois les formats partagés par toutes les fiches d'un classeur."""
+    return {
+        'number': writer.add_format({'num_format': '#,##0_);[Red](#,##0);'}),
+        'merge': writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 11, 'border': 1}),
+        'bold': writer.add_format({'bold': True, 'font_size': 11}),
+        'title': writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 24}),
+        'subtitle': writer.add_format({'font_size': 16}),
+    }
+
+
+def _write_journal_sheet(worksheet, formats, company_code, document_number, df):
+    """Écrit une "Fiche Comptable" pour une pièce dans la feuille donnée."""
+    number_fmt = formats['number']
+    merge_format = formats['merge']
+    format_2 = formats['bold']
 
     company_name = df["Company code Name"].to_list()[0]
     posting_date = df["Posting Date"].to_list()[0]
@@ -36,79 +87,133 @@ def print_journal():
     reference = df["Reference"].to_list()[0]
     journal = df["Désignation"].to_list()[0]
 
-
     start_row = 13
 
-    with Workbook(output_file) as writer:
-        worksheet = writer.add_worksheet()
-
-        # Merge cells and add a title and some header description for both sheets
-        number_fmt = writer.add_format({'num_format': '#,##0_);[Red](#,##0);'})
-        merge_format = writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 11, 'border': 1})
-        format_2 = writer.add_format({'bold': True, 'font_size': 11})
-
-        # Journal Sheet
-        worksheet.merge_range('A1:G1', f"{company_code} - {company_name}", writer.add_format({'bold': True, 'align': 'center', 'valign': 'vcenter', 'font_size': 24}))
-
-        # General Details
-        worksheet.write('D2', f"Fiche Comptable", writer.add_format({'font_size':16}))
-        worksheet.write('F4', f"Numero:", format_2)
-        worksheet.write('F5', f"Date Comptable:", format_2)
-        worksheet.write('F6', "Période:", format_2)
-        worksheet.write('F7', "Reference:", format_2)
-        worksheet.write('F8', "Journal", format_2)
-        
-        worksheet.write('G4', f"{document_number}")
-        worksheet.write('G5', f"{date_comptable}")
-        worksheet.write('G6', period)
-        worksheet.write('G7', reference)
-        worksheet.write('G8', journal)
-
-        # Table Header
-        worksheet.merge_range('A11:B11', "Details Compte Groupe", merge_format)
-        worksheet.write('A12', "Compte Groupe", merge_format)
-        worksheet.write('B12', "Libelle Compte Groupe", merge_format)
-        
-        worksheet.merge_range('C11:D11', "Details Compte OHADA", merge_format)
-        worksheet.write('C12', "Compte OHADA", merge_format)
-        worksheet.write('D12', "Libelle Compte OHADA", merge_format)
-
-        worksheet.write('E11', "Narration/Description", merge_format)
-        worksheet.write('E12', "Narration", merge_format)
-
-        worksheet.merge_range('F11:G11', "Montant en Devise Locale", merge_format)
-        worksheet.write('F12', "Debit", merge_format)
-        worksheet.write('G12', "Credit", merge_format)
-
-        # Table details
-        for row in df.iter_rows(named=True):
-            worksheet.write(f'A{start_row}', row["G/L Account"])
-            worksheet.write(f'B{start_row}', row["G/L Acct Long Text"])
-            worksheet.write(f'C{start_row}', row["Alternative Account No."])
-            worksheet.write(f'D{start_row}', "")
-            worksheet.write(f'E{start_row}', row["Text"])
-            if row["Amount in local currency"] > 0:
-                sum_debit += row["Amount in local currency"]
-                worksheet.write(f'F{start_row}', row["Amount in local currency"], number_fmt)
-            else:
-                sum_credit += row["Amount in local currency"]
-                worksheet.write(f'G{start_row}', abs(row["Amount in local currency"]), number_fmt)
-
-            start_row += 1
-        
-        # Grand Total
-        worksheet.write(f'E{start_row}', "Montant Total", merge_format)
-        worksheet.write(f'F{start_row}', sum_debit, number_fmt)
-        worksheet.write(f'G{start_row}', sum_credit, number_fmt)
-
-        # Footer
-        worksheet.write(f'A{start_row+2}', "Préparé Par:", format_2)
-        worksheet.write(f'A{start_row+3}', "Nom:", format_2)
-        worksheet.write(f'C{start_row+2}', "Vérifié Par:", format_2)
-        worksheet.write(f'C{start_row+3}', "Nom:", format_2)
-        worksheet.write(f'E{start_row+2}', "Autorisé par:", format_2)
-        worksheet.write(f'E{start_row+3}', "Nom:", format_2)
-        worksheet.write(f'G{start_row+2}', "Reçu Par:", format_2)
-        worksheet.write(f'G{start_row+3}', "Nom Société:", format_2)
-
-    return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
\ No newline at end of file
+    # Journal Sheet
+    worksheet.merge_range('A1:G1', f"{company_code} - {company_name}", formats['title'])
+
+    # General Details
+    worksheet.write('D2', f"Fiche Comptable", formats['subtitle'])
+    worksheet.write('F4', f"Numero:", format_2)
+    worksheet.write('F5', f"Date Comptable:", format_2)
+    worksheet.write('F6', "Période:", format_2)
+    worksheet.write('F7', "Reference:", format_2)
+    worksheet.write('F8', "Journal", format_2)
+
+    worksheet.write('G4', f"{document_number}")
+    worksheet.write('G5', f"{date_comptable}")
+    worksheet.write('G6', period)
+    worksheet.write('G7', reference)
+    worksheet.write('G8', journal)
+
+    # Table Header
+    worksheet.merge_range('A11:B11', "Details Compte Groupe", merge_format)
+    worksheet.write('A12', "Compte Groupe", merge_format)
+    worksheet.write('B12', "Libelle Compte Groupe", merge_format)
+
+    worksheet.merge_range('C11:D11', "Details Compte OHADA", merge_format)
+    worksheet.write('C12', "Compte OHADA", merge_format)
+    worksheet.write('D12', "Libelle Compte OHADA", merge_format)
+
+    worksheet.write('E11', "Narration/Description", merge_format)
+    worksheet.write('E12', "Narration", merge_format)
+
+    worksheet.merge_range('F11:G11', "Montant en Devise Locale", merge_format)
+    worksheet.write('F12', "Debit", merge_format)
+    worksheet.write('G12', "Credit", merge_format)
+
+    # Table details, written column by column
+    amount = pl.col("Amount in local currency")
+    amounts = df.select([
+        pl.when(amount > 0).then(amount).otherwise(None).alias("Debit"),
+        pl.when(amount <= 0).then(amount.abs()).otherwise(None).alias("Credit"),
+    ])
+    sum_debit = df.filter(amount > 0)["Amount in local currency"].sum()
+    sum_credit = df.filter(amount <= 0)["Amount in local currency"].sum()
+
+    worksheet.write_column(f'A{start_row}', df["G/L Account"].to_list())
+    worksheet.write_column(f'B{start_row}', df["G/L Acct Long Text"].to_list())
+    worksheet.write_column(f'C{start_row}', df["Alternative Account No."].to_list())
+    worksheet.write_column(f'E{start_row}', df["Text"].to_list())
+    worksheet.write_column(f'F{start_row}', amounts["Debit"].to_list(), number_fmt)
+    worksheet.write_column(f'G{start_row}', amounts["Credit"].to_list(), number_fmt)
+
+    start_row += len(df)
+
+    # Grand Total
+    worksheet.write(f'E{start_row}', "Montant Total", merge_format)
+    worksheet.write(f'F{start_row}', sum_debit, number_fmt)
+    worksheet.write(f'G{start_row}', sum_credit, number_fmt)
+
+    # Footer
+    worksheet.write(f'A{start_row+2}', "Préparé Par:", format_2)
+    worksheet.write(f'A{start_row+3}', "Nom:", format_2)
+    worksheet.write(f'C{start_row+2}', "Vérifié Par:", format_2)
+    worksheet.write(f'C{start_row+3}', "Nom:", format_2)
+    worksheet.write(f'E{start_row+2}', "Autorisé par:", format_2)
+    worksheet.write(f'E{start_row+3}', "Nom:", format_2)
+    worksheet.write(f'G{start_row+2}', "Reçu Par:", format_2)
+    worksheet.write(f'G{start_row+3}', "Nom Société:", format_2)
+
+
+# Generate one or several document number journals in Excel format
+@other_actions.route('/print_journal', methods=['POST'])
+@profiled
+def print_journal():
+    """
+    Génère la "Fiche Comptable" d'une ou plusieurs pièces.
+    Les données de l'année sont chargées UNE seule fois, puis filtrées sur toutes les pièces demandées.
+
+    Paramètres (form):
+    - document_number: répétable, et/ou document_numbers: liste séparée par des virgules
+    - output_format: "xlsx" (une feuille par pièce, défaut) ou "zip" (un classeur par pièce)
+    Une pièce seule garde la feuille par défaut "Sheet1"; avec plusieurs pièces, chaque feuille
+    porte le numéro de sa pièce.
+    """
+    data = request.form
+    document_numbers = _get_document_numbers(data)
+    company_code = data.get("company_code")
+    year = str(data.get('year'))
+    output_format = data.get("output_format", "xlsx").lower()
+
+    if not document_numbers:
+        return Response("Aucune pièce demandée", 400)
+    if output_format not in ("xlsx", "zip"):
+        return Response(f"Format de sortie inconnu: {output_format}", 400)
+
+    # Load data file once for all requested documents
+    df = load_data(config.transactions_data_folder, config.filter_column, company_code, config.selected_columns,
+                   config.amount_column, f"01/01/{year}", f"31/12/{year}", company_code, year,
+                   document_numbers=document_numbers)
+
+    if df.is_empty():
+        return Response(f"Aucune correspondance pour la pièce {', '.join(document_numbers)}", 500)
+
+    vouchers = df.partition_by("Document Number", as_dict=True, maintain_order=True)
+    found_numbers = [number for number in document_numbers if (number,) in vouchers]
+    missing_numbers = [number for number in document_numbers if (number,) not in vouchers]
+    if missing_numbers:
+        logger.warning(f"print_journal: aucune correspondance pour les pièces {missing_numbers}")
+
+    # Render and write the workbook(s), timed as one span of the request record
+    with span("render"):
+        if output_format == "zip":
+            output_file = config.output_folder + str(uuid.uuid4()) + '.zip'
+            with zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for document_number, archive_name in zip(found_numbers, _archive_names(found_numbers)):
+                    buffer = io.BytesIO()
+                    with Workbook(buffer, {'in_memory': True}) as writer:
+                        formats = _add_journal_formats(writer)
+                        worksheet = writer.add_worksheet()
+                        _write_journal_sheet(worksheet, formats, company_code, document_number, vouchers[(document_number,)])
+                    archive.writestr(archive_name, buffer.getvalue())
+        else:
+            output_file = config.output_folder + str(uuid.uuid4()) + '.xlsx'
+            with Workbook(output_file) as writer:
+                formats = _add_journal_formats(writer)
+                sheet_names = _sheet_names(found_numbers) if len(found_numbers) > 1 else [None]
+                for document_number, sheet_name in zip(found_numbers, sheet_names):
+                    worksheet = writer.add_worksheet(sheet_name)
+                    _write_journal_sheet(worksheet, formats, company_code, document_number, vouchers[(document_number,)])
+
+    return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
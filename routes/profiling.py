@@ -0,0 +1,143 @@
+"""
+Profilage à la demande d'une requête de rapport.
+
+Une requête de /redirect-submit ou /print_journal qui envoie le jeton d'administration
+(en-tête X-Profile-Token ou champ de formulaire profile_token, voir PROFILING_ADMIN_TOKEN) est
+exécutée sous cProfile et sous un échantillonneur de piles. Le rapport est alors régénéré même
+s'il est en cache. Deux fichiers sont écrits dans logs/profiles/:
+- <profile_id>.pstats: profil déterministe (python -m pstats, snakeviz...)
+- <profile_id>.collapsed: piles échantillonnées au format "collapsed" (flamegraph.pl, speedscope)
+
+L'identifiant du profil est renvoyé dans l'en-tête X-Profile-Id et ajouté à l'enregistrement de timing.
+Avec GENERATION_EXECUTOR = "process", la génération elle-même est profilée dans le processus worker:
+<profile_id>-worker.pstats / .collapsed (le profil de la requête ne montre alors que l'attente).
+"""
+
+from flask import request, make_response
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import sys
+import threading
+import uuid
+import config
+from routes.timing import annotate_record
+
+logger = logging.getLogger(__name__)
+
+_profiling = contextvars.ContextVar("profiling", default=None)  # identifiant du profil en cours
+
+# cProfile ne supporte qu'un profileur actif à la fois: les requêtes profilées en parallèle
+# n'ont que l'échantillonnage
+_cprofile_lock = threading.Lock()
+
+
+def is_profiling() -> bool:
+    """La requête courante est-elle profilée (le cache de rapports doit alors être ignoré)?"""
+    return _profiling.get() is not None
+
+
+def current_profile_id():
+    """Identifiant du profil de la requête courante (None si elle n'est pas profilée)."""
+    return _profiling.get()
+
+
+def _profiling_requested() -> bool:
+    token = config.PROFILING_ADMIN_TOKEN
+    if not token:
+        return False
+    supplied = request.headers.get("X-Profile-Token") or request.form.get("profile_token")
+    if not supplied:
+        return False
+    if not hmac.compare_digest(str(supplied), str(token)):
+        logger.warning(f"Jeton de profilage invalide sur {request.path}")
+        return False
+    return True
+
+
+class StackSampler:
+    """Échantillonne périodiquement la pile d'un thread et compte les piles identiques."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_block(profile_id: str):
+    """Profile le bloc (cProfile si disponible + échantillonnage) et écrit les fichiers du profil."""
+    os.makedirs(config.profiles_folder, exist_ok=True)
+    sampler = StackSampler(threading.get_ident(), config.PROFILING_SAMPLE_INTERVAL_SECONDS)
+    profiler = cProfile.Profile() if _cprofile_lock.acquire(blocking=False) else None
+    token = _profiling.set(profile_id)
+
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+        sampler.stop()
+        _profiling.reset(token)
+
+        base_path = os.path.join(config.profiles_folder, profile_id)
+        try:
+            if profiler is not None:
+                profiler.dump_stats(f"{base_path}.pstats")
+            sampler.write(f"{base_path}.collapsed")
+            logger.info(f"Profil {profile_id} écrit dans {config.profiles_folder} "
+                        f"({sum(sampler.stacks.values())} échantillons{'' if profiler else ', sans cProfile'})")
+        except OSError as e:
+            logger.error(f"Écriture du profil {profile_id} impossible: {e}")
+
+
+def profiled(view):
+    """Décorateur de route: profile la requête si le jeton d'administration est fourni."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _profiling_requested():
+            return view(*args, **kwargs)
+
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        annotate_record(profile_id=profile_id)
+        with profile_block(profile_id):
+            response = make_response(view(*args, **kwargs))
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+    return wrapper
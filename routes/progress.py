@@ -0,0 +1,56 @@
+"""
+Suivi de progression des générations de rapports.
+
+Les générateurs parcourent leurs comptes avec enumerate_progress() (ou appellent
+report_progress(done, total, stage)); rien n'est remonté hors d'un job asynchrone. Un job installe
+son rapporteur avec progress_reporter(): au plus une remontée par PROGRESS_MIN_INTERVAL_SECONDS, et
+seulement si le pourcentage a changé (le dernier pas est toujours remonté).
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+# Intervalle minimal entre deux remontées de progression (une écriture SQLite par remontée)
+PROGRESS_MIN_INTERVAL_SECONDS = 1
+
+
+@contextmanager
+def progress_reporter(callback):
+    """Installe callback(done, total, stage) comme rapporteur pour le contexte courant."""
+    state = {"last_report": 0.0, "last_percent": None}
+
+    def throttled(done, total, stage):
+        now = time.monotonic()
+        percent = done * 100 // total if total else 100
+        if done >= total or (now - state["last_report"] >= PROGRESS_MIN_INTERVAL_SECONDS
+                             and percent != state["last_percent"]):
+            state["last_report"] = now
+            state["last_percent"] = percent
+            callback(done, total, stage)
+
+    token = _current_reporter.set(throttled)
+    try:
+        yield
+    finally:
+        _current_reporter.reset(token)
+
+
+def report_progress(done: int, total: int, stage: str = None) -> None:
+    """Remonte l'avancement (ex: comptes traités / total) au job en cours, s'il y en a un."""
+    reporter = _current_reporter.get()
+    if reporter is not None:
+        reporter(done, total, stage)
+
+
+def enumerate_progress(items, stage: str = None, total: int = None):
+    """
+    Comme enumerate(items), en remontant index + 1 une fois le corps de boucle terminé pour l'élément
+    (y compris après un continue). total: len(items) par défaut.
+    """
+    total = len(items) if total is None else total
+    for index, item in enumerate(items):
+        yield index, item
+        report_progress(index + 1, total, stage)
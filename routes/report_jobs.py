@@ -0,0 +1,292 @@
+from flask import Blueprint, request, jsonify, send_from_directory, current_app
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import config
+import os
+import json
+import sqlite3
+import socket
+import threading
+import uuid
+import logging
+from routes.general_ledger import (cache_manager, STATIC_REPORTS, REPORT_GENERATORS, _prepare_report_data,
+                                   _get_report_cache_key, _get_or_generate_report)
+from routes.progress import progress_reporter
+from routes.timing import timing_record
+
+logger = logging.getLogger(__name__)
+
+report_jobs = Blueprint("report_jobs", __name__)
+
+
+class JobStore:
+    """
+    État des jobs de génération dans une base SQLite (mode WAL) du dossier cache:
+    visible par tous les processus, quel que soit celui qui exécute le job.
+    """
+
+    def __init__(self, db_file: str = os.path.join(config.cache_folder, "report_jobs.db")):
+        self.db_file = db_file
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+        self._get_connection().execute("""
+            CREATE TABLE IF NOT EXISTS report_jobs (
+                job_id TEXT PRIMARY KEY,
+                report_type TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                owner TEXT,
+                cache_key TEXT,
+                file_path TEXT,
+                progress_done INTEGER,
+                progress_total INTEGER,
+                progress_stage TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Retourne la connexion SQLite du thread courant (recréée après un fork)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def create(self, report_type: str, params: dict, status: str = "queued", file_path: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        self._get_connection().execute(
+            """
+            INSERT INTO report_jobs (job_id, report_type, params, status, owner, file_path, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (job_id, report_type, json.dumps(params), status, f"{socket.gethostname()}:{os.getpid()}", file_path, now, now)
+        )
+        return job_id
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self._get_connection().execute(
+            f"UPDATE report_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id)
+        )
+
+    def complete(self, job_id: str, file_path: str) -> None:
+        """Marque un job terminé (progression à 100%)."""
+        self._get_connection().execute(
+            """
+            UPDATE report_jobs SET status = 'done', file_path = ?, progress_done = progress_total, updated_at = ?
+            WHERE job_id = ?
+            """,
+            (file_path, datetime.now().isoformat(), job_id)
+        )
+
+    def get(self, job_id: str):
+        return self._get_connection().execute("SELECT * FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+    def purge(self, retention_hours: int) -> None:
+        """Supprime l'historique des jobs terminés plus anciens que retention_hours."""
+        cutoff = (datetime.now() - timedelta(hours=retention_hours)).isoformat()
+        self._get_connection().execute(
+            "DELETE FROM report_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+        )
+
+
+job_store = JobStore()
+_executor = ThreadPoolExecutor(max_workers=config.REPORT_JOB_WORKERS, thread_name_prefix="report-job")
+_pending_jobs = set()  # futures des jobs soumis et pas encore terminés
+_pending_lock = threading.Lock()
+_accepting_jobs = True
+
+
+def _submit(app, job_id, data) -> None:
+    future = _executor.submit(_run_job, app, job_id, data)
+    with _pending_lock:
+        _pending_jobs.add(future)
+    future.add_done_callback(_discard_pending)
+
+
+def _discard_pending(future) -> None:
+    with _pending_lock:
+        _pending_jobs.discard(future)
+
+
+def shutdown_jobs(timeout: float) -> bool:
+    """
+    Arrêt propre du processus (serve.py): refuse les nouveaux jobs puis attend au plus `timeout`
+    secondes la fin des jobs en file ou en cours. Retourne False s'il en reste.
+    """
+    global _accepting_jobs
+    _accepting_jobs = False
+    _executor.shutdown(wait=False)
+    with _pending_lock:
+        pending = set(_pending_jobs)
+    _, not_done = wait(pending, timeout=timeout)
+    return not not_done
+
+
+def _is_owner_alive(owner: str) -> bool:
+    """Le processus qui exécute le job existe-t-il encore (vérifiable seulement sur le même hôte)?"""
+    host, pid = owner.rsplit(":", 1)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        pass
+    return True
+
+
+def _run_job(app, job_id, data):
+    """Exécute un job dans un thread du pool: mêmes générateurs et même cache que /redirect-submit."""
+    report_type = data.get("report_type")
+    generate_func, bp_type, bnk = REPORT_GENERATORS[report_type]
+
+    def on_progress(done, total, stage):
+        job_store.update(job_id, progress_done=done, progress_total=total, progress_stage=stage)
+
+    try:
+        cache_key = _get_report_cache_key(data, report_type, data.get("company_code"), data.get("year"), bnk, bp_type)
+        job_store.update(job_id, status="running", cache_key=cache_key)
+
+        # Les générateurs renvoient send_from_directory: il leur faut un contexte de requête
+        with app.test_request_context(), progress_reporter(on_progress), \
+                timing_record(job_id, path="job", report_type=report_type, company_code=data.get("company_code"),
+                              year=data.get("year"), start_month=data.get("start_month"), end_month=data.get("end_month")):
+            response, _ = _get_or_generate_report(data, generate_func, report_type, data.get("company_code"),
+                                                  data.get("year"), bnk=bnk, bp_type=bp_type, cache_key=cache_key,
+                                                  background=True)
+            response.close()
+
+        file_path = cache_manager.get_cache(cache_key)
+        if not file_path:
+            raise RuntimeError(f"Rapport généré mais introuvable dans le cache ({cache_key})")
+        job_store.complete(job_id, file_path)
+        logger.info(f"Job {job_id} terminé: {file_path}")
+    except Exception as e:
+        logger.error(f"Job {job_id} ({report_type}) en échec: {e}", exc_info=True)
+        job_store.update(job_id, status="failed", error=str(e))
+
+
+def _job_payload(job):
+    """Représentation JSON d'un job."""
+    payload = {
+        "job_id": job["job_id"],
+        "report_type": job["report_type"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "progress": None,
+    }
+    if job["progress_total"]:
+        payload["progress"] = {
+            "done": job["progress_done"],
+            "total": job["progress_total"],
+            "stage": job["progress_stage"],
+            "percent": round(100 * job["progress_done"] / job["progress_total"], 1),
+        }
+    if job["status"] == "done":
+        payload["download_url"] = f"/jobs/{job['job_id']}/download"
+    if job["error"]:
+        payload["error"] = job["error"]
+    return payload
+
+
+# Submit a report generation without waiting for it
+@report_jobs.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Soumet la génération d'un rapport et retourne immédiatement un identifiant de job.
+    Mêmes paramètres (form) que /redirect-submit.
+
+    Exemple d'utilisation:
+    POST http://localhost:5051/jobs  (report_type=gl_compta_gen, company_code=TG13, year=2024, ...)
+    """
+    data = _prepare_report_data(request.form)
+    report_type = data.get("report_type")
+    company_code = data.get("company_code")
+    year = data.get("year")
+
+    if report_type not in REPORT_GENERATORS:
+        return jsonify({"status": "error", "message": f"Unknown report_type: {report_type}"}), 404
+    if not _accepting_jobs:
+        return (jsonify({"status": "error", "message": "Server is restarting, please resubmit"}), 503,
+                {"Retry-After": str(config.GENERATION_RETRY_AFTER_SECONDS)})
+
+    job_store.purge(config.REPORT_JOB_RETENTION_HOURS)
+
+    # Rapports statiques et rapports déjà en cache: job terminé d'emblée
+    static_report = STATIC_REPORTS.get((company_code, report_type, year))
+    if static_report:
+        job_id = job_store.create(report_type, data, status="done", file_path=static_report)
+        return jsonify(_job_payload(job_store.get(job_id))), 200
+
+    generate_func, bp_type, bnk = REPORT_GENERATORS[report_type]
+    cache_key = _get_report_cache_key(data, report_type, company_code, year, bnk, bp_type)
+    cached_file = cache_manager.get_cache(cache_key)
+    if cached_file:
+        cache_manager.record_request(cache_key)
+        cache_manager.access_cache(cache_key)
+        job_id = job_store.create(report_type, data, status="done", file_path=cached_file)
+        job_store.update(job_id, cache_key=cache_key)
+        return jsonify(_job_payload(job_store.get(job_id))), 200
+
+    job_id = job_store.create(report_type, data)
+    _submit(current_app._get_current_object(), job_id, data)
+    logger.info(f"Job {job_id} soumis pour {cache_key}")
+
+    payload = _job_payload(job_store.get(job_id))
+    payload["status_url"] = f"/jobs/{job_id}"
+    return jsonify(payload), 202
+
+
+# Job status and progress
+@report_jobs.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Retourne l'état d'un job (queued, running, done, failed) et sa progression.
+
+    Exemple d'utilisation:
+    GET http://localhost:5051/jobs/<job_id>
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+
+    if job["status"] in ("queued", "running") and not _is_owner_alive(job["owner"]):
+        job_store.update(job_id, status="failed", error="Le processus qui exécutait le job s'est arrêté")
+        job = job_store.get(job_id)
+
+    return jsonify(_job_payload(job)), 200
+
+
+# Download the report produced by a job
+@report_jobs.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    """
+    Télécharge le rapport d'un job terminé.
+
+    Exemple d'utilisation:
+    GET http://localhost:5051/jobs/<job_id>/download
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    if job["status"] != "done":
+        return jsonify(_job_payload(job)), 409
+    if not job["file_path"] or not os.path.exists(job["file_path"]):
+        return jsonify({"status": "error", "message": "Report file is no longer available, please resubmit"}), 410
+
+    if job["cache_key"]:
+        cache_manager.access_cache(job["cache_key"])
+    return send_from_directory(directory=os.getcwd(), path=job["file_path"], as_attachment=True), 200
@@ -0,0 +1,164 @@
+"""
+Mesure des étapes de chaque requête (spans).
+
+Chaque requête HTTP (et chaque job asynchrone) ouvre un enregistrement de timing: identifiant de
+requête, société, type de rapport, période et durée cumulée de chaque span. À la fin de la requête,
+l'enregistrement est écrit en JSON (une ligne par requête) dans logs/timings.jsonl et renvoyé dans
+l'en-tête X-Report-Timing si TIMING_DEBUG_HEADER est actif ou si la requête envoie X-Debug-Timing: 1.
+
+Utilisation:
+    with span("render"):
+        ...
+
+    @timed("load_data")
+    def load_data(...):
+        ...
+"""
+
+from flask import g, request
+from contextlib import contextmanager
+from functools import wraps
+import contextvars
+import json
+import logging
+import time
+import uuid
+import config
+
+# Logger dédié (handler JSON lines configuré dans logging_config.setup_logging)
+timing_logger = logging.getLogger("report_timings")
+
+_current_record = contextvars.ContextVar("timing_record", default=None)
+
+
+@contextmanager
+def timing_record(request_id: str = None, **fields):
+    """
+    Ouvre un enregistrement de timing pour le contexte courant et l'écrit à la sortie.
+    Les spans mesurés pendant ce temps y sont cumulés.
+    """
+    record = {"request_id": request_id or uuid.uuid4().hex, **fields, "spans": {}}
+    start = time.perf_counter()
+    token = _current_record.set(record)
+    try:
+        yield record
+    finally:
+        _current_record.reset(token)
+        finish_record(record, start)
+
+
+def finish_record(record: dict, start: float) -> None:
+    record["total_seconds"] = round(time.perf_counter() - start, 4)
+    timing_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Ajoute une durée au span `name` de l'enregistrement courant (sans effet hors requête)."""
+    record = _current_record.get()
+    if record is None:
+        return
+    spans = record["spans"]
+    entry = spans.setdefault(name, {"seconds": 0.0, "count": 0})
+    entry["seconds"] = round(entry["seconds"] + seconds, 4)
+    entry["count"] += 1
+
+
+@contextmanager
+def collect_record():
+    """Enregistrement local, non écrit dans le log (ex: génération dans un processus worker)."""
+    record = {"spans": {}}
+    token = _current_record.set(record)
+    try:
+        yield record
+    finally:
+        _current_record.reset(token)
+
+
+def merge_record(child: dict, section: str = "worker") -> None:
+    """Ajoute les spans d'un enregistrement collecté ailleurs à l'enregistrement courant; ses autres champs vont dans `section`."""
+    record = _current_record.get()
+    if record is None:
+        return
+    for name, entry in child.get("spans", {}).items():
+        current = record["spans"].setdefault(name, {"seconds": 0.0, "count": 0})
+        current["seconds"] = round(current["seconds"] + entry["seconds"], 4)
+        current["count"] += entry["count"]
+    details = {key: value for key, value in child.items() if key != "spans"}
+    if details:
+        record.setdefault(section, {}).update(details)
+
+
+def annotate_record(**fields) -> None:
+    """Ajoute des champs à l'enregistrement courant (sans effet hors requête)."""
+    record = _current_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+def record_detail(section: str, name: str, value) -> None:
+    """Ajoute une valeur nommée à une section de l'enregistrement courant (ex: "memory")."""
+    record = _current_record.get()
+    if record is not None:
+        record.setdefault(section, {})[name] = value
+
+
+@contextmanager
+def span(name: str):
+    """Mesure le bloc et l'ajoute au span `name` de la requête courante."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def timed(name: str = None):
+    """Décorateur: mesure chaque appel de la fonction comme un span."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _request_fields():
+    """Champs d'identification d'une requête de rapport (paramètres du formulaire ou de la query string)."""
+    values = request.values
+    fields = {"method": request.method, "path": request.path}
+    for name in ["report_type", "company_code", "year", "start_month", "end_month", "layout_type"]:
+        if values.get(name):
+            fields[name] = values.get(name)
+    return fields
+
+
+def init_request_timing(app) -> None:
+    """Installe les hooks Flask qui ouvrent et ferment l'enregistrement de chaque requête."""
+
+    @app.before_request
+    def _start_request_timing():
+        record = {"request_id": request.headers.get("X-Request-Id") or uuid.uuid4().hex,
+                  **_request_fields(), "spans": {}}
+        g.timing_start = time.perf_counter()
+        g.timing_record = record
+        g.timing_token = _current_record.set(record)
+
+    @app.after_request
+    def _finish_request_timing(response):
+        record = g.pop("timing_record", None)
+        if record is None:
+            return response
+        _current_record.reset(g.pop("timing_token"))
+        record["status"] = response.status_code
+        finish_record(record, g.pop("timing_start"))
+
+        response.headers["X-Request-Id"] = record["request_id"]
+        if config.TIMING_DEBUG_HEADER or request.headers.get("X-Debug-Timing") == "1":
+            response.headers["X-Report-Timing"] = json.dumps(
+                {"total_seconds": record["total_seconds"],
+                 "spans": {name: entry["seconds"] for name, entry in record["spans"].items()}},
+                ensure_ascii=True, separators=(",", ":"))
+        return response
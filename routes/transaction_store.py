@@ -0,0 +1,64 @@
+"""
+Stock partagé des transactions d'une société-année (Arrow IPC non compressé, mémoire mappée).
+
+La lecture des classeurs Excel d'un dossier de transactions (colonnes, types, tri) ne dépend ni de
+la période ni du rapport: elle est faite une fois puis écrite dans
+cache/transactions/<dossier>_<variante>_<société>_<année>_<signature>.arrow. Chaque processus
+relit ce fichier en mémoire mappée: les workers partagent une seule copie dans le cache de pages
+du système, et un worker qui vient de démarrer ne relit pas les classeurs Excel.
+La signature couvre les fichiers sources et la variante de lecture (colonnes...): elle change dès
+qu'un fichier change, les anciennes versions sont supprimées. Les signatures des fichiers sont
+celles, mémorisées, des clés de cache (CacheManager.get_directory_signature): un accès au stock
+ne relit pas le dossier pendant la fenêtre de revalidation.
+"""
+
+import glob
+import hashlib
+import logging
+import os
+import re
+import polars as pl
+import config
+from routes.arrow_cache import read_arrow, write_arrow
+
+logger = logging.getLogger(__name__)
+
+
+def _files_and_signature(directory: str, variant: str):
+    """Fichiers du dossier et signature de la version du stock, via les signatures mémorisées du cache."""
+    from routes.general_ledger import cache_manager  # import différé: general_ledger importe les générateurs
+
+    files, signature = cache_manager.get_directory_signature(directory)
+    return files, hashlib.md5(f"{variant}|{signature}".encode()).hexdigest()
+
+
+def load_year_transactions(folder_path: str, company_code, year, build, variant: str = "") -> pl.DataFrame:
+    """
+    Transactions de l'année lues depuis le stock partagé, ou construites par build(files) à partir des
+    fichiers <folder_path><société>/<année>/* puis écrites dans le stock (écriture atomique).
+    """
+    if not config.TRANSACTION_STORE_ENABLED:
+        return build(glob.glob(folder_path + company_code + "/" + year + "/*"))
+
+    files, signature = _files_and_signature(os.path.join(folder_path, company_code, year), variant)
+    if not files:
+        return build(files)
+    folder_name = re.sub(r"\W+", "_", folder_path).strip("_")
+    variant_name = hashlib.md5(variant.encode()).hexdigest()[:8]
+    prefix = os.path.join(config.transaction_store_folder, f"{folder_name}_{variant_name}_{company_code}_{year}_")
+    store_file = f"{prefix}{signature}.arrow"
+
+    df = read_arrow(store_file, "Stock de transactions")
+    if df is not None:
+        logger.info(f"Transactions lues depuis {store_file}")
+        return df
+
+    df = build(files)
+    try:
+        write_arrow(df, store_file, prefix)
+        logger.info(f"Transactions écrites dans {store_file}")
+    except OSError as e:
+        logger.warning(f"Écriture du stock de transactions impossible ({store_file}): {e}")
+        return df
+    # Relire en mémoire mappée: la copie construite ici est libérée au profit du cache de pages partagé
+    return pl.read_ipc(store_file, memory_map=True)
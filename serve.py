@@ -0,0 +1,230 @@
+"""
+Serveur de production: plusieurs processus waitress derrière une seule socket d'écoute.
+
+    python serve.py [--workers 4] [--threads 4] [--host 0.0.0.0] [--port 5051]
+
+Le superviseur ouvre la socket puis forke les workers avant d'importer l'application: polars et
+ses threads ne sont initialisés que dans les workers. Chaque worker sert l'application avec
+waitress sur la socket partagée; le noyau répartit les connexions entre ceux qui acceptent.
+L'état partagé est sur disque et sûr entre processus: cache de rapports, métadonnées et verrous de
+génération (SQLite WAL), jobs (SQLite), données préparées (écriture puis os.replace). Les limites
+de ressources valent pour la machine entière: places d'admission communes (routes.admission),
+pool polars de chaque worker dimensionné selon le nombre de workers (routes.cpu_scheduler). Seul
+le premier worker préchauffe le cache; /metrics renvoie la somme des valeurs de tous les workers
+(dossier partagé cache/metrics/, routes.metrics). Les workers écrivent dans les mêmes fichiers
+logs/*.log et logs/timings.jsonl, en ajout et sans rotation interne: la rotation est externe
+(logrotate sans copytruncate, voir logging_config).
+
+Signaux du superviseur:
+    SIGTERM / SIGINT  arrêt propre: les workers finissent leurs requêtes, jobs asynchrones (/jobs, plus
+                      aucun accepté) et préchauffage en cours, puis sortent
+    SIGHUP            redémarrage progressif: nouveaux workers démarrés, anciens arrêtés proprement
+Un worker qui a terminé SERVE_WORKER_MAX_GENERATIONS générations est recyclé de la même façon
+(pour rendre au système la mémoire fragmentée); le superviseur le remplace dès sa sortie.
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import signal
+import socket
+import sys
+import threading
+import time
+import config
+
+logger = logging.getLogger("serve")
+
+RESPAWN_DELAY_SECONDS = 1  # délai avant de remplacer un worker sorti juste après son démarrage
+
+
+def _server_busy(server) -> bool:
+    """Requêtes en cours, en attente ou réponses pas encore envoyées dans ce worker."""
+    dispatcher = server.task_dispatcher
+    if dispatcher.queue or dispatcher.active_count > 0:
+        return True
+    return any(channel.requests or channel.total_outbufs_len for channel in list(server.active_channels.values()))
+
+
+def polars_threads_per_worker(workers: int) -> int:
+    """Pool polars d'un worker en mode "thread": les cœurs partagés entre les workers pouvant générer."""
+    concurrency = min(workers, config.MAX_CONCURRENT_GENERATIONS) if config.MAX_CONCURRENT_GENERATIONS else workers
+    return max(1, (os.cpu_count() or 1) // max(1, concurrency))
+
+
+def run_worker(listener: socket.socket, threads: int, max_generations, graceful_timeout: float) -> None:
+    """Boucle d'un worker: sert l'application jusqu'à SIGTERM ou recyclage, puis vide ses requêtes."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C: c'est le superviseur qui décide
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    for handler in logging.root.handlers[:]:
+        logging.root.removeHandler(handler)  # app.py configure le logging du worker
+
+    from waitress.server import create_server
+    from app import app
+    from routes.cache_warmer import stop_cache_warmer
+    from routes.metrics import flush_metrics, generations_completed, generations_in_flight
+    from routes.report_jobs import shutdown_jobs
+
+    server = create_server(app, sockets=[listener], threads=threads)
+
+    def drain():
+        while not stop.wait(1):
+            if max_generations and generations_completed() >= max_generations:
+                logger.info(f"Worker {os.getpid()}: {max_generations} générations, recyclage")
+                break
+        server.trigger.pull_trigger(lambda: setattr(server, "accepting", False))
+        deadline = time.monotonic() + graceful_timeout
+        while time.monotonic() < deadline and _server_busy(server):
+            time.sleep(0.5)
+        # Générations hors requêtes HTTP: jobs asynchrones (plus de nouveau job) et préchauffage
+        jobs_done = shutdown_jobs(max(0.0, deadline - time.monotonic()))
+        warmer_done = stop_cache_warmer(max(0.0, deadline - time.monotonic()))
+        while time.monotonic() < deadline and generations_in_flight():
+            time.sleep(0.5)
+        if _server_busy(server) or not jobs_done or not warmer_done or generations_in_flight():
+            logger.warning(f"Worker {os.getpid()}: requêtes, jobs ou générations encore en cours après "
+                           f"{graceful_timeout}s, arrêt forcé")
+        try:
+            flush_metrics()  # les compteurs du worker restent dans la somme après sa sortie
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()}: écriture des métriques impossible: {e}")
+        logging.shutdown()
+        os._exit(0)
+
+    threading.Thread(target=drain, name="worker-drain", daemon=True).start()
+    logger.info(f"Worker {os.getpid()} prêt ({threads} threads)")
+    server.run()
+
+
+class Supervisor:
+    """Démarre, remplace et arrête les workers."""
+
+    def __init__(self, listener: socket.socket, workers: int, threads: int, max_generations, graceful_timeout: float):
+        self.listener = listener
+        self.workers = workers
+        self.threads = threads
+        self.max_generations = max_generations
+        self.graceful_timeout = graceful_timeout
+        self.children = {}  # pid -> (heure de démarrage, rang du worker)
+        self.retiring = set()  # workers en cours d'arrêt, à ne pas remplacer
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn(self, rank: int) -> None:
+        """Démarre un worker; celui de rang 0 est le seul à préchauffer le cache."""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.environ["REPORT_CACHE_WARMER"] = "1" if rank == 0 else "0"
+                run_worker(self.listener, self.threads, self.max_generations, self.graceful_timeout)
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} arrêté sur erreur")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = (time.monotonic(), rank)
+
+    def retire(self, pids) -> None:
+        for pid in pids:
+            self.retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self) -> None:
+        """Récupère les workers sortis et remplace ceux qui ne devaient pas s'arrêter."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            started, rank = child
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code:
+                logger.warning(f"Worker {pid} sorti avec le code {code}")
+            if not self.stopping:
+                if time.monotonic() - started < RESPAWN_DELAY_SECONDS:
+                    time.sleep(RESPAWN_DELAY_SECONDS)
+                self.spawn(rank)
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        for rank in range(self.workers):
+            self.spawn(rank)
+        logger.info(f"Superviseur {os.getpid()}: {self.workers} workers sur {self.listener.getsockname()}")
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                previous = [pid for pid in self.children if pid not in self.retiring]
+                logger.info(f"Redémarrage progressif de {len(previous)} worker(s)")
+                for rank in range(self.workers):
+                    self.spawn(rank)
+                self.retire(previous)
+            self.reap()
+            time.sleep(0.5)
+
+        logger.info("Arrêt: les workers terminent leurs requêtes en cours")
+        self.retire(list(self.children))
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.2)
+        for pid in list(self.children):
+            logger.warning(f"Worker {pid} toujours actif, SIGKILL")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.listener.close()
+
+    def _handle_stop(self, *_):
+        self.stopping = True
+
+    def _handle_reload(self, *_):
+        self.reload_requested = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de production multi-processus (waitress)")
+    parser.add_argument("--host", default=config.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=config.SERVE_THREADS)
+    parser.add_argument("--max-generations", type=int, default=config.SERVE_WORKER_MAX_GENERATIONS,
+                        help="Recycler un worker après ce nombre de générations (0: jamais)")
+    parser.add_argument("--graceful-timeout", type=float, default=config.SERVE_GRACEFUL_TIMEOUT_SECONDS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        stream=sys.stderr)
+    # Réglages hérités par les workers (lus par routes.metrics et routes.cpu_scheduler)
+    metrics_dir = os.path.abspath(os.path.join(config.cache_folder, "metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ["REPORT_METRICS_DIR"] = metrics_dir
+    os.environ["REPORT_SERVE_WORKERS"] = str(args.workers)
+    if config.GENERATION_EXECUTOR != "process":
+        os.environ.setdefault("POLARS_MAX_THREADS", str(polars_threads_per_worker(args.workers)))
+
+    listener = socket.create_server((args.host, args.port), backlog=2048)
+    Supervisor(listener, args.workers, args.threads, args.max_generations or None, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Les modules de l'application lisent leurs données (Data/, cache/, output/, logs/) depuis le dossier
+courant: les tests tournent dans un petit jeu de données synthétique (benchmarks.synthetic_data)
+créé une fois par session, jamais dans le dépôt.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DATASET = {"rows": 2_000, "accounts": 30, "bps": 25, "months": 12, "files": 2}
+COMPANY_CODE = "TG13"
+YEAR = "2024"
+
+
+def pytest_configure(config):
+    os.chdir(REPO_ROOT)  # config lit bnk_gls.txt à l'import
+    import config as app_config
+    from benchmarks.synthetic_data import generate_dataset
+
+    app_config.CACHE_WARMING_ENABLED = False  # pas de générations de fond pendant les tests
+    root = tempfile.mkdtemp(prefix="ohada-tests-")
+    generate_dataset(root, "small", **DATASET)
+    os.chdir(root)
+    config._dataset_root = root
+
+
+def pytest_unconfigure(config):
+    root = getattr(config, "_dataset_root", None)
+    if root:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app as flask_app
+    flask_app.config["TESTING"] = True
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def report_params():
+    return {"company_code": COMPANY_CODE, "year": YEAR, "start_month": "1", "end_month": "12"}
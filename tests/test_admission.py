@@ -0,0 +1,193 @@
+import threading
+import time
+import pytest
+from routes.admission import AdmissionController, GenerationRejected, HostSlots
+
+
+class Generation(threading.Thread):
+    """Génération simulée: entre dans admit() puis garde sa place jusqu'à finish()."""
+
+    def __init__(self, controller, report_type, order=None, **admit_options):
+        super().__init__(daemon=True)
+        self.controller, self.report_type, self.order = controller, report_type, order
+        self.admit_options = admit_options
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            with self.controller.admit(self.report_type, **self.admit_options):
+                if self.order is not None:
+                    self.order.append(self.report_type)
+                self.started.set()
+                self.release.wait(10)
+        except GenerationRejected as e:
+            self.error = e
+
+    def finish(self):
+        self.release.set()
+        self.join(10)
+
+
+def _queued(controller):
+    snapshot = controller.snapshot()
+    return sum(snapshot["queued"].values()) + snapshot["low_priority_queued"]
+
+
+def _start(controller, report_type, order=None, **admit_options):
+    """Démarre une génération et attend qu'elle tourne ou soit en file."""
+    queued_before = _queued(controller)
+    generation = Generation(controller, report_type, order, **admit_options)
+    generation.start()
+    deadline = time.monotonic() + 5
+    while not generation.started.is_set() and _queued(controller) == queued_before and generation.is_alive():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    return generation
+
+
+def _wait_started(*generations):
+    for generation in generations:
+        assert generation.started.wait(5)
+
+
+def test_running_generations_are_bounded():
+    controller = AdmissionController(max_concurrent=2, max_queued=10)
+    generations = [_start(controller, "gl_compta_gen") for _ in range(4)]
+
+    assert [g.started.is_set() for g in generations] == [True, True, False, False]
+    assert controller.snapshot() == {"running": 2, "queued": {"gl_compta_gen": 2}, "low_priority_queued": 0}
+
+    generations[0].finish()
+    _wait_started(generations[2])
+    assert not generations[3].started.is_set()
+    for generation in generations[1:]:
+        generation.finish()
+    assert controller.snapshot()["running"] == 0
+
+
+def test_full_queue_rejects_immediately():
+    controller = AdmissionController(max_concurrent=1, max_queued=1)
+    running, waiting = _start(controller, "gl_compta_gen"), _start(controller, "gl_compta_gen")
+
+    start = time.monotonic()
+    with pytest.raises(GenerationRejected) as rejected:
+        with controller.admit("bal_gen"):
+            pass
+    assert time.monotonic() - start < 1 and rejected.value.retry_after > 0
+
+    running.finish()
+    _wait_started(waiting)
+    waiting.finish()
+
+
+def test_queue_timeout_rejects_and_leaves_the_queue():
+    controller = AdmissionController(max_concurrent=1, max_queued=5, queue_timeout=0.1)
+    running = _start(controller, "gl_compta_gen")
+
+    with pytest.raises(GenerationRejected):
+        with controller.admit("bal_gen"):
+            pass
+    assert controller.snapshot()["queued"] == {}
+
+    running.finish()
+    with controller.admit("bal_gen"):
+        assert controller.snapshot()["running"] == 1
+
+
+def test_report_types_are_served_in_turn():
+    controller = AdmissionController(max_concurrent=1, max_queued=10)
+    order = []
+    running = _start(controller, "gl_compta_gen", order)
+    waiting = [_start(controller, report_type, order)
+               for report_type in ["gl_compta_gen", "gl_compta_gen", "gl_compta_gen", "bal_gen"]]
+
+    running.finish()
+    deadline = time.monotonic() + 5
+    while any(generation.is_alive() for generation in waiting):
+        assert time.monotonic() < deadline
+        for generation in waiting:
+            if generation.started.is_set():
+                generation.finish()  # une seule place: la suivante démarre ensuite
+        time.sleep(0.005)
+
+    assert order == ["gl_compta_gen", "gl_compta_gen", "bal_gen", "gl_compta_gen", "gl_compta_gen"]
+
+
+def test_background_generations_wait_instead_of_being_rejected():
+    controller = AdmissionController(max_concurrent=1, max_queued=0, queue_timeout=0.05)
+    running = _start(controller, "gl_compta_gen")
+    background = _start(controller, "gl_compta_gen", background=True)
+    time.sleep(0.2)
+    assert background.is_alive() and background.error is None
+
+    running.finish()
+    _wait_started(background)
+    background.finish()
+
+
+def test_low_priority_runs_after_every_user_generation():
+    controller = AdmissionController(max_concurrent=1, max_queued=10)
+    order = []
+    running = _start(controller, "gl_compta_gen", order)
+    warming = _start(controller, "warm", order, low_priority=True)
+    user = _start(controller, "bal_gen", order)
+
+    running.finish()
+    _wait_started(user)
+    assert not warming.started.is_set()
+    user.finish()
+    _wait_started(warming)
+    warming.finish()
+    assert order == ["gl_compta_gen", "bal_gen", "warm"]
+
+
+def test_low_priority_holds_one_slot_and_is_outside_queue_depth():
+    controller = AdmissionController(max_concurrent=2, max_queued=1)
+    first_warming = _start(controller, "warm", low_priority=True)
+    second_warming = _start(controller, "warm", low_priority=True)
+    assert first_warming.started.is_set() and not second_warming.started.is_set()  # une place libre reste
+
+    # La génération basse priorité en attente ne compte pas dans GENERATION_QUEUE_DEPTH
+    running, waiting = _start(controller, "bal_gen"), _start(controller, "bal_gen")
+    assert running.started.is_set() and waiting.error is None
+    with pytest.raises(GenerationRejected):
+        with controller.admit("bal_gen"):
+            pass
+
+    # Place libérée par le préchauffage: la requête utilisateur en file passe avant le second préchauffage
+    first_warming.finish()
+    _wait_started(waiting)
+    assert not second_warming.started.is_set()
+    running.finish()
+    _wait_started(second_warming)
+    for generation in (waiting, second_warming):
+        generation.finish()
+    assert controller.snapshot() == {"running": 0, "queued": {}, "low_priority_queued": 0}
+
+
+def test_host_slots_are_shared_through_lock_files(tmp_path):
+    slots = HostSlots(str(tmp_path), count=2, poll_seconds=0.01)
+    first = slots.acquire(timeout=0)
+    second = slots.acquire(timeout=0)
+    assert first and second
+    assert slots.acquire(timeout=0.05) is None
+
+    slots.release(first)
+    third = slots.acquire(timeout=0)
+    assert third
+    slots.release(second)
+    slots.release(third)
+
+
+def test_single_low_priority_host_slot(tmp_path):
+    slots = HostSlots(str(tmp_path), count=2, poll_seconds=0.01)
+    warming = slots.acquire(timeout=0, low_priority=True)
+    assert warming and len(warming) == 2
+    assert slots.acquire(timeout=0.05, low_priority=True) is None
+
+    user = slots.acquire(timeout=0)
+    assert user
+    slots.release(warming)
+    slots.release(user)
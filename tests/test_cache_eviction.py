@@ -0,0 +1,103 @@
+import os
+import time
+import pytest
+import config
+from routes.cache_manager import CacheManager
+
+
+def _key(variant, signature, suffix=""):
+    return f"{variant}:TG13:2024:1:12:{signature * 32}{suffix}"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "output_folder", str(tmp_path / "output") + os.sep)
+    os.makedirs(config.output_folder)
+    return CacheManager(str(tmp_path / "cache"))
+
+
+def _add(cache, cache_key, size=100, accessed_at=None, file_name=None):
+    """Met en cache un fichier de `size` octets, avec une date d'accès imposée (ordre LRU déterministe)."""
+    file_path = os.path.join(config.output_folder, file_name or f"{len(os.listdir(config.output_folder))}.xlsx")
+    if not os.path.exists(file_path):
+        with open(file_path, "wb") as f:
+            f.write(b"x" * size)
+    cache.set_cache(cache_key, file_path)
+    if accessed_at:
+        cache._get_connection().execute("UPDATE cache_entries SET accessed_at = ? WHERE cache_key = ?",
+                                        (accessed_at, cache_key))
+    return file_path
+
+
+def test_lru_eviction_removes_least_recently_accessed_first(cache):
+    oldest = _add(cache, _key("bal_gen", "a"), accessed_at="2024-01-01T00:00:00")
+    middle = _add(cache, _key("gl_bnk", "a"), accessed_at="2024-01-02T00:00:00")
+    newest = _add(cache, _key("gl_client", "a"), accessed_at="2024-01-03T00:00:00")
+
+    stats = cache.evict(max_size_bytes=250, max_entries=10, orphan_grace_seconds=3600)
+
+    assert stats["lru"] == 1 and stats["freed_bytes"] == 100
+    assert not os.path.exists(oldest) and os.path.exists(middle) and os.path.exists(newest)
+    assert cache.get_cache(_key("bal_gen", "a")) is None
+    assert cache.get_cache_stats()["total_size_bytes"] == 200
+
+
+def test_access_refreshes_lru_position(cache):
+    _add(cache, _key("bal_gen", "a"), accessed_at="2024-01-01T00:00:00")
+    _add(cache, _key("gl_bnk", "a"), accessed_at="2024-01-02T00:00:00")
+    cache.access_cache(_key("bal_gen", "a"))
+
+    cache.evict(max_size_bytes=10_000, max_entries=1, orphan_grace_seconds=3600)
+
+    assert cache.get_cache(_key("bal_gen", "a"))
+    assert cache.get_cache(_key("gl_bnk", "a")) is None
+
+
+def test_superseded_versions_are_removed_within_budget(cache):
+    old_version = _add(cache, _key("bal_gen", "a"))
+    time.sleep(0.01)
+    new_version = _add(cache, _key("bal_gen", "b"))
+    other_period = _add(cache, _key("bal_gen", "a", "_bnk"))
+
+    stats = cache.evict(max_size_bytes=10_000, max_entries=10, orphan_grace_seconds=3600)
+
+    assert stats["superseded"] == 1 and stats["lru"] == 0
+    assert not os.path.exists(old_version)
+    assert os.path.exists(new_version) and os.path.exists(other_period)
+
+
+def test_file_shared_by_several_entries_is_kept_until_last_reference(cache):
+    shared = _add(cache, _key("bal_gen", "a"), accessed_at="2024-01-01T00:00:00", file_name="shared.xlsx")
+    _add(cache, _key("gl_bnk", "a"), accessed_at="2024-01-03T00:00:00", file_name="shared.xlsx")
+
+    cache.evict(max_size_bytes=10_000, max_entries=1, orphan_grace_seconds=3600)
+
+    assert os.path.exists(shared)
+    assert cache.get_cache(_key("gl_bnk", "a")) == shared
+
+
+def test_entries_with_missing_files_are_dropped(cache):
+    file_path = _add(cache, _key("bal_gen", "a"))
+    os.remove(file_path)
+
+    stats = cache.evict(max_size_bytes=10_000, max_entries=10, orphan_grace_seconds=3600)
+
+    assert stats["missing"] == 1
+    assert cache.get_cache_stats()["total_entries"] == 0
+
+
+def test_orphan_outputs_are_removed_after_grace_period(cache):
+    referenced = _add(cache, _key("bal_gen", "a"))
+    old_orphan = os.path.join(config.output_folder, "old.xlsx")
+    recent_orphan = os.path.join(config.output_folder, "recent.xlsx")
+    for file_path in (old_orphan, recent_orphan):
+        with open(file_path, "wb") as f:
+            f.write(b"x")
+    os.utime(old_orphan, (time.time() - 7200, time.time() - 7200))
+    os.utime(referenced, (time.time() - 7200, time.time() - 7200))
+
+    stats = cache.evict(max_size_bytes=10_000, max_entries=10, orphan_grace_seconds=3600)
+
+    assert stats["orphans"] == 1
+    assert not os.path.exists(old_orphan)
+    assert os.path.exists(recent_orphan) and os.path.exists(referenced)
@@ -0,0 +1,119 @@
+import os
+import pytest
+import config
+from routes.cache_manager import CacheManager
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for name in ("part1.xlsx", "part2.xlsx"):
+        (directory / name).write_bytes(b"transactions " + name.encode())
+    return str(directory)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheManager(str(tmp_path / "cache"))
+
+
+def _touch(path, offset_seconds=10):
+    """Avance la date de modification sans changer le contenu."""
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + offset_seconds))
+
+
+def _rewrite(path, content):
+    """Remplace le contenu (même taille possible) et avance la date de modification."""
+    with open(path, "wb") as f:
+        f.write(content)
+    _touch(path)
+
+
+def test_signature_is_memoized_within_revalidation_window(cache, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 3600)
+    files, signature = cache.get_directory_signature(data_dir)
+    assert len(files) == 2
+
+    _rewrite(os.path.join(data_dir, "part1.xlsx"), b"changed content")
+    assert cache.get_directory_signature(data_dir)[1] == signature
+
+    cache.invalidate_signatures(data_dir)
+    assert cache.get_directory_signature(data_dir)[1] != signature
+
+
+def test_signature_is_revalidated_after_window(cache, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 0)
+    _, signature = cache.get_directory_signature(data_dir)
+
+    _rewrite(os.path.join(data_dir, "part1.xlsx"), b"changed content")
+    _, changed_signature = cache.get_directory_signature(data_dir)
+    assert changed_signature != signature
+
+    with open(os.path.join(data_dir, "part3.xlsx"), "wb") as f:
+        f.write(b"new file")
+    _touch(data_dir)
+    files, added_signature = cache.get_directory_signature(data_dir)
+    assert len(files) == 3 and added_signature != changed_signature
+
+
+def test_unchanged_directory_listing_is_reused(cache, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 0)
+    cache.get_directory_signature(data_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("dossier relu alors que sa date de modification n'a pas changé")
+
+    monkeypatch.setattr("routes.cache_manager.glob.glob", fail)
+    files, _ = cache.get_directory_signature(data_dir)
+    assert len(files) == 2
+
+
+def test_cache_key_follows_source_files(cache, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 0)
+    key = cache.get_cache_key(config.BALANCE_GEN, "TG13", "2024", 1, 12)
+    assert cache.get_cache_key(config.BALANCE_GEN, "TG13", "2024", 1, 12) == key
+    assert cache.get_cache_key(config.BALANCE_GEN, "TG13", "2024", 1, 6) != key
+
+    source_file = os.path.join(config.transactions_data_folder, "TG13", "2024", "part1.xlsx")
+    _touch(source_file)
+    try:
+        assert cache.get_cache_key(config.BALANCE_GEN, "TG13", "2024", 1, 12) != key
+    finally:
+        _touch(source_file, -10)
+
+
+def test_mtime_mode_changes_on_touch(cache, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_MODE", "mtime")
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 0)
+    _, signature = cache.get_directory_signature(data_dir)
+
+    _touch(os.path.join(data_dir, "part1.xlsx"))
+    assert cache.get_directory_signature(data_dir)[1] != signature
+
+
+def test_content_mode_ignores_touch_but_not_same_size_edit(cache, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_MODE", "content")
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_REVALIDATE_SECONDS", 0)
+    source_file = os.path.join(data_dir, "part1.xlsx")
+    _, signature = cache.get_directory_signature(data_dir)
+
+    _touch(source_file)
+    assert cache.get_directory_signature(data_dir)[1] == signature
+
+    with open(source_file, "rb") as f:
+        content = f.read()
+    _rewrite(source_file, content.upper())
+    assert cache.get_directory_signature(data_dir)[1] != signature
+
+
+def test_content_hashes_are_persisted_across_instances(tmp_path, data_dir, monkeypatch):
+    monkeypatch.setattr(config, "CACHE_SIGNATURE_MODE", "content")
+    _, signature = CacheManager(str(tmp_path / "cache")).get_directory_signature(data_dir)
+
+    def fail(file_path):
+        raise AssertionError(f"{file_path} rehaché alors que ni son inode, ni sa date, ni sa taille n'ont changé")
+
+    monkeypatch.setattr(CacheManager, "_hash_file", staticmethod(fail))
+    assert CacheManager(str(tmp_path / "cache")).get_directory_signature(data_dir)[1] == signature
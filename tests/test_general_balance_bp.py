@@ -0,0 +1,65 @@
+import glob
+import uuid
+import openpyxl
+import polars as pl
+import pytest
+import config
+from conftest import COMPANY_CODE, YEAR
+
+FIRST_ROW = 6
+
+
+def _expected_rows(bp_type, start_month, end_month):
+    """Balance tiers par tiers, calculée ligne à ligne comme l'ancienne boucle du générateur."""
+    folder = config.vendors_transactions_data_folder if bp_type == "Vendor" else config.customers_transactions_data_folder
+    balance_file = config.vendor_initial_balance_file_path if bp_type == "Vendor" else config.customer_initial_balance_file_path
+    transactions = (
+        pl.concat([pl.read_excel(file) for file in glob.glob(f"{folder}{COMPANY_CODE}/{YEAR}/*")])
+        .filter(pl.col(config.posting_date_column_name).dt.month().is_between(start_month, end_month))
+    )
+    opening = pl.read_excel(f"{balance_file} {COMPANY_CODE} {YEAR}.xlsx").unique(bp_type).sort(bp_type)
+
+    rows = []
+    for bp_id, name, total in opening.select([bp_type, f"{bp_type} Name", "Total"]).iter_rows():
+        amounts = transactions.filter(pl.col(bp_type).cast(pl.Utf8) == str(bp_id))["Amount in local currency"].to_list()
+        movement_debit = sum(amount for amount in amounts if amount > 0)
+        movement_credit = sum(amount for amount in amounts if amount <= 0)
+        cumulative_debit = movement_debit + (total if total > 0 else 0)
+        cumulative_credit = movement_credit + (total if total <= 0 else 0)
+        balance = cumulative_debit + cumulative_credit
+        rows.append([
+            str(bp_id), name,
+            total if total > 0 else None, abs(total) if total <= 0 else None,
+            movement_debit, abs(movement_credit),
+            cumulative_debit, abs(cumulative_credit),
+            balance if balance > 0 else None, abs(balance) if balance <= 0 else None,
+        ])
+    return rows
+
+
+@pytest.mark.parametrize("bp_type", ["Vendor", "Customer"])
+@pytest.mark.parametrize("start_month, end_month", [(1, 12), (2, 4)])
+def test_bp_balance_matches_per_partner_computation(app, report_params, bp_type, start_month, end_month):
+    from routes.general_balance_bp import generate_bal_bp
+
+    output_file = f"{config.output_folder}{uuid.uuid4()}.xlsx"
+    data = {**report_params, "start_month": str(start_month), "end_month": str(end_month)}
+    with app.test_request_context():
+        response, status = generate_bal_bp(data, bp_type, output_file=output_file)
+        response.close()
+    assert status == 200
+
+    expected = _expected_rows(bp_type, start_month, end_month)
+    worksheet = openpyxl.load_workbook(output_file)[f"Balance General Format {bp_type}"]
+    actual = [list(row) for row in worksheet.iter_rows(min_row=FIRST_ROW, max_row=FIRST_ROW + len(expected) - 1,
+                                                       max_col=10, values_only=True)]
+
+    assert [str(row[0]) for row in actual] == [row[0] for row in expected]
+    for actual_row, expected_row in zip(actual, expected):
+        assert actual_row[1] == expected_row[1]
+        assert actual_row[2:] == [None if value is None else pytest.approx(value) for value in expected_row[2:]]
+
+    totals_row = [cell for cell in worksheet[FIRST_ROW + len(expected)]][:10]
+    assert totals_row[1].value == "Total à Reporter"
+    assert totals_row[4].value == pytest.approx(sum(row[4] for row in expected))
+    assert totals_row[5].value == pytest.approx(sum(row[5] for row in expected))
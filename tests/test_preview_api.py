@@ -0,0 +1,98 @@
+import glob
+import polars as pl
+import pytest
+import config
+from conftest import COMPANY_CODE, YEAR
+
+
+def _raw_movements(start_month, end_month):
+    """Mouvements par compte recalculés directement depuis les classeurs sources."""
+    files = glob.glob(f"{config.transactions_data_folder}{COMPANY_CODE}/{YEAR}/*")
+    amount = pl.col(config.amount_column)
+    return {
+        row["account"]: row for row in
+        pl.concat([pl.read_excel(file) for file in files])
+        .filter(pl.col(config.posting_date_column_name).dt.month().is_between(start_month, end_month))
+        .group_by(pl.col(config.SYSCOHADA_column_in_main_data).cast(pl.Utf8).alias("account"))
+        .agg([
+            pl.len().alias("line_count"),
+            amount.filter(amount > 0).sum().alias("debit"),
+            amount.filter(amount <= 0).sum().abs().alias("credit"),
+        ])
+        .iter_rows(named=True)
+    }
+
+
+@pytest.mark.parametrize("start_month, end_month", [(1, 12), (3, 5)])
+def test_balance_matches_source_transactions(client, report_params, start_month, end_month):
+    response = client.get("/api/balance", query_string={**report_params, "start_month": start_month,
+                                                        "end_month": end_month})
+    assert response.status_code == 200
+    accounts = {account["account"]: account for account in response.json["accounts"]}
+
+    expected = _raw_movements(start_month, end_month)
+    assert expected and set(expected) <= set(accounts)
+    for account, account_balance in accounts.items():
+        movements = expected.get(account, {"debit": 0, "credit": 0})
+        assert account_balance["movement_debit"] == pytest.approx(movements["debit"])
+        assert account_balance["movement_credit"] == pytest.approx(movements["credit"])
+        assert account_balance["cumulative_debit"] == pytest.approx(
+            account_balance["opening_debit"] + account_balance["movement_debit"])
+        if account[0] in "678":
+            assert account_balance["opening_debit"] == account_balance["opening_credit"] == 0
+
+
+def test_balance_totals_are_sums_of_accounts(client, report_params):
+    payload = client.get("/api/balance", query_string=report_params).json
+    for column in ["opening_debit", "movement_credit", "balance_debit", "balance_credit"]:
+        assert payload["totals"]["general"][column] == pytest.approx(
+            sum(account[column] for account in payload["accounts"]))
+        assert payload["totals"]["general"][column] == pytest.approx(
+            payload["totals"]["bilan"][column] + payload["totals"]["gestion"][column])
+        assert payload["totals"]["general"][column] == pytest.approx(
+            sum(group[column] for group in payload["groups_level1"]))
+
+
+def test_ledger_summary_pages_cover_every_account(client, report_params):
+    expected = _raw_movements(1, 12)
+    first_page = client.get("/api/ledger-summary", query_string={**report_params, "page_size": 7}).json
+    total_accounts = first_page["total_accounts"]
+    assert first_page["total_pages"] == -(-total_accounts // 7)
+
+    summaries = []
+    for page in range(1, first_page["total_pages"] + 1):
+        response = client.get("/api/ledger-summary", query_string={**report_params, "page": page, "page_size": 7})
+        assert response.status_code == 200
+        summaries.extend(response.json["accounts"])
+
+    assert len(summaries) == total_accounts
+    assert [summary["account"] for summary in summaries] == sorted(summary["account"] for summary in summaries)
+    for summary in summaries:
+        assert summary["line_count"] == expected.get(summary["account"], {"line_count": 0})["line_count"]
+
+
+def test_preview_is_served_from_cache(client, report_params):
+    from routes.general_ledger import cache_manager
+
+    client.get("/api/balance", query_string=report_params)
+    cache_key = cache_manager.get_cache_key(config.BALANCE_GEN, COMPANY_CODE, YEAR, 1, 12) + "_preview_json"
+    assert cache_manager.get_cache(cache_key)
+
+    response = client.get("/api/ledger-summary", query_string=report_params)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("params", [
+    {"year": YEAR},
+    {"company_code": COMPANY_CODE, "year": YEAR, "start_month": 6, "end_month": 2},
+    {"company_code": COMPANY_CODE, "year": YEAR, "end_month": 13},
+])
+def test_invalid_period_is_rejected(client, params):
+    response = client.get("/api/balance", query_string=params)
+    assert response.status_code == 400
+    assert response.json["status"] == "error"
+
+
+def test_invalid_page_is_rejected(client, report_params):
+    response = client.get("/api/ledger-summary", query_string={**report_params, "page_size": 5000})
+    assert response.status_code == 400
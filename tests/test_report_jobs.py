@@ -0,0 +1,127 @@
+import importlib
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytest
+import config
+from routes.report_jobs import JobStore, job_store
+
+report_jobs = importlib.import_module("routes.report_jobs")  # routes.report_jobs désigne aussi le blueprint
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "report_jobs.db"))
+
+
+def _wait_for_job(client, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        payload = client.get(f"/jobs/{job_id}").json
+        if payload["status"] in ("done", "failed"):
+            return payload
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} non terminé après {timeout}s")
+
+
+def test_job_lifecycle_is_persisted(store):
+    job_id = store.create(config.BALANCE_GEN, {"year": "2024"})
+    job = store.get(job_id)
+    assert job["status"] == "queued" and job["owner"].endswith(f":{report_jobs.os.getpid()}")
+
+    store.update(job_id, status="running", progress_done=3, progress_total=10, progress_stage="comptes")
+    assert report_jobs._job_payload(store.get(job_id))["progress"] == {
+        "done": 3, "total": 10, "stage": "comptes", "percent": 30.0}
+
+    store.complete(job_id, "output/report.xlsx")
+    payload = report_jobs._job_payload(store.get(job_id))
+    assert payload["status"] == "done" and payload["progress"]["percent"] == 100.0
+    assert payload["download_url"] == f"/jobs/{job_id}/download"
+
+    # Visible depuis une autre connexion (autre processus)
+    assert JobStore(store.db_file).get(job_id)["file_path"] == "output/report.xlsx"
+
+
+def test_purge_removes_only_old_finished_jobs(store):
+    old = (datetime.now() - timedelta(hours=48)).isoformat()
+    finished, failed, running = (store.create(config.BALANCE_GEN, {}) for _ in range(3))
+    recent = store.create(config.BALANCE_GEN, {}, status="done")
+    store.complete(finished, "output/a.xlsx")
+    store.update(failed, status="failed")
+    store.update(running, status="running")
+    store._get_connection().execute("UPDATE report_jobs SET updated_at = ? WHERE job_id != ?", (old, recent))
+
+    store.purge(retention_hours=24)
+
+    assert store.get(finished) is None and store.get(failed) is None
+    assert store.get(running) is not None and store.get(recent) is not None
+
+
+def test_submitted_job_completes_and_downloads(client, report_params):
+    form = {**report_params, "report_type": config.BALANCE_GEN, "start_month": "2", "end_month": "7"}
+    response = client.post("/jobs", data=form)
+    assert response.status_code == 202
+    assert response.json["status_url"] == f"/jobs/{response.json['job_id']}"
+
+    payload = _wait_for_job(client, response.json["job_id"])
+    assert payload["status"] == "done"
+    download = client.get(payload["download_url"])
+    assert download.status_code == 200 and download.data[:2] == b"PK"
+    download.close()
+
+    # Même demande: servie par le cache, job terminé d'emblée
+    again = client.post("/jobs", data=form)
+    assert again.status_code == 200 and again.json["status"] == "done"
+
+
+def test_unknown_report_type_and_job(client, report_params):
+    assert client.post("/jobs", data={**report_params, "report_type": "nope"}).status_code == 404
+    assert client.get("/jobs/unknown").status_code == 404
+    assert client.get("/jobs/unknown/download").status_code == 404
+
+
+def test_download_before_completion_is_refused(client):
+    job_id = job_store.create(config.BALANCE_GEN, {})
+    response = client.get(f"/jobs/{job_id}/download")
+    assert response.status_code == 409 and response.json["status"] == "queued"
+
+
+def test_job_of_dead_process_is_reported_failed(client):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    job_id = job_store.create(config.BALANCE_GEN, {})
+    job_store.update(job_id, status="running", owner=f"{report_jobs.socket.gethostname()}:{dead.pid}")
+
+    payload = client.get(f"/jobs/{job_id}").json
+    assert payload["status"] == "failed" and "arrêté" in payload["error"]
+
+
+def test_submission_refused_while_shutting_down(client, report_params, monkeypatch):
+    monkeypatch.setattr(report_jobs, "_accepting_jobs", False)
+    response = client.post("/jobs", data={**report_params, "report_type": config.BALANCE_GEN})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(config.GENERATION_RETRY_AFTER_SECONDS)
+
+
+def test_shutdown_waits_for_pending_jobs(monkeypatch):
+    monkeypatch.setattr(report_jobs, "_executor", ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(report_jobs, "_pending_jobs", set())
+    monkeypatch.setattr(report_jobs, "_accepting_jobs", True)
+    finished = threading.Event()
+
+    def run_job(app, job_id, data):
+        time.sleep(0.3 if job_id == "short" else 2)
+        if job_id == "short":
+            finished.set()
+
+    monkeypatch.setattr(report_jobs, "_run_job", run_job)
+    report_jobs._submit(None, "short", {})
+    assert report_jobs.shutdown_jobs(timeout=10)
+    assert finished.is_set() and not report_jobs._accepting_jobs
+
+    monkeypatch.setattr(report_jobs, "_executor", ThreadPoolExecutor(max_workers=1))
+    report_jobs._submit(None, "long", {})
+    assert not report_jobs.shutdown_jobs(timeout=0.1)
@@ -0,0 +1,136 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import pytest
+import config
+from flask import send_from_directory
+from routes.cache_manager import CacheManager
+
+
+def _unique_key():
+    return f"{config.BALANCE_GEN}:TG13:2024:1:12:{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheManager(str(tmp_path / "cache"))
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(config, "GENERATION_LOCK_POLL_SECONDS", 0.01)
+
+
+def _in_thread(func):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", func()))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def test_generation_lock_has_a_single_owner(cache):
+    cache_key = _unique_key()
+    assert cache.acquire_generation_lock(cache_key)
+    assert not _in_thread(lambda: cache.acquire_generation_lock(cache_key))
+
+    _in_thread(lambda: cache.release_generation_lock(cache_key))  # seul le détenteur libère
+    assert not _in_thread(lambda: cache.acquire_generation_lock(cache_key))
+
+    cache.release_generation_lock(cache_key)
+    assert _in_thread(lambda: cache.acquire_generation_lock(cache_key))
+
+
+def test_lock_of_dead_process_is_taken_over(cache):
+    cache_key = _unique_key()
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    cache._get_connection().execute(
+        "INSERT INTO generation_locks (cache_key, owner, acquired_at) VALUES (?, ?, ?)",
+        (cache_key, f"{socket.gethostname()}:{dead.pid}:1", time.time())
+    )
+
+    cache.wait_for_generation(cache_key)  # ne bloque pas sur un verrou abandonné
+    assert cache.acquire_generation_lock(cache_key)
+
+
+def test_stale_lock_is_taken_over(cache, monkeypatch):
+    cache_key = _unique_key()
+    assert _in_thread(lambda: cache.acquire_generation_lock(cache_key))
+    assert not cache.acquire_generation_lock(cache_key)
+
+    monkeypatch.setattr(config, "GENERATION_LOCK_STALE_SECONDS", 0)
+    assert cache.acquire_generation_lock(cache_key)
+
+
+def test_waiter_resumes_when_lock_is_released(cache):
+    cache_key = _unique_key()
+    locked = threading.Event()
+
+    def generate():
+        cache.acquire_generation_lock(cache_key)
+        locked.set()
+        time.sleep(0.2)
+        cache.release_generation_lock(cache_key)
+
+    threading.Thread(target=generate).start()
+    locked.wait()
+    start = time.monotonic()
+    cache.wait_for_generation(cache_key)
+    assert 0.1 <= time.monotonic() - start < 5
+    assert cache.acquire_generation_lock(cache_key)
+
+
+def test_concurrent_identical_requests_generate_once(app, report_params):
+    from routes.general_ledger import _get_or_generate_report, cache_manager
+
+    cache_key = _unique_key()
+    calls = []
+
+    def generate(data, cache_manager=None, cache_key=None, output_file=None):
+        calls.append(output_file)
+        time.sleep(0.3)
+        with open(output_file, "wb") as f:
+            f.write(b"report")
+        return send_from_directory(directory=os.getcwd(), path=output_file, as_attachment=True), 200
+
+    responses = []
+
+    def request_report():
+        with app.test_request_context():
+            response, status = _get_or_generate_report(report_params, generate, config.BALANCE_GEN, "TG13", "2024",
+                                                       cache_key=cache_key, record_request=False)
+            response.close()
+            responses.append(status)
+
+    threads = [threading.Thread(target=request_report) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert responses == [200] * 5
+    assert cache_manager.get_cache(cache_key)
+    assert cache_manager.acquire_generation_lock(cache_key)
+    cache_manager.release_generation_lock(cache_key)
+
+
+def test_failed_generation_releases_lock(app, report_params):
+    from routes.general_ledger import _get_or_generate_report, cache_manager
+
+    cache_key = _unique_key()
+
+    def generate(data, cache_manager=None, cache_key=None, output_file=None):
+        raise RuntimeError("échec de génération")
+
+    with app.test_request_context(), pytest.raises(RuntimeError):
+        _get_or_generate_report(report_params, generate, config.BALANCE_GEN, "TG13", "2024", cache_key=cache_key,
+                                record_request=False)
+
+    assert cache_manager.get_cache(cache_key) is None
+    assert _in_thread(lambda: cache_manager.acquire_generation_lock(cache_key))